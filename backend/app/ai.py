@@ -3,6 +3,9 @@ from dotenv import load_dotenv
 from openai import OpenAI, OpenAIError
 from typing import Dict, List, Any
 
+from .deadlines import DeadlineExceeded, check_deadline, timeout_for
+from .scheduler import scheduled
+
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 DEFAULT_JD_MODEL = os.getenv("OPENAI_JD_MODEL", "gpt-5-mini")
@@ -37,12 +40,14 @@ def call_openai_json(
     last_error = None
 
     for attempt in range(1, max_retries + 1):
+        check_deadline("llm")
         try:
-            response = client.responses.create(
-                model=model,
-                input=prompt,
-                timeout=90,
-            )
+            with scheduled("llm"):
+                response = client.responses.create(
+                    model=model,
+                    input=prompt,
+                    timeout=timeout_for(90),
+                )
 
             raw = extract_text(response)
             if not raw:
@@ -65,6 +70,9 @@ def call_openai_json(
 
             raise ValueError("Model returned invalid JSON")
 
+        except DeadlineExceeded:
+            raise
+
         except OpenAIError as e:
             last_error = e
             # Rate-limit or transient error → retry
@@ -110,5 +118,6 @@ JOB DESCRIPTION:
 from .services.ai_service import (  # noqa: E402
     tailor_rewrite_resume,
     generate_resume_from_scratch,
+    generate_cover_letter,
     normalize_imported_resume,
 )
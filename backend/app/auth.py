@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 
 from .db import SessionLocal
 from .models import AuthToken
+from .scheduler import bind_tenant, tenant_key
 
 
 PrincipalType = Literal["user", "admin"]
@@ -49,6 +50,7 @@ def get_principal(
     if row.principal_type not in ("user", "admin"):
         raise HTTPException(status_code=401, detail="Invalid token principal_type")
 
+    bind_tenant(tenant_key(row.principal_type, row.principal_id))
     return Principal(
         type=row.principal_type,
         id=row.principal_id,
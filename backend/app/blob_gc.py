@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .models import BlobRef, StoredFile, UploadSession
+from .storage import (
+    CloudinaryBackend,
+    LocalBlobBackend,
+    backend_named,
+    is_local_path,
+    is_pending_path,
+    STORAGE_BACKEND,
+)
+
+# Garbage collection for storage blobs nothing points at any more.
+#
+# The reference set is every `stored_files.path` plus direct uploads that are
+# still pending and unexpired. Superseded per-user files (older templates and
+# base resume DOCX uploads) can be pruned first, keeping the newest
+# BLOB_GC_KEEP_PER_KIND of each.
+#
+# Local store: every blob on disk or in blob_refs is reconciled, so orphans are
+# deleted and drifted refcounts corrected. Cloudinary: raw assets under
+# BLOB_GC_CLOUDINARY_PREFIX that no row points at are destroyed.
+#
+# Anything touched within BLOB_GC_MIN_AGE_SECONDS is left alone, because its
+# row may not be committed yet. Deletes are paced to
+# BLOB_GC_DELETES_PER_SECOND and capped at BLOB_GC_MAX_DELETES per run.
+
+GC_MIN_AGE_SECONDS = int(os.getenv("BLOB_GC_MIN_AGE_SECONDS", "3600"))
+GC_DELETES_PER_SECOND = float(os.getenv("BLOB_GC_DELETES_PER_SECOND", "5"))
+GC_MAX_DELETES = int(os.getenv("BLOB_GC_MAX_DELETES", "1000"))
+GC_KEEP_PER_KIND = int(os.getenv("BLOB_GC_KEEP_PER_KIND", "1"))
+GC_CLOUDINARY_PREFIX = os.getenv("BLOB_GC_CLOUDINARY_PREFIX", "career-os/")
+
+# Per-user files where only the newest upload is ever used
+SUPERSEDED_KINDS = ("resume_template_docx", "base_resume_docx")
+
+
+@dataclass
+class GCReport:
+    dry_run: bool
+    started_at: str
+    backends: List[str] = field(default_factory=list)
+    scanned: int = 0
+    referenced: int = 0
+    deleted: int = 0
+    bytes_reclaimed: int = 0
+    refcounts_fixed: int = 0
+    missing: int = 0  # referenced but gone from storage
+    skipped_recent: int = 0
+    skipped_limit: int = 0  # orphans left for the next run (BLOB_GC_MAX_DELETES)
+    superseded_rows: int = 0
+    expired_uploads: int = 0
+    temp_files: int = 0
+    errors: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class _Pacer:
+    """Spaces calls at most `rate` per second (rate <= 0 disables it)."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def _superseded_files(db: Session, cutoff: dt.datetime, keep: int) -> List[StoredFile]:
+    rows = (
+        db.query(StoredFile)
+        .filter(StoredFile.kind.in_(SUPERSEDED_KINDS), StoredFile.application_id == "base")
+        .order_by(StoredFile.user_id, StoredFile.kind, StoredFile.created_at.desc())
+        .all()
+    )
+    seen: Counter = Counter()
+    out = []
+    for sf in rows:
+        seen[(sf.user_id, sf.kind)] += 1
+        if seen[(sf.user_id, sf.kind)] > keep and sf.created_at < cutoff:
+            out.append(sf)
+    return out
+
+
+def _referenced_paths(db: Session, exclude_ids: Set[str], now: dt.datetime) -> Counter:
+    """How many live rows point at each storage path."""
+    refs: Counter = Counter()
+    for file_id, path in db.query(StoredFile.id, StoredFile.path):
+        if file_id not in exclude_ids and not is_pending_path(path):
+            refs[path] += 1
+    # Uploaded but not recorded yet: the session holds the only reference
+    pending = db.query(UploadSession.path).filter(
+        UploadSession.status.in_(("pending", "processing")),
+        UploadSession.path.isnot(None),
+        UploadSession.expires_at >= now,
+    )
+    for (path,) in pending:
+        refs[path] += 1
+    return refs
+
+
+def _expire_uploads(db: Session, now: dt.datetime, dry_run: bool) -> int:
+    q = db.query(UploadSession).filter(
+        UploadSession.status == "pending", UploadSession.expires_at < now
+    )
+    n = q.count()
+    if n and not dry_run:
+        q.update(
+            {
+                UploadSession.status: "failed",
+                UploadSession.error: "Upload expired",
+                UploadSession.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+    return n
+
+
+def _collect_local(
+    refs: Counter, cutoff: dt.datetime, report: GCReport, pacer: _Pacer, budget: List[int]
+) -> None:
+    backend: LocalBlobBackend = backend_named("local")  # type: ignore[assignment]
+    expected: Counter = Counter()
+    for path, n in refs.items():
+        if is_local_path(path):
+            expected[LocalBlobBackend.digest_of(path)] += n
+
+    db = SessionLocal()
+    try:
+        digests = {d for (d,) in db.query(BlobRef.sha256)}
+    finally:
+        db.close()
+    digests.update(d for d, _, _ in backend.iter_blobs())
+    digests.update(expected)
+
+    for digest in sorted(digests):
+        report.scanned += 1
+        want = expected.get(digest, 0)
+        if want:
+            report.referenced += 1
+        elif budget[0] <= 0:
+            report.skipped_limit += 1
+            continue
+        else:
+            pacer.wait()
+        try:
+            action, freed = backend.reconcile(digest, want, cutoff, dry_run=report.dry_run)
+        except Exception as e:
+            report.errors.append(f"local {digest[:12]}: {e}")
+            continue
+        if action == "deleted":
+            budget[0] -= 1
+            report.deleted += 1
+            report.bytes_reclaimed += freed
+        elif action == "fixed":
+            report.refcounts_fixed += 1
+        elif action == "missing":
+            report.missing += 1
+        elif action == "recent":
+            report.skipped_recent += 1
+
+    for tmp in backend.iter_temp_files():
+        try:
+            st = tmp.stat()
+            if dt.datetime.fromtimestamp(st.st_mtime) >= cutoff:
+                continue
+            if not report.dry_run:
+                tmp.unlink()
+            report.temp_files += 1
+            report.bytes_reclaimed += st.st_size
+        except FileNotFoundError:
+            pass
+
+
+def _collect_cloudinary(
+    refs: Counter, cutoff: dt.datetime, report: GCReport, pacer: _Pacer, budget: List[int]
+) -> None:
+    backend: CloudinaryBackend = backend_named("cloudinary")  # type: ignore[assignment]
+    live = {
+        CloudinaryBackend.public_id_of(path)
+        for path in refs
+        if not is_local_path(path)
+    }
+    live.discard(None)
+
+    for asset in backend.iter_assets(GC_CLOUDINARY_PREFIX):
+        report.scanned += 1
+        public_id = asset.get("public_id")
+        if public_id in live:
+            report.referenced += 1
+            continue
+        created = dt.datetime.fromisoformat(
+            str(asset.get("created_at", "")).replace("Z", "+00:00")
+        ).astimezone().replace(tzinfo=None)
+        if created >= cutoff:
+            report.skipped_recent += 1
+            continue
+        if budget[0] <= 0:
+            report.skipped_limit += 1
+            continue
+        pacer.wait()
+        try:
+            if not report.dry_run:
+                backend.delete_asset(public_id)
+        except Exception as e:
+            report.errors.append(f"cloudinary {public_id}: {e}")
+            continue
+        budget[0] -= 1
+        report.deleted += 1
+        report.bytes_reclaimed += int(asset.get("bytes") or 0)
+
+
+def collect_garbage(
+    *,
+    dry_run: bool = True,
+    backends: Optional[List[str]] = None,
+    prune_superseded: bool = True,
+    min_age_seconds: Optional[int] = None,
+    max_deletes: Optional[int] = None,
+    deletes_per_second: Optional[float] = None,
+) -> GCReport:
+    """Delete (or, with dry_run, just count) blobs no row references."""
+    t0 = time.perf_counter()
+    now = dt.datetime.now()
+    cutoff = now - dt.timedelta(
+        seconds=GC_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+    )
+    report = GCReport(dry_run=dry_run, started_at=now.isoformat())
+    report.backends = backends or (
+        ["local"] if STORAGE_BACKEND == "local" else ["local", "cloudinary"]
+    )
+    pacer = _Pacer(GC_DELETES_PER_SECOND if deletes_per_second is None else deletes_per_second)
+    budget = [GC_MAX_DELETES if max_deletes is None else max_deletes]
+
+    db = SessionLocal()
+    try:
+        superseded = _superseded_files(db, cutoff, GC_KEEP_PER_KIND) if prune_superseded else []
+        report.superseded_rows = len(superseded)
+        report.expired_uploads = _expire_uploads(db, now, dry_run)
+        if not dry_run:
+            # The blobs are not released here; the pass below reclaims them
+            for sf in superseded:
+                db.delete(sf)
+            db.commit()
+        refs = _referenced_paths(db, {sf.id for sf in superseded}, now)
+    finally:
+        db.close()
+
+    if "local" in report.backends:
+        _collect_local(refs, cutoff, report, pacer, budget)
+    if "cloudinary" in report.backends:
+        try:
+            _collect_cloudinary(refs, cutoff, report, pacer, budget)
+        except Exception as e:
+            report.errors.append(f"cloudinary listing: {e}")
+
+    report.seconds = round(time.perf_counter() - t0, 3)
+    print(
+        "blob gc:",
+        "dry run" if dry_run else "done",
+        {k: v for k, v in report.as_dict().items() if k not in ("errors", "started_at")},
+        f"{len(report.errors)} errors" if report.errors else "",
+    )
+    return report
@@ -1,6 +1,8 @@
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from sqlalchemy import create_engine
+from typing import Iterator
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
@@ -26,3 +28,67 @@ engine = create_engine(DATABASE_URL, **engine_kwargs)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
+
+
+_HOLD_TRANSACTION = "hold_transaction"
+_HAS_WRITES = "has_writes"
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush(session, flush_context) -> None:
+    session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state) -> None:
+    # query().update()/delete() and raw statements skip the flush
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+@event.listens_for(SessionLocal, "after_rollback")
+def _clear_writes(session) -> None:
+    session.info.pop(_HAS_WRITES, None)
+
+
+def _has_writes(db) -> bool:
+    return bool(db.info.get(_HAS_WRITES) or db.new or db.dirty or db.deleted)
+
+
+def release_connection(db) -> None:
+    """Commit the session's current transaction and return its pooled connection.
+
+    Call before slow non-DB work (model calls, template downloads, rendering,
+    uploads) so a request does not pin a pool slot for its whole duration.
+    Loaded objects stay usable; the next query checks a connection out again.
+    Inside `hold_transaction(db)` only a read-only transaction is ended; once
+    the session has written anything this does nothing.
+    """
+    if not db.in_transaction():
+        return
+    if db.info.get(_HOLD_TRANSACTION) and _has_writes(db):
+        return
+    expire = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire
+
+
+@contextmanager
+def hold_transaction(db) -> Iterator[None]:
+    """Keep `db`'s writes uncommitted: `release_connection` stops committing them.
+
+    Job handlers run inside this, so everything they write commits together
+    with the job's result, and only while the worker still holds the lease.
+    Reads before the first write still give their connection back, so a job
+    only holds a pooled connection from its first write until it finishes.
+    """
+    previous = db.info.get(_HOLD_TRANSACTION, False)
+    db.info[_HOLD_TRANSACTION] = True
+    try:
+        yield
+    finally:
+        db.info[_HOLD_TRANSACTION] = previous
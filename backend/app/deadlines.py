@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import datetime as dt
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+from fastapi import HTTPException
+
+# Client deadlines and cancellation.
+#
+# A client sends `X-Client-Deadline: <seconds>` with the time it is willing to
+# wait. ClientDeadlineMiddleware puts a Deadline in a contextvar for the request,
+# so threadpool endpoints and the threads they fan out to can see it. The
+# middleware also watches for the client disconnecting. Slow steps call
+# `check_deadline("stage")` before starting and cap their own timeouts with
+# `timeout_for()`. Steps that run external processes poll `current_deadline()`
+# so they can kill the process. A cancelled request raises DeadlineExceeded
+# (504). The first cancellation per request is recorded (see
+# `cancellation_report()`), and its pipeline timing row gets status "cancelled".
+#
+# Once the response starts the deadline is switched off, so background tasks
+# that run after the response are never cancelled.
+
+DEADLINE_HEADER = "X-Client-Deadline"
+MAX_CLIENT_DEADLINE_SECONDS = float(os.getenv("MAX_CLIENT_DEADLINE_SECONDS", "900"))
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "client_deadline", default=None
+)
+
+_stats_lock = threading.Lock()
+_cancellations: Counter = Counter()  # (reason, stage) -> count
+_recent: Deque[Dict[str, Any]] = deque(maxlen=100)
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self, reason: str, stage: str) -> None:
+        super().__init__(
+            status_code=504,
+            detail=f"Request cancelled during {stage}: {reason.replace('_', ' ')}",
+        )
+        self.reason = reason
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, seconds: Optional[float], path: str = "") -> None:
+        self.path = path
+        self.started = time.monotonic()
+        self.expires_at = None if seconds is None else self.started + seconds
+        self.reason: Optional[str] = None
+        self.finished = False  # response started; nothing left to cancel
+        self._recorded = False
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str) -> None:
+        with self._lock:
+            if not self.finished and self.reason is None:
+                self.reason = reason
+
+    def finish(self) -> None:
+        self.finished = True
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None or self.finished:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def exceeded(self) -> Optional[str]:
+        """Why the work should stop, or None to carry on."""
+        if self.finished:
+            return None
+        if self.reason:
+            return self.reason
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            return "deadline_exceeded"
+        return None
+
+    def check(self, stage: str) -> None:
+        reason = self.exceeded()
+        if reason:
+            raise self.fail(reason, stage)
+
+    def fail(self, reason: str, stage: str) -> DeadlineExceeded:
+        """Record the cancellation and return the exception to raise."""
+        self.record(reason, stage)
+        return DeadlineExceeded(reason, stage)
+
+    def record(self, reason: str, stage: str) -> None:
+        with self._lock:
+            if self._recorded:
+                return
+            self._recorded = True
+        elapsed_ms = round((time.monotonic() - self.started) * 1000, 1)
+        with _stats_lock:
+            _cancellations[(reason, stage)] += 1
+            _recent.append(
+                {
+                    "at": dt.datetime.now().isoformat(timespec="seconds"),
+                    "path": self.path,
+                    "reason": reason,
+                    "stage": stage,
+                    "elapsed_ms": elapsed_ms,
+                }
+            )
+        print("deadline: cancelled", self.path, reason, "during", stage, f"after {elapsed_ms}ms")
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded if the caller's client has given up."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def timeout_for(default: float) -> float:
+    """`default`, shortened to what is left of the client's deadline."""
+    deadline = _current.get()
+    remaining = deadline.remaining() if deadline else None
+    if remaining is None:
+        return default
+    return max(0.1, min(default, remaining))
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float], path: str = "") -> Iterator[Deadline]:
+    deadline = Deadline(seconds, path)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def parse_deadline_header(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    if seconds <= 0:
+        return None
+    return min(seconds, MAX_CLIENT_DEADLINE_SECONDS)
+
+
+def cancellation_report() -> Dict[str, Any]:
+    with _stats_lock:
+        return {
+            "total": sum(_cancellations.values()),
+            "by_stage": [
+                {"reason": reason, "stage": stage, "count": n}
+                for (reason, stage), n in _cancellations.most_common()
+            ],
+            "recent": list(_recent),
+        }
+
+
+class ClientDeadlineMiddleware:
+    """Pure ASGI middleware: opens a Deadline per request and watches for disconnects.
+
+    A watcher task is the only reader of `receive`. It hands body messages to the
+    app through a one-slot queue, so upload backpressure is kept. After the body
+    it keeps listening, so a disconnect is seen while a sync endpoint is busy.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        seconds = parse_deadline_header(
+            headers.get(DEADLINE_HEADER.lower().encode(), b"").decode("latin-1")
+        )
+        inbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=1)
+
+        with deadline_scope(seconds, scope.get("path", "")) as deadline:
+            disconnected = False
+
+            async def watch() -> None:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        deadline.cancel("client_disconnected")
+                        await inbox.put(message)
+                        return
+                    await inbox.put(message)
+
+            async def wrapped_receive() -> Dict[str, Any]:
+                nonlocal disconnected
+                if disconnected:
+                    return {"type": "http.disconnect"}
+                message = await inbox.get()
+                disconnected = message["type"] == "http.disconnect"
+                return message
+
+            async def wrapped_send(message) -> None:
+                if message["type"] == "http.response.start":
+                    deadline.finish()
+                await send(message)
+
+            watcher = asyncio.create_task(watch())
+            try:
+                await self.app(scope, wrapped_receive, wrapped_send)
+            finally:
+                deadline.finish()
+                watcher.cancel()
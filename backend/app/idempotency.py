@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from .db import SessionLocal
+from .models import IdempotencyRecord
+
+# Idempotent execution for write endpoints.
+#
+# The first request for a key inserts an in_progress row (the primary key makes
+# that the lock) and runs; duplicates in the same process wait on its Event,
+# duplicates in other processes poll the row. The finished response is stored
+# and replayed until the record expires. Failures delete the row so a retry
+# runs again.
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# Keys derived from (user_id, url) only guard against double submits
+IDEMPOTENCY_DERIVED_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_DERIVED_TTL_SECONDS", "120"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "300"))
+# An in_progress row older than this belongs to a crashed request and is taken over
+IDEMPOTENCY_STALE_SECONDS = int(os.getenv("IDEMPOTENCY_STALE_SECONDS", "900"))
+
+_TRACKING_PARAMS = ("utm_", "gclid", "fbclid", "mc_cid", "mc_eid", "trk", "refid")
+
+
+@dataclass
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+_IN_FLIGHT: Dict[str, _Flight] = {}
+_IN_FLIGHT_GUARD = threading.Lock()
+
+
+def canonical_url(url: str) -> str:
+    """Lowercase scheme/host, drop fragment, tracking params and trailing slash, sort the query."""
+    parts = urlsplit((url or "").strip())
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), "")
+    )
+
+
+def request_fingerprint(body: Dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _record_id(scope: str, user_id: str, key: str) -> str:
+    return hashlib.sha256(f"{scope}\n{user_id}\n{key}".encode("utf-8")).hexdigest()
+
+
+def _claim(
+    record_id: str, scope: str, user_id: str, request_hash: str, explicit: bool
+) -> Optional[Dict[str, Any]]:
+    """Insert our in_progress row, or return a stored response to replay."""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    db = SessionLocal()
+    try:
+        while True:
+            now = dt.datetime.now()
+            row = db.get(IdempotencyRecord, record_id)
+            if row is not None:
+                stale = (
+                    row.status == "in_progress"
+                    and row.updated_at < now - dt.timedelta(seconds=IDEMPOTENCY_STALE_SECONDS)
+                )
+                finished_other = row.status == "completed" and row.request_hash != request_hash
+                if row.expires_at < now or stale or (finished_other and not explicit):
+                    db.delete(row)
+                    db.commit()
+                    continue
+                if row.request_hash != request_hash and explicit:
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used with a different request",
+                    )
+                if row.status == "completed":
+                    return json.loads(row.response_json or "{}")
+                # Someone else is running it: wait for them
+                if time.monotonic() > deadline:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="A request with this idempotency key is still in progress",
+                    )
+                db.rollback()
+                db.expire_all()
+                time.sleep(0.5)
+                continue
+
+            db.add(
+                IdempotencyRecord(
+                    id=record_id,
+                    scope=scope,
+                    user_id=user_id,
+                    request_hash=request_hash,
+                    status="in_progress",
+                    created_at=now,
+                    updated_at=now,
+                    expires_at=now + dt.timedelta(seconds=IDEMPOTENCY_STALE_SECONDS),
+                )
+            )
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+    finally:
+        db.close()
+
+
+def _finish(record_id: str, response: Optional[Dict[str, Any]], ttl_seconds: int) -> None:
+    db = SessionLocal()
+    try:
+        row = db.get(IdempotencyRecord, record_id)
+        if row is None:
+            return
+        if response is None:
+            db.delete(row)
+        else:
+            now = dt.datetime.now()
+            row.status = "completed"
+            row.response_json = json.dumps(response, ensure_ascii=False)
+            row.updated_at = now
+            row.expires_at = now + dt.timedelta(seconds=ttl_seconds)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_idempotent(
+    *,
+    scope: str,
+    user_id: str,
+    key: Optional[str],
+    derived_key: str,
+    request_hash: str,
+    fn: Callable[[], Dict[str, Any]],
+) -> Tuple[Dict[str, Any], bool]:
+    """Run `fn` at most once per key; returns (response, replayed).
+
+    `key` is the client's Idempotency-Key; without one `derived_key` is used
+    with a short TTL, and a different body under it simply runs after the
+    in-flight one instead of being rejected.
+    """
+    explicit = bool((key or "").strip())
+    record_id = _record_id(scope, user_id, key.strip() if explicit else derived_key)
+    ttl = IDEMPOTENCY_TTL_SECONDS if explicit else IDEMPOTENCY_DERIVED_TTL_SECONDS
+
+    flight_key = f"{record_id}:{request_hash}"
+    with _IN_FLIGHT_GUARD:
+        flight = _IN_FLIGHT.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _IN_FLIGHT[flight_key] = _Flight()
+    if not leader:
+        if not flight.done.wait(IDEMPOTENCY_WAIT_SECONDS):
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this idempotency key is still in progress",
+            )
+        if flight.error is not None:
+            raise flight.error
+        print("idempotency: joined in-flight request", scope, user_id)
+        return flight.result, True
+
+    try:
+        stored = _claim(record_id, scope, user_id, request_hash, explicit)
+        if stored is not None:
+            print("idempotency: replayed stored response", scope, user_id)
+            flight.result = stored
+            return stored, True
+        try:
+            result = fn()
+        except BaseException:
+            _finish(record_id, None, ttl)
+            raise
+        _finish(record_id, result, ttl)
+        flight.result = result
+        return result, False
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        flight.done.set()
+        with _IN_FLIGHT_GUARD:
+            _IN_FLIGHT.pop(flight_key, None)
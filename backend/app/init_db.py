@@ -36,6 +36,33 @@ def _ensure_user_profile_columns() -> None:
                 )
 
 
+def _ensure_resume_version_columns() -> None:
+    cols = {
+        "cover_letter": "TEXT",
+        "cover_letter_status": "TEXT",
+        "cover_letter_instructions": "TEXT",
+    }
+    with engine.begin() as conn:
+        for col, col_type in cols.items():
+            if engine.dialect.name == "postgresql":
+                conn.execute(
+                    text(
+                        f"ALTER TABLE resume_versions ADD COLUMN IF NOT EXISTS {col} {col_type};"
+                    )
+                )
+
+
+def _ensure_generation_job_columns() -> None:
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0;"
+            )
+        )
+
+
 def ensure_schema() -> None:
     """Ensure schema exists (SQLite or Postgres)."""
     # Create tables for any DB
@@ -67,6 +94,8 @@ def ensure_schema() -> None:
             conn.close()
     else:
         _ensure_user_profile_columns()
+        _ensure_resume_version_columns()
+        _ensure_generation_job_columns()
 
     # Optional seed (works for Postgres too)
     # NOTE: You may want to disable seeding in production.
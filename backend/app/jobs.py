@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from .auth import Principal
+from .db import SessionLocal, hold_transaction
+from .deadlines import DeadlineExceeded
+from .models import GenerationJob
+from .scheduler import tenant_key, tenant_scope, work_lane
+from .timings import current_timer, track_pipeline
+
+# Persistent job queue backed by the generation_jobs table.
+#
+# Jobs are claimed with a conditional UPDATE that also sets a lease
+# (locked_by/locked_until). While a handler runs, a heartbeat thread renews the
+# lease every GENERATION_JOB_HEARTBEAT_SECONDS, so a slow job is not claimed by
+# a second worker. A worker that dies mid-job stops renewing; its lease expires
+# and the job is claimed again, up to GENERATION_JOB_MAX_ATTEMPTS.
+# Handlers write through the worker's session without committing. They run
+# inside `hold_transaction`: `release_connection` still ends the read-only
+# transactions before model calls, rendering and uploads, but stops committing
+# once the handler has written rows. Handlers write at the end of a run, so a
+# job holds a pooled connection only for that last step. The result and the
+# handler's rows are committed together only while the worker still owns the
+# lease, so a job's rows land at most once. Side stores are the exception: storage blobs and the shared JD
+# keys cache are written as the handler runs. A discarded run can leave blobs
+# behind, which blob GC reclaims.
+
+JOB_LEASE_SECONDS = int(os.getenv("GENERATION_JOB_LEASE_SECONDS", "900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("GENERATION_JOB_POLL_SECONDS", "1.0"))
+JOB_HEARTBEAT_SECONDS = float(
+    os.getenv("GENERATION_JOB_HEARTBEAT_SECONDS", str(max(1, JOB_LEASE_SECONDS // 3)))
+)
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+@dataclass
+class _JobHandler:
+    run: Callable[[Session, GenerationJob], Dict[str, Any]]
+    after_commit: Optional[Callable[[GenerationJob, Dict[str, Any]], None]] = None
+    lane: str = "interactive"  # work lane for model/soffice calls (app/scheduler.py)
+    pipeline: Optional[str] = None  # stage timings name (app/timings.py)
+
+
+_HANDLERS: Dict[str, _JobHandler] = {}
+
+
+def register_job_handler(
+    kind: str,
+    run: Callable[[Session, GenerationJob], Dict[str, Any]],
+    after_commit: Optional[Callable[[GenerationJob, Dict[str, Any]], None]] = None,
+    lane: str = "interactive",
+    pipeline: Optional[str] = None,
+) -> None:
+    """`run` must not commit; `after_commit` runs once the result is stored.
+
+    With `pipeline`, the run is timed and its stages are written after the
+    job's transaction ends, so they do not wait on the job's own writes.
+    """
+    _HANDLERS[kind] = _JobHandler(
+        run=run, after_commit=after_commit, lane=lane, pipeline=pipeline
+    )
+
+
+def _new_job_id() -> str:
+    now = dt.datetime.now()
+    return f"job{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+
+
+def enqueue_job(
+    db: Session,
+    *,
+    kind: str,
+    user_id: str,
+    principal: Principal,
+    payload: Dict[str, Any],
+    application_id: Optional[str] = None,
+    dedupe_key: Optional[str] = None,
+    priority: int = 0,
+) -> Tuple[GenerationJob, bool]:
+    """Add a queued job (caller commits). Returns (job, created).
+
+    While a job with the same kind + dedupe_key is still queued/running it is
+    returned instead of queuing a duplicate.
+    """
+    if dedupe_key:
+        existing = (
+            db.query(GenerationJob)
+            .filter(
+                GenerationJob.kind == kind,
+                GenerationJob.dedupe_key == dedupe_key,
+                GenerationJob.status.in_(ACTIVE_JOB_STATUSES),
+            )
+            .order_by(GenerationJob.created_at.desc())
+            .first()
+        )
+        if existing:
+            return existing, False
+
+    now = dt.datetime.now()
+    job = GenerationJob(
+        id=_new_job_id(),
+        kind=kind,
+        user_id=user_id,
+        principal_type=principal.type,
+        principal_id=principal.id,
+        application_id=application_id,
+        status="queued",
+        dedupe_key=dedupe_key,
+        priority=priority,
+        payload_json=json.dumps(payload, ensure_ascii=False),
+        attempts=0,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    db.flush()
+    return job, True
+
+
+def job_status_dict(job: GenerationJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "application_id": job.application_id,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _claimable(now: dt.datetime):
+    return or_(
+        GenerationJob.status == "queued",
+        and_(
+            GenerationJob.status == "running",
+            GenerationJob.locked_until < now,
+        ),
+    )
+
+
+def _fail_exhausted_jobs(db: Session, now: dt.datetime) -> None:
+    n = (
+        db.query(GenerationJob)
+        .filter(
+            GenerationJob.status == "running",
+            GenerationJob.locked_until < now,
+            GenerationJob.attempts >= JOB_MAX_ATTEMPTS,
+        )
+        .update(
+            {
+                GenerationJob.status: "failed",
+                GenerationJob.error: "Worker lease expired too many times",
+                GenerationJob.locked_by: None,
+                GenerationJob.locked_until: None,
+                GenerationJob.finished_at: now,
+                GenerationJob.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+    )
+    if n:
+        print("jobs: failed", n, "job(s) with exhausted attempts")
+    db.commit()
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[GenerationJob]:
+    """Atomically take the oldest claimable job of the highest priority, or return None."""
+    now = dt.datetime.now()
+    _fail_exhausted_jobs(db, now)
+
+    candidates = (
+        db.query(GenerationJob.id)
+        .filter(_claimable(now), GenerationJob.kind.in_(list(_HANDLERS)))
+        .order_by(GenerationJob.priority.desc(), GenerationJob.created_at)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        claimed = (
+            db.query(GenerationJob)
+            .filter(GenerationJob.id == job_id, _claimable(now))
+            .update(
+                {
+                    GenerationJob.status: "running",
+                    GenerationJob.locked_by: worker_id,
+                    GenerationJob.locked_until: now
+                    + dt.timedelta(seconds=JOB_LEASE_SECONDS),
+                    GenerationJob.attempts: GenerationJob.attempts + 1,
+                    GenerationJob.started_at: now,
+                    GenerationJob.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            return db.get(GenerationJob, job_id)
+    return None
+
+
+def _finish_job(db: Session, job: GenerationJob, worker_id: str, values: Dict) -> bool:
+    """Write the final state if we still hold the lease; commits with pending handler rows."""
+    now = dt.datetime.now()
+    values = {
+        **values,
+        GenerationJob.locked_by: None,
+        GenerationJob.locked_until: None,
+        GenerationJob.updated_at: now,
+    }
+    n = (
+        db.query(GenerationJob)
+        .filter(
+            GenerationJob.id == job.id,
+            GenerationJob.status == "running",
+            GenerationJob.locked_by == worker_id,
+        )
+        .update(values, synchronize_session=False)
+    )
+    if not n:
+        db.rollback()
+        print("jobs: lost lease, discarding result:", job.id)
+        return False
+    db.commit()
+    return True
+
+
+def _renew_lease(job_id: str, worker_id: str) -> bool:
+    """Push our lease out by another JOB_LEASE_SECONDS; False once it is no longer ours."""
+    db = SessionLocal()
+    try:
+        now = dt.datetime.now()
+        n = (
+            db.query(GenerationJob)
+            .filter(
+                GenerationJob.id == job_id,
+                GenerationJob.status == "running",
+                GenerationJob.locked_by == worker_id,
+            )
+            .update(
+                {
+                    GenerationJob.locked_until: now + dt.timedelta(seconds=JOB_LEASE_SECONDS),
+                    GenerationJob.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return bool(n)
+    finally:
+        db.close()
+
+
+@contextmanager
+def _lease_heartbeat(job_id: str, worker_id: str) -> Iterator[None]:
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                if not _renew_lease(job_id, worker_id):
+                    print("jobs: lease lost, heartbeat stopped:", job_id)
+                    return
+            except Exception as e:
+                print("jobs: lease renewal failed:", job_id, e)
+
+    thread = threading.Thread(target=beat, name=f"lease-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _is_retryable(exc: Exception) -> bool:
+    # 4xx means the request itself is bad; retrying will not help.
+    if isinstance(exc, HTTPException):
+        return exc.status_code >= 500
+    return True
+
+
+def run_job(db: Session, job: GenerationJob, worker_id: str) -> None:
+    handler = _HANDLERS[job.kind]
+    job_id, user_id = job.id, job.user_id
+    # A handler's own track_pipeline reuses this timer
+    timed = track_pipeline(handler.pipeline, user_id) if handler.pipeline else nullcontext()
+    with timed:
+        result = _run_and_finish(db, job, worker_id, handler)
+    if result is not None and handler.after_commit:
+        try:
+            handler.after_commit(db.get(GenerationJob, job_id), result)
+        except Exception as e:
+            print("jobs: after_commit failed:", job_id, e)
+
+
+def _run_and_finish(
+    db: Session, job: GenerationJob, worker_id: str, handler: _JobHandler
+) -> Optional[Dict[str, Any]]:
+    """Run the handler and store its outcome; the result if it was committed."""
+    job_id, attempts = job.id, job.attempts
+    t0 = time.perf_counter()
+    try:
+        with _lease_heartbeat(job_id, worker_id), work_lane(handler.lane), tenant_scope(
+            tenant_key(job.principal_type, job.principal_id)
+        ), hold_transaction(db):
+            result = handler.run(db, job)
+    except Exception as e:
+        db.rollback()
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        retry = _is_retryable(e) and attempts < JOB_MAX_ATTEMPTS
+        print("jobs: failed", job_id, "attempt", attempts, "retry" if retry else "", e)
+        timer = current_timer()
+        if timer is not None:
+            timer.status = "cancelled" if isinstance(e, DeadlineExceeded) else "error"
+        job = db.get(GenerationJob, job_id)
+        _finish_job(
+            db,
+            job,
+            worker_id,
+            {
+                GenerationJob.status: "queued" if retry else "failed",
+                GenerationJob.error: str(detail)[:2000],
+                GenerationJob.finished_at: None if retry else dt.datetime.now(),
+            },
+        )
+        return None
+
+    ok = _finish_job(
+        db,
+        job,
+        worker_id,
+        {
+            GenerationJob.status: "succeeded",
+            GenerationJob.result_json: json.dumps(result, ensure_ascii=False),
+            GenerationJob.error: None,
+            GenerationJob.finished_at: dt.datetime.now(),
+        },
+    )
+    print("jobs: done", job_id, "ok" if ok else "discarded", f"{time.perf_counter() - t0:.2f}s")
+    return result if ok else None
+
+
+def run_pending_jobs(worker_id: str, max_jobs: Optional[int] = None) -> int:
+    """Drain claimable jobs once; returns how many were run."""
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        db = SessionLocal()
+        try:
+            job = claim_next_job(db, worker_id)
+            if not job:
+                break
+            run_job(db, job, worker_id)
+            done += 1
+        finally:
+            db.close()
+    return done
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def run_worker(stop: Optional[threading.Event] = None, worker_id: Optional[str] = None) -> None:
+    """Poll forever (or until `stop` is set), running jobs one at a time."""
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    print("jobs: worker started", worker_id)
+    while not stop.is_set():
+        try:
+            if run_pending_jobs(worker_id) == 0:
+                stop.wait(JOB_POLL_SECONDS)
+        except Exception as e:
+            print("jobs: worker loop error:", e)
+            stop.wait(JOB_POLL_SECONDS)
+
+
+def start_worker_thread() -> threading.Thread:
+    """In-process worker for single-box deployments (GENERATION_WORKER_INLINE=1)."""
+    t = threading.Thread(target=run_worker, name="generation-worker", daemon=True)
+    t.start()
+    return t
@@ -165,3 +165,17 @@ def migrate_sqlite(engine: Engine) -> None:
             """
                 )
             )
+
+    # resume_versions.cover_letter / cover_letter_status / cover_letter_instructions
+    # (deferred cover letters)
+    for col in ("cover_letter", "cover_letter_status", "cover_letter_instructions"):
+        if not _has_column(engine, "resume_versions", col):
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE resume_versions ADD COLUMN {col} TEXT;"))
+
+    # generation_jobs.priority (speculative jobs run after interactive ones)
+    if _has_table(engine, "generation_jobs") and not _has_column(engine, "generation_jobs", "priority"):
+        with engine.begin() as conn:
+            conn.execute(
+                text("ALTER TABLE generation_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;")
+            )
@@ -3,6 +3,7 @@ from datetime import datetime
 from sqlalchemy import (
     Column,
     Integer,
+    Float,
     String,
     DateTime,
     Text,
@@ -135,9 +136,119 @@ class ResumeVersion(Base):
     jd_key_id = Column(Integer, nullable=True)
     schema_version = Column(String, nullable=False, default="tailor_v2")
     tailored_json = Column(Text, nullable=False)
+    cover_letter = Column(Text, nullable=True)
+    cover_letter_status = Column(String, nullable=True)  # pending|ready|failed
+    cover_letter_instructions = Column(Text, nullable=True)  # for a deferred cover letter
     created_at = Column(DateTime, default=datetime.now, nullable=False)
 
 
+class TailorCache(Base):
+    """Cached `tailor_bullets` output so repeated exports skip the model call."""
+
+    __tablename__ = "tailor_cache"
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(String, index=True, nullable=False)
+    base_resume_hash = Column(String, nullable=False)
+    jd_key_id = Column(Integer, index=True, nullable=False)
+    max_roles = Column(Integer, nullable=False)
+    include_cover_letter = Column(Integer, default=0)  # 0/1
+    cover_letter_hash = Column(String, nullable=True)
+    model = Column(String, nullable=False)
+    result_json = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
+class BlobRef(Base):
+    """Reference count for a blob in the local content-addressed store."""
+
+    __tablename__ = "blob_refs"
+    sha256 = Column(String, primary_key=True)
+    size = Column(Integer, nullable=False, default=0)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
+class IdempotencyRecord(Base):
+    """Stored outcome of an idempotent request (see app/idempotency.py)."""
+
+    __tablename__ = "idempotency_records"
+    id = Column(String, primary_key=True)  # sha256(scope, user_id, key)
+    scope = Column(String, nullable=False)
+    user_id = Column(String, index=True, nullable=False)
+    request_hash = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # in_progress|completed
+    response_json = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class GenerationJob(Base):
+    """Queued long-running work (e.g. apply-and-generate) picked up by a worker."""
+
+    __tablename__ = "generation_jobs"
+    id = Column(String, primary_key=True)
+    kind = Column(String, index=True, nullable=False)
+    user_id = Column(String, index=True, nullable=False)
+    principal_type = Column(String, nullable=False)  # user|admin
+    principal_id = Column(String, nullable=False)
+    application_id = Column(String, index=True, nullable=True)
+    status = Column(String, index=True, nullable=False, default="queued")
+    # queued|running|succeeded|failed
+    dedupe_key = Column(String, index=True, nullable=True)
+    priority = Column(Integer, nullable=False, default=0)  # higher is claimed first
+    payload_json = Column(Text, nullable=False, default="{}")
+    result_json = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class StageTiming(Base):
+    """One timed stage of a generation pipeline run (see app/timings.py)."""
+
+    __tablename__ = "stage_timings"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, index=True, nullable=False)
+    pipeline = Column(String, index=True, nullable=False)
+    stage = Column(String, nullable=False)  # "total" for the whole run
+    ms = Column(Float, nullable=False)
+    status = Column(String, nullable=False, default="ok")  # ok|blocked|error|cancelled
+    user_id = Column(String, index=True, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
+
+
+class UploadSession(Base):
+    """A signed direct-to-storage upload, from signing until the file is registered."""
+
+    __tablename__ = "upload_sessions"
+    id = Column(String, primary_key=True)
+    user_id = Column(String, index=True, nullable=False)
+    principal_type = Column(String, nullable=False)
+    principal_id = Column(String, nullable=False)
+    purpose = Column(String, nullable=False)  # base_resume_docx|resume_template_docx|tailored_resume
+    application_id = Column(String, nullable=False)  # "base" for per-user files
+    filename = Column(String, nullable=False)
+    backend = Column(String, nullable=False)  # cloudinary|local
+    object_key = Column(String, nullable=True)  # backend id the upload was signed for
+    path = Column(String, nullable=True)  # StoredFile.path once uploaded
+    status = Column(String, index=True, nullable=False, default="pending")
+    # pending|processing|completed|failed
+    error = Column(Text, nullable=True)
+    stored_file_id = Column(String, nullable=True)
+    result_json = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
 class StoredFile(Base):
     __tablename__ = "stored_files"
     id = Column(String, primary_key=True)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import re
 from io import BytesIO
-from typing import Any, Dict, List, Optional, Tuple, Set
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Set
 
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -84,14 +84,14 @@ def _looks_like_contact_line(t: str) -> bool:
 # ---------------------------
 
 
-def extract_resume_json_from_docx(docx_bytes: bytes) -> Dict[str, Any]:
+def extract_resume_json_from_docx(docx_bytes: bytes | BinaryIO) -> Dict[str, Any]:
     """
-    Best-effort DOCX -> structured resume JSON.
+    Best-effort DOCX -> structured resume JSON (from bytes or an open file).
 
     - Extracts summary paragraphs (non-bullets near the top).
     - Extracts bullet blocks as experiences, storing bullet_para_idxs.
     """
-    doc = Document(BytesIO(docx_bytes))
+    doc = Document(docx_bytes if hasattr(docx_bytes, "read") else BytesIO(docx_bytes))
     paragraphs = list(doc.paragraphs)
 
     # ---- 1) Find summary near top ----
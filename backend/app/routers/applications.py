@@ -11,6 +11,8 @@ from pydantic import BaseModel, Field
 
 from ..auth import Principal, get_db, get_principal
 from ..models import Application, AdminUser, JobDescription, Admin, User, StoredFile
+from ..speculation import queue_speculation
+from ..storage import download_url
 
 router = APIRouter(prefix="/v1", tags=["applications"])
 
@@ -62,13 +64,42 @@ def _ensure_access(db: Session, principal: Principal, user_id: str) -> None:
         raise HTTPException(status_code=403, detail="Forbidden")
 
 
+def _speculate_from_known_posting(
+    db: Session, principal: Principal, user_id: str, url: str
+) -> Optional[str]:
+    # Only postings the caller can already see: another tenant's JD stays theirs
+    known = (
+        _scoped_query(db, principal)
+        .join(JobDescription, JobDescription.application_id == Application.id)
+        .add_entity(JobDescription)
+        .filter(Application.url == url)
+        .order_by(Application.created_at.desc())
+        .first()
+    )
+    if not known:
+        return None
+    application, job_description = known
+    return queue_speculation(
+        db,
+        principal,
+        user_id=user_id,
+        url=url,
+        jd_text=job_description.jd_text,
+        company=application.company,
+        position=application.role,
+    )
+
+
 @router.get("/applications/exists")
 def exists_application(
     user_id: str,
     url: str,
+    speculate: bool = False,
     db: Session = Depends(get_db),
     principal: Principal = Depends(get_principal),
 ):
+    """`speculate=true` pre-generates a resume when the posting's JD is already
+    known from another application (see app/speculation.py)."""
     _ensure_access(db, principal, user_id)
     row = (
         db.query(Application, JobDescription)
@@ -82,7 +113,10 @@ def exists_application(
     )
 
     if not row:
-        return {"exists": False}
+        out = {"exists": False}
+        if speculate:
+            out["speculation_job_id"] = _speculate_from_known_posting(db, principal, user_id, url)
+        return out
 
     application, job_description = row
 
@@ -559,8 +593,8 @@ def list_applications(
                 if pdf and getattr(pdf, "resume_version_id", None)
                 else (docx.resume_version_id if docx else None)
             ),
-            "resume_docx_download_url": docx.path if docx else None,
-            "resume_pdf_download_url": pdf.path if pdf else None,
+            "resume_docx_download_url": download_url(docx) if docx else None,
+            "resume_pdf_download_url": download_url(pdf) if pdf else None,
         }
 
     if not dedupe:
@@ -587,8 +621,8 @@ def list_applications(
                         if pdf and getattr(pdf, "resume_version_id", None)
                         else (docx.resume_version_id if docx else None)
                     ),
-                    "resume_docx_download_url": docx.path if docx else None,
-                    "resume_pdf_download_url": pdf.path if pdf else None,
+                    "resume_docx_download_url": download_url(docx) if docx else None,
+                    "resume_pdf_download_url": download_url(pdf) if pdf else None,
                 }
             )
 
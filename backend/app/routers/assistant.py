@@ -18,7 +18,9 @@ from ..models import (
     ApplicationUpdateSuggestion,
     EmailEvent,
 )
-from ..services.ai_service import AIService
+from ..deadlines import DeadlineExceeded, timeout_for
+from ..scheduler import scheduled
+from ..services.ai_service import OPENAI_TIMEOUT_SECONDS, AIService
 
 router = APIRouter()
 
@@ -527,13 +529,17 @@ def _run_openai_chat(
 
     try:
         svc = AIService()
-        resp = svc.client.chat.completions.create(
-            model=_ASSISTANT_MODEL,
-            messages=messages,
-            temperature=0.4,
-        )
+        with scheduled("llm"):
+            resp = svc.client.chat.completions.create(
+                model=_ASSISTANT_MODEL,
+                messages=messages,
+                temperature=0.4,
+                timeout=timeout_for(OPENAI_TIMEOUT_SECONDS),
+            )
         text = (resp.choices[0].message.content or "").strip()
         return text or _fallback_reply(user_text, context)
+    except DeadlineExceeded:
+        raise
     except Exception as e:  # noqa: BLE001
         # Don't crash the demo — surface a readable fallback.
         return (
@@ -1,13 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import RedirectResponse
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from ..db import SessionLocal
-from ..models import StoredFile
+from ..db import SessionLocal, release_connection
+from ..models import AdminUser, ResumeVersion, StoredFile, User
 from ..auth import get_principal, Principal
+from ..services.file_cache import file_cache
+from ..services.pdf_service import docx_bytes_to_pdf_bytes
+from ..services.render_service import render_resume_files
+from ..storage import (
+    PENDING_SCHEME,
+    LocalBlobBackend,
+    get_backend,
+    is_local_path,
+    is_pending_path,
+    local_blob_path,
+    read_bytes,
+    save_bytes,
+)
 
 router = APIRouter()
 
+# How long a second download waits for the first one's conversion
+PDF_MATERIALIZE_WAIT_SECONDS = float(os.getenv("PDF_MATERIALIZE_WAIT_SECONDS", "120"))
+
+_PDF_FLIGHTS: Dict[str, threading.Event] = {}
+_PDF_FLIGHTS_GUARD = threading.Lock()
+
+# redirect: send clients to the storage URL; proxy: stream remote files from
+# the local download cache (Range requests supported)
+FILE_DOWNLOAD_MODE = os.getenv("FILE_DOWNLOAD_MODE", "redirect").lower().strip()
+FILE_DOWNLOAD_MAX_AGE = int(os.getenv("FILE_DOWNLOAD_MAX_AGE", "3600"))
+FILE_LOCATION_TTL_SECONDS = float(os.getenv("FILE_LOCATION_TTL_SECONDS", "300"))
+FILE_LOCATION_CACHE_SIZE = int(os.getenv("FILE_LOCATION_CACHE_SIZE", "10000"))
+
+
+@dataclass
+class _Location:
+    """What a download needs from a StoredFile row."""
+
+    path: str
+    mime: str
+    filename: str
+    modified: dt.datetime
+    cached_at: float
+
+    @property
+    def etag(self) -> str:
+        if is_local_path(self.path):
+            return f'"{LocalBlobBackend.digest_of(self.path)}"'  # content hash already
+        # Remote URLs carry a version, so a new upload means a new path
+        return f'"{hashlib.sha256(self.path.encode()).hexdigest()[:32]}"'
+
+    def cache_headers(self) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.modified.timestamp(), usegmt=True),
+            "Cache-Control": f"private, max-age={FILE_DOWNLOAD_MAX_AGE}",
+        }
+
+
+class _LocationCache:
+    """file id -> location, so repeat downloads skip the DB (LRU, with a TTL).
+
+    Code that deletes or repoints a StoredFile calls `invalidate_after_commit`.
+    Other processes only see the change once the TTL runs out.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, _Location]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, file_id: str) -> Optional[_Location]:
+        with self._lock:
+            loc = self._items.get(file_id)
+            if loc is not None and time.time() - loc.cached_at < self.ttl:
+                self._items.move_to_end(file_id)
+                self.stats["hits"] += 1
+                return loc
+            self._items.pop(file_id, None)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, file_id: str, sf: StoredFile) -> _Location:
+        loc = _Location(
+            path=sf.path,
+            mime=sf.mime,
+            filename=sf.filename,
+            modified=sf.created_at,
+            cached_at=time.time(),
+        )
+        if is_pending_path(sf.path):
+            return loc  # about to change
+        with self._lock:
+            self._items[file_id] = loc
+            self._items.move_to_end(file_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return loc
+
+    def invalidate(self, file_id: str) -> None:
+        with self._lock:
+            self._items.pop(file_id, None)
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._items)}
+
+
+file_locations = _LocationCache(FILE_LOCATION_CACHE_SIZE, FILE_LOCATION_TTL_SECONDS)
+
+
+def invalidate_after_commit(db, file_ids: Iterable[str]) -> None:
+    """Drop cached locations once `db` commits (rows deleted or repointed in it)."""
+    db.info.setdefault("stale_file_ids", []).extend(i for i in file_ids if i)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_locations_after_commit(session) -> None:
+    for file_id in session.info.pop("stale_file_ids", None) or []:
+        file_locations.invalidate(file_id)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _forget_locations_after_rollback(session, previous_transaction) -> None:
+    session.info.pop("stale_file_ids", None)
+
 
 def get_db():
     db = SessionLocal()
@@ -17,18 +150,186 @@ def get_db():
         db.close()
 
 
+def _ensure_access(db: Session, principal: Principal, user_id: str) -> None:
+    if principal.type == "user":
+        if principal.id != user_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return
+    ok = (
+        db.query(AdminUser)
+        .filter(AdminUser.admin_id == principal.id, AdminUser.user_id == user_id)
+        .first()
+    )
+    if not ok:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def _render_pending_pdf(db: Session, sf: StoredFile) -> bytes:
+    source = sf.path[len(PENDING_SCHEME):]
+    if source == "docx":
+        docx_sf = (
+            db.query(StoredFile)
+            .filter(
+                StoredFile.resume_version_id == sf.resume_version_id,
+                StoredFile.kind == "resume_docx",
+            )
+            .first()
+        )
+        if not docx_sf:
+            raise HTTPException(404, "Source DOCX for this PDF is missing")
+        docx_path = docx_sf.path
+        release_connection(db)
+        return docx_bytes_to_pdf_bytes(read_bytes(docx_path))
+
+    rv = db.get(ResumeVersion, sf.resume_version_id) if sf.resume_version_id else None
+    if not rv:
+        raise HTTPException(404, "Resume version for this PDF is missing")
+    resume = json.loads(rv.tailored_json or "{}")
+    release_connection(db)
+    _, pdf_bytes = render_resume_files(resume, None, want_pdf=True, want_docx=False)
+    return pdf_bytes
+
+
+def _materialize_pdf(db: Session, file_id: str) -> Tuple[StoredFile, Optional[bytes]]:
+    """Render, store and record a pending PDF once; returns (row, bytes if we rendered it).
+
+    Concurrent first downloads in this process wait for one conversion. Across
+    processes the path is swapped only if it is still the placeholder, so a
+    losing process drops its copy and serves the winner's.
+    """
+    with _PDF_FLIGHTS_GUARD:
+        flight = _PDF_FLIGHTS.get(file_id)
+        leader = flight is None
+        if leader:
+            flight = _PDF_FLIGHTS[file_id] = threading.Event()
+
+    if not leader:
+        flight.wait(PDF_MATERIALIZE_WAIT_SECONDS)
+        db.expire_all()
+        sf = db.get(StoredFile, file_id)
+        if sf is None:
+            raise HTTPException(404, "File not found")
+        if is_pending_path(sf.path):
+            raise HTTPException(
+                status_code=503,
+                detail="PDF is still being generated",
+                headers={"Retry-After": "5"},
+            )
+        return sf, None
+
+    try:
+        sf = db.get(StoredFile, file_id)
+        if sf is None:
+            raise HTTPException(404, "File not found")
+        placeholder = sf.path
+        user = db.get(User, sf.user_id)
+        user_info = f"{user.name}-{user.id}" if user else sf.user_id
+        application_id = sf.application_id
+        try:
+            pdf_bytes = _render_pending_pdf(db, sf)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print("pdf materialize failed:", file_id, e)
+            raise HTTPException(502, "Failed to generate PDF")
+
+        path = save_bytes(user_info, application_id, f"{file_id}.pdf", pdf_bytes)
+        swapped = (
+            db.query(StoredFile)
+            .filter(StoredFile.id == file_id, StoredFile.path == placeholder)
+            .update({StoredFile.path: path}, synchronize_session=False)
+        )
+        db.commit()
+        if swapped:
+            file_locations.invalidate(file_id)
+        else:
+            get_backend(path).release(path)
+        print("pdf materialized:", file_id, len(pdf_bytes), "bytes", "" if swapped else "(lost race)")
+        db.expire_all()
+        return db.get(StoredFile, file_id), pdf_bytes
+    finally:
+        flight.set()
+        with _PDF_FLIGHTS_GUARD:
+            _PDF_FLIGHTS.pop(file_id, None)
+
+
+def _not_modified(request: Request, loc: _Location) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+        return "*" in tags or loc.etag in tags
+    ims = request.headers.get("if-modified-since")
+    if not ims:
+        return False
+    try:
+        since = parsedate_to_datetime(ims)
+    except (TypeError, ValueError):
+        return False
+    return int(loc.modified.timestamp()) <= since.timestamp()
+
+
 @router.get("/files/{file_id}")
 @router.get("/v1/files/{file_id}")
 @router.get("/v1/files/{file_id}/download")
 def download_file(
     file_id: str,
+    request: Request,
     db: Session = Depends(get_db),
-    # principal: Principal = Depends(get_principal),
+    x_auth_token: Optional[str] = Header(default=None, alias="X-Auth-Token"),
 ):
-    f = db.get(StoredFile, file_id)
-    print("file:", f)
-    if not f:
-        raise HTTPException(404, "File not found")
+    """Stored files download without a token. A pending PDF is rendered on the
+    first download, and that conversion + upload needs a signed-in caller with
+    access to the file's user; anonymous callers get 202 and it stays pending."""
+    # The session only connects when queried, so a cached location costs no DB work
+    loc = file_locations.get(file_id)
+    if loc is None:
+        f = db.get(StoredFile, file_id)
+        if not f:
+            raise HTTPException(404, "File not found")
+        if is_pending_path(f.path):
+            if not x_auth_token:
+                return JSONResponse(
+                    status_code=202,
+                    content={
+                        "status": "pending",
+                        "detail": "PDF not generated yet; sign in to generate it",
+                    },
+                    headers={"Retry-After": "5"},
+                )
+            _ensure_access(db, get_principal(db, x_auth_token), f.user_id)
+            f, pdf_bytes = _materialize_pdf(db, file_id)
+            if pdf_bytes is not None:
+                # Serve what we just rendered instead of reading it back
+                loc = file_locations.put(file_id, f)
+                return Response(
+                    content=pdf_bytes,
+                    media_type=f.mime,
+                    headers={
+                        **loc.cache_headers(),
+                        "Content-Disposition": f'attachment; filename="{f.filename}"',
+                    },
+                )
+        loc = file_locations.put(file_id, f)
+        release_connection(db)
+
+    headers = loc.cache_headers()
+    if _not_modified(request, loc):
+        return Response(status_code=304, headers=headers)
+
+    if is_local_path(loc.path):
+        blob = local_blob_path(loc.path)
+        if not blob.exists():
+            raise HTTPException(404, "File content missing")
+        return FileResponse(blob, media_type=loc.mime, filename=loc.filename, headers=headers)
+
+    if FILE_DOWNLOAD_MODE == "proxy":
+        try:
+            cached = file_cache.local_copy(file_id, loc.path)
+        except Exception as e:
+            print("file proxy failed, redirecting:", file_id, e)
+            cached = None
+        if cached is not None:
+            return FileResponse(cached, media_type=loc.mime, filename=loc.filename, headers=headers)
 
-    # f.path is now a Cloudinary secure URL
-    return RedirectResponse(f.path)
+    # loc.path is a Cloudinary secure URL
+    return RedirectResponse(loc.path, headers=headers)
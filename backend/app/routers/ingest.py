@@ -1,30 +1,54 @@
 from __future__ import annotations
 
-import base64
+import contextvars
 import datetime as dt
 import json
-import zipfile
-from io import BytesIO
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from sqlalchemy.orm import Session
 
 from ..auth import Principal, get_db, get_principal
+from ..db import SessionLocal, release_connection
 from ..models import (
     AdminUser,
     Application,
     BaseResume,
+    GenerationJob,
     StoredFile,
     ResumeVersion,
     User,
     JobDescription,
 )
-from ..storage import save_bytes
+from ..idempotency import canonical_url, request_fingerprint, run_idempotent
+from ..jobs import enqueue_job, job_status_dict, register_job_handler
+from ..services.upload_service import receive_upload
+from ..speculation import take_speculative_resume
+from ..storage import Upload, pending_path, release_after_commit, save_file, save_many
+from ..timings import TIMINGS_HEADER, attach_timings, stage, track_pipeline
+from .files import invalidate_after_commit
 from .jd import get_or_create_jd_keys
-from .resume_builder import _generate_resume_bundle, GenerateResumeFromScratchIn
+from .resume_builder import _build_resume_artifacts, _plan_export, GenerateResumeFromScratchIn
+from .resume_versions import (
+    cover_letter_url,
+    generate_cover_letter_in_background,
+    validate_cover_letter_mode,
+)
 
 router = APIRouter(prefix="/v1", tags=["ingest"])
 
@@ -44,55 +68,70 @@ def _ensure_access(db: Session, principal: Principal, user_id: str) -> None:
         raise HTTPException(status_code=403, detail="Forbidden")
 
 
+GENERATION_PDF_MODE = os.getenv("GENERATION_PDF_MODE", "eager")
+PDF_MODES = ("eager", "lazy")
+
+
+def validate_pdf_mode(mode: str) -> str:
+    mode = (mode or "eager").lower().strip()
+    if mode not in PDF_MODES:
+        raise HTTPException(status_code=400, detail="pdf_mode must be one of: eager, lazy")
+    return mode
+
+
 class ApplyAndGenerateIn(BaseModel):
     user_id: str
     url: str
     source_site: Optional[str] = None
     company: str
     include_cover_letter: bool = True
+    # inline: written by the resume call; lazy: on first GET; background: after response
+    cover_letter_mode: str = "inline"
+    # for a lazy/background cover letter; stored with the resume version
+    cover_letter_instructions: str = ""
     position: str
     jd_text: str = ""
     have_to_generate: bool = True
     resume_json_text: Optional[str] = None
+    # eager: render + upload the PDF now; lazy: on its first download
+    pdf_mode: str = GENERATION_PDF_MODE
 
 
-@router.post("/ingest/upload-tailored-resume")
-async def upload_tailored_resume(
-    application_id: str = Form(...),
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    principal: Principal = Depends(get_principal),
-):
-    app_row = db.get(Application, application_id)
-    if not app_row:
-        raise HTTPException(status_code=404, detail="Application not found")
+TAILORED_UPLOAD_TYPES = {
+    ".pdf": ("resume_pdf", "application/pdf"),
+    # Keep Word uploads under the existing resume_docx kind so current
+    # application listing code continues to expose the uploaded resume.
+    ".doc": ("resume_docx", "application/msword"),
+    ".docx": (
+        "resume_docx",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ),
+}
 
-    _ensure_access(db, principal, app_row.user_id)
 
-    filename = (file.filename or "").strip()
+def _upload_ext(filename: str) -> str:
     ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    allowed = {
-        ".pdf": ("resume_pdf", "application/pdf"),
-        # Keep Word uploads under the existing resume_docx kind so current
-        # application listing code continues to expose the uploaded resume.
-        ".doc": ("resume_docx", "application/msword"),
-        ".docx": (
-            "resume_docx",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        ),
-    }
-    if ext not in allowed:
+    if ext not in TAILORED_UPLOAD_TYPES:
         raise HTTPException(
             status_code=400,
             detail="Only .pdf, .doc, and .docx resume files are supported",
         )
-
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty")
-
+    return ext
+
+
+def record_tailored_upload(
+    db: Session,
+    app_row: Application,
+    *,
+    file_id: str,
+    path: str,
+    filename: str,
+    ext: str,
+) -> Dict[str, Any]:
+    """Add the manual ResumeVersion + StoredFile for an uploaded resume, replacing
+    the application's previous resume files. Caller commits."""
     now = dt.datetime.now()
-    resume_kind, mime = allowed[ext]
+    resume_kind, mime = TAILORED_UPLOAD_TYPES[ext]
     resume_version_id = (
         f"manual_edit_{app_row.id}_{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
     )
@@ -107,33 +146,23 @@ async def upload_tailored_resume(
     )
     db.add(resume_version)
 
-    (
-        db.query(StoredFile)
-        .filter(
-            StoredFile.application_id == app_row.id,
-            StoredFile.kind.in_(["resume_docx", "resume_pdf"]),
-        )
-        .delete(synchronize_session=False)
+    replaced = db.query(StoredFile).filter(
+        StoredFile.application_id == app_row.id,
+        StoredFile.kind.in_(["resume_docx", "resume_pdf"]),
+        StoredFile.id != file_id,
     )
+    replaced_rows = replaced.with_entities(StoredFile.id, StoredFile.path).all()
+    release_after_commit(db, [p for _, p in replaced_rows])
+    invalidate_after_commit(db, [i for i, _ in replaced_rows])
+    replaced.delete(synchronize_session=False)
 
-    user = db.get(User, app_row.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    file_id = f"file{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
-    rel_path = save_bytes(
-        f"{user.name or user.id}-{user.id}",
-        app_row.id,
-        f"{file_id}{ext}",
-        data,
-    )
     stored = StoredFile(
         id=file_id,
         user_id=app_row.user_id,
         application_id=app_row.id,
         resume_version_id=resume_version_id,
         kind=resume_kind,
-        path=rel_path,
+        path=path,
         filename=filename or f"resume{ext}",
         mime=mime,
         created_at=now,
@@ -141,8 +170,6 @@ async def upload_tailored_resume(
     db.add(stored)
 
     app_row.updated_at = now
-    db.commit()
-
     return {
         "application_id": app_row.id,
         "resume_version_id": resume_version_id,
@@ -154,14 +181,50 @@ async def upload_tailored_resume(
     }
 
 
-@router.post("/ingest/apply-and-generate")
-def apply_and_generate(
-    payload: ApplyAndGenerateIn,
+@router.post("/ingest/upload-tailored-resume")
+async def upload_tailored_resume(
+    application_id: str = Form(...),
+    file: UploadFile = File(...),
     db: Session = Depends(get_db),
     principal: Principal = Depends(get_principal),
 ):
-    _ensure_access(db, principal, payload.user_id)
+    app_row = db.get(Application, application_id)
+    if not app_row:
+        raise HTTPException(status_code=404, detail="Application not found")
+
+    _ensure_access(db, principal, app_row.user_id)
+
+    filename = (file.filename or "").strip()
+    ext = _upload_ext(filename)
+    fh = await receive_upload(file, ext[1:])
+
+    user = db.get(User, app_row.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
+    now = dt.datetime.now()
+    file_id = f"file{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+    # Upload before opening the write transaction; rows only once it succeeded
+    release_connection(db)
+    rel_path = await run_in_threadpool(
+        save_file,
+        f"{user.name or user.id}-{user.id}",
+        app_row.id,
+        f"{file_id}{ext}",
+        fh,
+    )
+
+    out = record_tailored_upload(
+        db, app_row, file_id=file_id, path=rel_path, filename=filename, ext=ext
+    )
+    db.commit()
+    return out
+
+
+def _upsert_application(
+    db: Session, payload: ApplyAndGenerateIn, principal: Principal
+) -> Application:
+    """Create or refresh the application + JD rows for (user_id, url). Flushes, never commits."""
     now = dt.datetime.now()
     # idempotent by (user_id, url)
     existing = (
@@ -226,84 +289,132 @@ def apply_and_generate(
             "after flush jd exists?",
             db.query(JobDescription).filter_by(application_id=app_row.id).count(),
         )
+    return app_row
 
-    if not payload.have_to_generate:
-        db.commit()
-        return {
-            "application_id": app_row.id,
-            "message": "Application created without resume generation as requested",
-        }
 
-    keys = None
+def _run_generation(
+    db: Session,
+    payload: ApplyAndGenerateIn,
+    principal: Principal,
+    app_row: Application,
+    *,
+    defer_cover_letter: bool = False,
+    id_suffix: Optional[str] = None,
+    keys: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Generate, upload and record the resume for an application.
+
+    Runs in short phases: JD keys, generation/rendering and uploads each start
+    with no open transaction, so the pooled connection is only held for DB work.
+    The final version/file rows are flushed but left for the caller to commit.
+
+    `id_suffix` pins the version/file ids (used by queued jobs) so a retried run
+    overwrites the same storage objects and rows instead of adding new ones.
+    `keys` are JD keys the caller already has (bulk apply extracts them once).
+    """
+    now = dt.datetime.now()
+    app_id = app_row.id
+    lazy_pdf = validate_pdf_mode(payload.pdf_mode) == "lazy"
+    generated = None
     if not (payload.resume_json_text or "").strip():
-        keys = get_or_create_jd_keys(payload, db, principal)
-    data = _generate_resume_bundle(
+        if keys is None:
+            with stage("jd_keys"):
+                keys = get_or_create_jd_keys(payload, db, principal)
+        with stage("speculation"):
+            generated = take_speculative_resume(
+                user_id=payload.user_id,
+                url=payload.url,
+                jd_text=payload.jd_text,
+                company=payload.company,
+                position=payload.position,
+            )
+    art = _build_resume_artifacts(
         GenerateResumeFromScratchIn(
             user_id=payload.user_id,
             jd_text=payload.jd_text,
             company=payload.company,
             position=payload.position,
             export_format="both",
-            include_cover_letter=payload.include_cover_letter,
+            include_cover_letter=payload.include_cover_letter and not defer_cover_letter,
             resume_json_text=payload.resume_json_text or "",
         ),
         db,
         principal,
+        # both files are stored; a lazy PDF is rendered on first download instead
+        _plan_export("docx" if lazy_pdf else "both"),
+        generated=generated,
     )
 
-    if data.get("blocked"):
-        db.commit()
+    if art.blocked:
         out = {
-            "application_id": app_row.id,
+            "application_id": app_id,
             "blocked": True,
-            "block_reason": data.get("block_reason"),
-            "template_source": data.get("template_source"),
+            "block_reason": art.block_reason,
+            "template_source": art.template_source,
         }
-        if payload.include_cover_letter and "cover_letter" in data:
-            out["cover_letter"] = data["cover_letter"]
+        if art.cover_letter is not None:
+            out["cover_letter"] = art.cover_letter
         return out
 
-    # export endpoint returns a zip bundle when export_format="both"
-    if "bundle_zip_base64" in data:
-        zbytes = base64.b64decode(data["bundle_zip_base64"])
-        zf = zipfile.ZipFile(BytesIO(zbytes))
-        docx_bytes = zf.read("resume.docx")
-        pdf_bytes = zf.read("resume.pdf")
-    else:
-        docx_bytes = base64.b64decode(data["resume_docx_base64"])
-        pdf_bytes = None
+    docx_bytes, pdf_bytes = art.docx_bytes, art.pdf_bytes
+
+    stamp = id_suffix or f"{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+    rv_id = f"rv{stamp}"
+    file_id = f"file{stamp}"
+    resume_pdf_file_id = f"file{stamp}p" if pdf_bytes or lazy_pdf else None
+
+    # Uploads first (concurrently, outside any transaction); rows only once they succeed
+    user = db.get(User, payload.user_id)
+    user_info = f"{user.name}-{user.id}"
+    release_connection(db)
+    uploads = [Upload(user_info, app_id, file_id + ".docx", docx_bytes)]
+    if pdf_bytes:
+        uploads.append(Upload(user_info, app_id, resume_pdf_file_id + ".pdf", pdf_bytes))
+    with stage("upload"):
+        uploaded = save_many(uploads)
+    rel_path = uploaded[0].url
+    pdf_path = uploaded[1].url if pdf_bytes else None
+    if lazy_pdf:
+        # Template PDFs come from the stored DOCX (soffice); built-in ones from the JSON
+        pdf_path = pending_path("docx" if art.template_source else "resume")
 
     # Resume versioning
-    rv_id = f"rv{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+    if id_suffix:
+        db.query(ResumeVersion).filter(ResumeVersion.id == rv_id).delete(
+            synchronize_session=False
+        )
     rv = ResumeVersion(
         id=rv_id,
         user_id=payload.user_id,
-        application_id=app_row.id,
+        application_id=app_id,
         jd_key_id=keys.get("id") if keys else None,
         schema_version="manual_json_v1" if (payload.resume_json_text or "").strip() else "scratch_v1",
-        tailored_json=json.dumps(data.get("resume_json") or {}, ensure_ascii=False),
+        tailored_json=json.dumps(art.resume_json or {}, ensure_ascii=False),
         created_at=now,
     )
+    cover_letter_status = None
+    if defer_cover_letter:
+        cover_letter_status = "pending"
+        rv.cover_letter_instructions = payload.cover_letter_instructions or None
+    elif payload.include_cover_letter:
+        rv.cover_letter = art.cover_letter or ""
+        cover_letter_status = "ready"
+    rv.cover_letter_status = cover_letter_status
     db.add(rv)
 
-    (
-        db.query(StoredFile)
-        .filter(
-            StoredFile.application_id == app_row.id,
-            StoredFile.kind.in_(["resume_docx", "resume_pdf"]),
-        )
-        .delete(synchronize_session=False)
+    replaced = db.query(StoredFile).filter(
+        StoredFile.application_id == app_id,
+        StoredFile.kind.in_(["resume_docx", "resume_pdf"]),
     )
+    replaced_rows = replaced.with_entities(StoredFile.id, StoredFile.path).all()
+    release_after_commit(db, [p for _, p in replaced_rows])
+    invalidate_after_commit(db, [i for i, _ in replaced_rows])
+    replaced.delete(synchronize_session=False)
 
-    file_id = f"file{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
-    user = db.get(User, payload.user_id)
-    rel_path = save_bytes(
-        f"{user.name}-{user.id}", app_row.id, file_id + ".docx", docx_bytes
-    )
     stored = StoredFile(
         id=file_id,
         user_id=payload.user_id,
-        application_id=app_row.id,
+        application_id=app_id,
         resume_version_id=rv_id,
         kind="resume_docx",
         path=rel_path,
@@ -315,19 +426,14 @@ def apply_and_generate(
     db.flush()
     print(
         "after flush stored files:",
-        db.query(StoredFile).filter_by(application_id=app_row.id).count(),
+        db.query(StoredFile).filter_by(application_id=app_id).count(),
     )
 
-    resume_pdf_file_id = None
-    if pdf_bytes:
-        resume_pdf_file_id = f"file{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}p"
-        pdf_path = save_bytes(
-            f"{user.name}-{user.id}", app_row.id, resume_pdf_file_id + ".pdf", pdf_bytes
-        )
+    if pdf_path:
         stored_pdf = StoredFile(
             id=resume_pdf_file_id,
             user_id=payload.user_id,
-            application_id=app_row.id,
+            application_id=app_id,
             resume_version_id=rv_id,
             kind="resume_pdf",
             path=pdf_path,
@@ -339,40 +445,380 @@ def apply_and_generate(
         db.flush()
         print(
             "after flush stored files:",
-            db.query(StoredFile).filter_by(application_id=app_row.id).count(),
+            db.query(StoredFile).filter_by(application_id=app_id).count(),
         )
 
-    db.commit()
-    print(
-        {
-            "application_id": app_row.id,
-            "resume_version_id": rv_id,
-            "resume_docx_file_id": file_id,
-            "resume_pdf_file_id": resume_pdf_file_id,
-            "resume_docx_download_url": f"/v1/files/{file_id}/download",
-            "resume_pdf_download_url": (
-                f"/v1/files/{resume_pdf_file_id}/download"
-                if resume_pdf_file_id
-                else None
-            ),
-            **(
-                {"cover_letter": data["cover_letter"]}
-                if payload.include_cover_letter and "cover_letter" in data
-                else {}
-            ),
-        }
-    )
     out = {
-        "application_id": app_row.id,
+        "application_id": app_id,
         "resume_version_id": rv_id,
-        "template_source": data.get("template_source"),
+        "template_source": art.template_source,
         "resume_docx_file_id": file_id,
         "resume_pdf_file_id": resume_pdf_file_id,
         "resume_docx_download_url": f"/v1/files/{file_id}/download",
         "resume_pdf_download_url": (
             f"/v1/files/{resume_pdf_file_id}/download" if resume_pdf_file_id else None
         ),
+        "resume_pdf_status": "pending" if lazy_pdf else "ready",
+        "speculative": generated is not None,
+    }
+    if art.cover_letter is not None:
+        out["cover_letter"] = art.cover_letter
+    if payload.include_cover_letter:
+        out["cover_letter_status"] = cover_letter_status
+        out["cover_letter_url"] = cover_letter_url(rv_id)
+    return out
+
+
+def _apply_and_generate(
+    db: Session,
+    payload: ApplyAndGenerateIn,
+    principal: Principal,
+    background_tasks: BackgroundTasks,
+    keys: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    cover_letter_mode = validate_cover_letter_mode(payload.cover_letter_mode)
+    defer_cover_letter = payload.include_cover_letter and cover_letter_mode != "inline"
+
+    with stage("db_write"):
+        app_row = _upsert_application(db, payload, principal)
+        # The application is recorded even if generation fails later on
+        release_connection(db)
+
+    if not payload.have_to_generate:
+        return {
+            "application_id": app_row.id,
+            "message": "Application created without resume generation as requested",
+        }
+
+    out = _run_generation(
+        db, payload, principal, app_row, defer_cover_letter=defer_cover_letter, keys=keys
+    )
+    with stage("db_write"):
+        db.commit()
+    if out.get("blocked"):
+        return out
+    if defer_cover_letter and cover_letter_mode == "background":
+        background_tasks.add_task(
+            generate_cover_letter_in_background, out["resume_version_id"]
+        )
+    print(out)
+    return out
+
+
+@router.post("/ingest/apply-and-generate")
+def apply_and_generate(
+    payload: ApplyAndGenerateIn,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    include_timings: Optional[str] = Header(default=None, alias=TIMINGS_HEADER),
+):
+    """Duplicate submits (same Idempotency-Key, or same user + canonical URL within
+    a short window) join the in-flight run or get its stored response replayed."""
+    _ensure_access(db, principal, payload.user_id)
+    validate_cover_letter_mode(payload.cover_letter_mode)
+    validate_pdf_mode(payload.pdf_mode)
+    # Don't hold a pooled connection while waiting on a duplicate
+    release_connection(db)
+
+    with track_pipeline("apply_and_generate", payload.user_id) as timer:
+        out, replayed = run_idempotent(
+            scope="apply-and-generate",
+            user_id=payload.user_id,
+            key=idempotency_key,
+            derived_key=canonical_url(payload.url),
+            request_hash=request_fingerprint(
+                {**payload.model_dump(), "url": canonical_url(payload.url)}
+            ),
+            fn=lambda: _apply_and_generate(db, payload, principal, background_tasks),
+        )
+        if replayed:
+            # The work (and its timings) belong to the original request
+            timer.record = False
+        elif out.get("blocked"):
+            timer.status = "blocked"
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return attach_timings(out, timer, include_timings)
+
+
+# ---------------------------------------------------------------------------
+# Bulk apply: one posting, many managed users. JD keys are extracted once and
+# each user's generation/rendering runs in a bounded thread pool; the model
+# and soffice gates (app/scheduler.py) still bound the scarce work.
+# ---------------------------------------------------------------------------
+
+BULK_APPLY_MAX_USERS = int(os.getenv("BULK_APPLY_MAX_USERS", "50"))
+BULK_APPLY_CONCURRENCY = int(os.getenv("BULK_APPLY_CONCURRENCY", "4"))
+
+
+class BulkApplyAndGenerateIn(BaseModel):
+    user_ids: List[str]
+    url: str
+    source_site: Optional[str] = None
+    company: str
+    position: str
+    jd_text: str = ""
+    include_cover_letter: bool = True
+    cover_letter_mode: str = "inline"
+    have_to_generate: bool = True
+    pdf_mode: str = GENERATION_PDF_MODE
+
+
+def _bulk_apply_one(
+    payload: ApplyAndGenerateIn,
+    principal: Principal,
+    background_tasks: BackgroundTasks,
+    keys: Optional[Dict[str, Any]],
+    idempotency_key: Optional[str],
+) -> Dict[str, Any]:
+    # Sessions are not shared across threads
+    db = SessionLocal()
+    try:
+        out, replayed = run_idempotent(
+            scope="apply-and-generate",
+            user_id=payload.user_id,
+            key=f"{idempotency_key}:{payload.user_id}" if idempotency_key else None,
+            derived_key=canonical_url(payload.url),
+            request_hash=request_fingerprint(
+                {**payload.model_dump(), "url": canonical_url(payload.url)}
+            ),
+            fn=lambda: _apply_and_generate(db, payload, principal, background_tasks, keys),
+        )
+    except Exception as e:
+        db.rollback()
+        status_code = e.status_code if isinstance(e, HTTPException) else 500
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        print("bulk apply: failed for", payload.user_id, e)
+        return {
+            "user_id": payload.user_id,
+            "status": "failed",
+            "status_code": status_code,
+            "error": str(detail)[:500],
+        }
+    finally:
+        db.close()
+    return {
+        "user_id": payload.user_id,
+        "status": "blocked" if out.get("blocked") else "succeeded",
+        "replayed": replayed,
+        "result": out,
     }
-    if payload.include_cover_letter and "cover_letter" in data:
-        out["cover_letter"] = data["cover_letter"]
+
+
+@router.post("/ingest/apply-and-generate/bulk")
+def bulk_apply_and_generate(
+    payload: BulkApplyAndGenerateIn,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    include_timings: Optional[str] = Header(default=None, alias=TIMINGS_HEADER),
+):
+    """Apply several users to one posting; returns one result per user, in order.
+
+    A user that fails (no access, generation error) does not fail the batch.
+    """
+    validate_cover_letter_mode(payload.cover_letter_mode)
+    validate_pdf_mode(payload.pdf_mode)
+    user_ids = list(dict.fromkeys(u.strip() for u in payload.user_ids if u and u.strip()))
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="user_ids is empty")
+    if len(user_ids) > BULK_APPLY_MAX_USERS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BULK_APPLY_MAX_USERS} users per request"
+        )
+
+    results: Dict[str, Dict[str, Any]] = {}
+    per_user: List[ApplyAndGenerateIn] = []
+    for user_id in user_ids:
+        try:
+            _ensure_access(db, principal, user_id)
+        except HTTPException as e:
+            results[user_id] = {
+                "user_id": user_id,
+                "status": "failed",
+                "status_code": e.status_code,
+                "error": e.detail,
+            }
+            continue
+        per_user.append(
+            ApplyAndGenerateIn(user_id=user_id, **payload.model_dump(exclude={"user_ids"}))
+        )
+
+    with track_pipeline("bulk_apply_and_generate") as timer:
+        keys = None
+        if per_user and payload.have_to_generate:
+            # Once for the posting; concurrent per-user runs would all miss the cache
+            with stage("jd_keys"):
+                keys = get_or_create_jd_keys(per_user[0], db, principal)
+        release_connection(db)
+
+        if per_user:
+            with ThreadPoolExecutor(
+                max_workers=max(1, min(BULK_APPLY_CONCURRENCY, len(per_user)))
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        _bulk_apply_one,
+                        p,
+                        principal,
+                        background_tasks,
+                        keys,
+                        idempotency_key,
+                    )
+                    for p in per_user
+                ]
+                for p, fut in zip(per_user, futures):
+                    results[p.user_id] = fut.result()
+
+    ordered = [results[u] for u in user_ids]
+    out = {
+        "url": payload.url,
+        "jd_key_id": keys.get("id") if keys else None,
+        "succeeded": sum(r["status"] == "succeeded" for r in ordered),
+        "blocked": sum(r["status"] == "blocked" for r in ordered),
+        "failed": sum(r["status"] == "failed" for r in ordered),
+        "results": ordered,
+    }
+    return attach_timings(out, timer, include_timings)
+
+
+# ---------------------------------------------------------------------------
+# Queued apply-and-generate: the request only records the application and a
+# job row; a worker (worker.py, or the inline thread) does the generation.
+# ---------------------------------------------------------------------------
+
+APPLY_JOB_KIND = "apply_and_generate"
+
+
+def _job_urls(job_id: str) -> Dict[str, str]:
+    return {
+        "status_url": f"/v1/ingest/jobs/{job_id}",
+        "result_url": f"/v1/ingest/jobs/{job_id}/result",
+    }
+
+
+def _run_apply_job(db: Session, job: GenerationJob) -> Dict[str, Any]:
+    payload = ApplyAndGenerateIn(**json.loads(job.payload_json or "{}"))
+    principal = Principal(type=job.principal_type, id=job.principal_id)
+    cover_letter_mode = validate_cover_letter_mode(payload.cover_letter_mode)
+    defer_cover_letter = payload.include_cover_letter and cover_letter_mode != "inline"
+
+    with track_pipeline("apply_and_generate_job", job.user_id) as timer:
+        app_row = db.get(Application, job.application_id) if job.application_id else None
+        if not app_row:
+            app_row = _upsert_application(db, payload, principal)
+        out = _run_generation(
+            db,
+            payload,
+            principal,
+            app_row,
+            defer_cover_letter=defer_cover_letter,
+            id_suffix=f"_{job.id}",
+        )
+        if out.get("blocked"):
+            timer.status = "blocked"
     return out
+
+
+def _after_apply_job(job: GenerationJob, result: Dict[str, Any]) -> None:
+    payload = json.loads(job.payload_json or "{}")
+    if (
+        result.get("cover_letter_status") == "pending"
+        and (payload.get("cover_letter_mode") or "").lower().strip() == "background"
+    ):
+        generate_cover_letter_in_background(result["resume_version_id"])
+
+
+register_job_handler(
+    APPLY_JOB_KIND,
+    _run_apply_job,
+    after_commit=_after_apply_job,
+    pipeline="apply_and_generate_job",
+)
+
+
+@router.post("/ingest/apply-and-generate/jobs", status_code=202)
+def enqueue_apply_and_generate(
+    payload: ApplyAndGenerateIn,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Record the application now and queue resume generation for a worker."""
+    _ensure_access(db, principal, payload.user_id)
+    validate_cover_letter_mode(payload.cover_letter_mode)
+    validate_pdf_mode(payload.pdf_mode)
+
+    app_row = _upsert_application(db, payload, principal)
+    if not payload.have_to_generate:
+        db.commit()
+        return {
+            "application_id": app_row.id,
+            "job_id": None,
+            "message": "Application created without resume generation as requested",
+        }
+
+    job, created = enqueue_job(
+        db,
+        kind=APPLY_JOB_KIND,
+        user_id=payload.user_id,
+        principal=principal,
+        application_id=app_row.id,
+        payload=payload.model_dump(),
+        dedupe_key=f"{payload.user_id}:{canonical_url(payload.url)}",
+    )
+    if not created:
+        # Maybe the same posting under another URL spelling: keep the queued
+        # job's application instead of writing a second one
+        db.rollback()
+        return {
+            "application_id": job.application_id,
+            "job_id": job.id,
+            "status": job.status,
+            "deduplicated": True,
+            **_job_urls(job.id),
+        }
+    db.commit()
+    return {
+        "application_id": app_row.id,
+        "job_id": job.id,
+        "status": job.status,
+        "deduplicated": False,
+        **_job_urls(job.id),
+    }
+
+
+def _get_job_for(db: Session, principal: Principal, job_id: str) -> GenerationJob:
+    job = db.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    _ensure_access(db, principal, job.user_id)
+    return job
+
+
+@router.get("/ingest/jobs/{job_id}")
+def get_generation_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    job = _get_job_for(db, principal, job_id)
+    return {**job_status_dict(job), **_job_urls(job.id)}
+
+
+@router.get("/ingest/jobs/{job_id}/result")
+def get_generation_job_result(
+    job_id: str,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    job = _get_job_for(db, principal, job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error or 'unknown error'}")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return json.loads(job.result_json or "{}")
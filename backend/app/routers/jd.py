@@ -12,8 +12,10 @@ from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 from ..auth import Principal, get_db, get_principal
+from ..db import SessionLocal, release_connection
 from ..models import AdminUser, JDKeyInfo, JobDescription
 from ..ai import call_openai_json, build_prompt_compress_jd
+from ..speculation import queue_speculation
 
 router = APIRouter(prefix="/v1", tags=["jd"])
 
@@ -24,6 +26,11 @@ class JDKeysIn(BaseModel):
     jd_text: str = Field(
         ..., min_length=1, description="Job description text (full or partial)."
     )
+    company: Optional[str] = None
+    position: Optional[str] = None
+    speculate: bool = Field(
+        False, description="Pre-generate the resume for this posting (SPECULATIVE_GENERATION=1)."
+    )
 
 
 def _ensure_access(db: Session, principal: Principal, user_id: str) -> None:
@@ -76,6 +83,23 @@ def _extract_keys(jd_text: str) -> Dict[str, Any]:
     return json.loads(ats_package)
 
 
+def _with_speculation(
+    db: Session, principal: Principal, payload: Any, out: Dict[str, Any]
+) -> Dict[str, Any]:
+    # Also called by the ingest flow with its own payload type, hence getattr
+    if getattr(payload, "speculate", False):
+        out["speculation_job_id"] = queue_speculation(
+            db,
+            principal,
+            user_id=payload.user_id,
+            url=payload.url,
+            jd_text=payload.jd_text,
+            company=payload.company,
+            position=payload.position,
+        )
+    return out
+
+
 @router.post("/jd/keys")
 def get_or_create_jd_keys(
     payload: JDKeysIn,
@@ -111,14 +135,20 @@ def get_or_create_jd_keys(
         )
 
     if cache:
-        return {
-            "cache_hit": True,
-            "id": cache.id,
-            "scope": "canonical",
-            "source_url": cache.source_url,
-            "keys": json.loads(cache.keys_json),
-        }
+        return _with_speculation(
+            db,
+            principal,
+            payload,
+            {
+                "cache_hit": True,
+                "id": cache.id,
+                "scope": "canonical",
+                "source_url": cache.source_url,
+                "keys": json.loads(cache.keys_json),
+            },
+        )
 
+    release_connection(db)
     keys = _extract_keys(payload.jd_text)
     now = datetime.now()
     row = JDKeyInfo(
@@ -131,16 +161,28 @@ def get_or_create_jd_keys(
         model=os.getenv("OPENAI_JD_MODEL", "gpt-5-mini"),
         created_at=now,
     )
-    db.add(row)
-    db.flush()
-
-    return {
-        "cache_hit": False,
-        "id": row.id,
-        "scope": "canonical",
-        "source_url": row.source_url,
-        "keys": keys,
-    }
+    # Committed on its own session: the keys are a shared cache, not part of
+    # the caller's transaction (a queued job's is held until the job finishes)
+    cache_db = SessionLocal()
+    try:
+        cache_db.add(row)
+        cache_db.commit()
+        row_id = row.id
+    finally:
+        cache_db.close()
+
+    return _with_speculation(
+        db,
+        principal,
+        payload,
+        {
+            "cache_hit": False,
+            "id": row_id,
+            "scope": "canonical",
+            "source_url": source_url,
+            "keys": keys,
+        },
+    )
 
 
 @router.get("/jd/")
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..auth import Principal, get_db, get_principal, require_admin
+from ..deadlines import cancellation_report
+from ..services.file_cache import file_cache
+from ..scheduler import scheduler
+from ..timings import stage_percentiles
+from .files import file_locations
+
+router = APIRouter(prefix="/v1/metrics", tags=["metrics"])
+
+# Metrics span every tenant, so they are admin-only.
+
+
+@router.get("/file-cache")
+def file_cache_metrics(principal: Principal = Depends(get_principal)):
+    """Hit/miss/revalidation counts and size of the download cache, plus file-location cache hits."""
+    require_admin(principal)
+    return {**file_cache.report(), "locations": file_locations.report()}
+
+
+@router.get("/stage-timings")
+def stage_timing_metrics(
+    pipeline: Optional[str] = None,
+    days: float = Query(default=7, gt=0, le=90),
+    status: str = Query(default="ok", description="ok | blocked | error | cancelled | all"),
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """p50/p95/max per stage of the generation pipelines over the last `days`."""
+    require_admin(principal)
+    since = dt.datetime.now() - dt.timedelta(days=days)
+    return {
+        "since": since.isoformat(),
+        "pipelines": stage_percentiles(
+            db, pipeline=pipeline, since=since, status=None if status == "all" else status
+        ),
+    }
+
+
+@router.get("/work-lanes")
+def work_lane_metrics(principal: Principal = Depends(get_principal)):
+    """Per resource and lane: limit, running, queue length and wait times (this process)."""
+    require_admin(principal)
+    return scheduler.report()
+
+
+@router.get("/cancellations")
+def cancellation_metrics(principal: Principal = Depends(get_principal)):
+    """Requests cancelled by client deadline or disconnect, by stage (this process)."""
+    require_admin(principal)
+    return cancellation_report()
@@ -19,6 +19,7 @@ from ..models import (
     AdminUser,
     JobDescription,
 )
+from ..scheduler import scheduled
 
 
 router = APIRouter(prefix="/v1/integrations/outlook", tags=["outlook"])
@@ -289,9 +290,11 @@ def sync_outlook(
         "$orderby": "receivedDateTime desc",
         "$filter": f"receivedDateTime ge {since_iso}",
     }
-    data = _graph_get(
-        integ.access_token, "/me/mailFolders/Inbox/messages", params=params
-    )
+    # Mailbox syncs are background work, whoever triggers them
+    with scheduled("sync", lane="background"):
+        data = _graph_get(
+            integ.access_token, "/me/mailFolders/Inbox/messages", params=params
+        )
     items = data.get("value") or []
     fetched = len(items)
 
@@ -1,29 +1,59 @@
 from __future__ import annotations
 
 import base64
+import datetime as dt
 import json
+import os
 import re
-import requests
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
 from io import BytesIO
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..auth import Principal, get_principal
-from ..db import SessionLocal
-from ..models import AdminUser, AuthCredential, BaseResume, JDKeyInfo, StoredFile, User
+from ..db import SessionLocal, release_connection
+from ..models import (
+    AdminUser,
+    Application,
+    AuthCredential,
+    BaseResume,
+    JDKeyInfo,
+    JobDescription,
+    ResumeVersion,
+    StoredFile,
+    TailorCache,
+    User,
+)
 from ..resume_docx import (
-    build_resume_docx_bytes,
     replace_bullets_in_docx,
     replace_summary_in_docx,
 )
 from ..resume_template_docx import render_resume_template_docx_bytes
-from ..pdf import build_resume_pdf_bytes, resume_to_pdf_bytes
+from ..pdf import resume_to_pdf_bytes
 from ..ai import generate_resume_from_scratch, normalize_imported_resume, tailor_rewrite_resume
+from ..services.ai_service import DEFAULT_TAILOR_MODEL
 from ..services.pdf_service import docx_bytes_to_pdf_bytes
+from ..services.render_service import render_resume_files
+from ..services.file_cache import read_stored_file
+from ..scheduler import current_tenant, scheduler, work_lane
+from ..storage import Upload, release_after_commit, save_many
+from ..timings import TIMINGS_HEADER, attach_timings, stage, track_pipeline
+from .files import invalidate_after_commit
+from .jd import _norm_text, _sha256
+from .resume_versions import (
+    cover_letter_url,
+    create_deferred_version,
+    generate_cover_letter_in_background,
+    validate_cover_letter_mode,
+)
 
 router = APIRouter()
 
@@ -63,10 +93,15 @@ def _dedupe_keep_order(items: List[str]) -> List[str]:
     return out
 
 
+@lru_cache(maxsize=16384)
+def _token_set(s: str) -> frozenset:
+    return frozenset(_tokenize(s))
+
+
 def _phrase_hit(bullet: str, phrase: str) -> bool:
-    btoks = set(_tokenize(bullet))
-    ptoks = set(_tokenize(phrase))
-    return bool(btoks and ptoks and (btoks & ptoks))
+    btoks = _token_set(bullet)
+    ptoks = _token_set(phrase)
+    return bool(btoks and ptoks and not btoks.isdisjoint(ptoks))
 
 
 def _compute_hits_for_bullet(
@@ -88,6 +123,115 @@ def _compute_hits_for_bullet(
     return _dedupe_keep_order(hits)
 
 
+# ---------------------------
+# Local ATS match scoring
+# ---------------------------
+
+_ATS_CATEGORIES = ("core_hard", "core_soft", "required_phrases")
+_MARKUP_RE = re.compile(r"</?b\s*>", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"[a-z0-9+#/.-]+")
+
+
+def _parse_jd_keys(keys_json: str | None) -> Dict[str, List[str]]:
+    try:
+        keys = json.loads(keys_json or "{}")
+        if not isinstance(keys, dict):
+            keys = {}
+    except Exception:
+        keys = {}
+    return {c: _dedupe_keep_order(keys.get(c) or []) for c in _ATS_CATEGORIES}
+
+
+def _compile_jd_keys(keys: Dict[str, List[str]]) -> Dict[str, List[Tuple[str, frozenset]]]:
+    """Pre-tokenize JD phrases once so scoring many resumes is set math only."""
+    return {
+        c: [(p, _token_set(p)) for p in keys.get(c) or [] if _token_set(p)]
+        for c in _ATS_CATEGORIES
+    }
+
+
+def _section_tokens(texts: List[str]) -> frozenset:
+    # Like `_tokenize`, but one regex pass over the whole section, and `<b>`
+    # markup is dropped first. `_tokenize` keeps the tags as stray "b" and "/b"
+    # tokens, so a phrase made only of those can score differently from `_phrase_hit`.
+    blob = _MARKUP_RE.sub(" ", " ".join(str(t or "") for t in texts)).lower()
+    return frozenset(_TOKEN_RE.findall(blob))
+
+
+def _resume_sections(resume: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any], frozenset]]:
+    """Split a resume JSON (generated, tailored or base) into scorable sections."""
+    sections: List[Tuple[str, Dict[str, Any], frozenset]] = []
+    sections.append(
+        ("summary", {}, _section_tokens([resume.get("job_title") or "", resume.get("summary") or ""]))
+    )
+
+    skill_texts: List[str] = []
+    for group in resume.get("skills") or []:
+        if isinstance(group, dict):
+            skill_texts.append(str(group.get("category") or ""))
+            skill_texts.extend(str(x) for x in (group.get("items") or []))
+        else:
+            skill_texts.append(str(group))
+    sections.append(("skills", {}, _section_tokens(skill_texts)))
+
+    for idx, exp in enumerate(resume.get("experiences") or []):
+        if not isinstance(exp, dict):
+            continue
+        lines = exp.get("sentences") or exp.get("bullets") or []
+        meta = {
+            "index": idx,
+            "company": exp.get("company") or exp.get("header") or "",
+            "job_title": exp.get("job_title") or exp.get("title") or "",
+        }
+        sections.append(
+            ("experiences", meta, _section_tokens([meta["job_title"], *lines]))
+        )
+    return sections
+
+
+def _score_resume_against_keys(
+    resume: Dict[str, Any],
+    compiled: Dict[str, List[Tuple[str, frozenset]]],
+) -> Dict[str, Any]:
+    """Score a resume JSON against pre-compiled JD keys.
+
+    Uses the same token-overlap rule as `_phrase_hit`, applied per section.
+    """
+    covered: Dict[str, Set[str]] = {c: set() for c in _ATS_CATEGORIES}
+    by_section: Dict[str, Any] = {"summary": {}, "skills": {}, "experiences": []}
+
+    for name, meta, toks in _resume_sections(resume):
+        hits: Dict[str, List[str]] = {}
+        for c in _ATS_CATEGORIES:
+            hits[c] = [p for p, ptoks in compiled[c] if not toks.isdisjoint(ptoks)]
+            covered[c].update(hits[c])
+        if name == "experiences":
+            by_section["experiences"].append({**meta, **hits})
+        else:
+            by_section[name] = hits
+
+    categories: Dict[str, Any] = {}
+    matched_total = 0
+    phrase_total = 0
+    for c in _ATS_CATEGORIES:
+        phrases = [p for p, _ in compiled[c]]
+        matched = [p for p in phrases if p in covered[c]]
+        matched_total += len(matched)
+        phrase_total += len(phrases)
+        categories[c] = {
+            "total": len(phrases),
+            "matched": matched,
+            "missing": [p for p in phrases if p not in covered[c]],
+            "score": round(len(matched) / len(phrases), 4) if phrases else None,
+        }
+
+    return {
+        "score": round(matched_total / phrase_total, 4) if phrase_total else None,
+        "categories": categories,
+        "sections": by_section,
+    }
+
+
 # ---------------------------
 # Access control
 # ---------------------------
@@ -151,9 +295,7 @@ def _get_resume_template_file(db: Session, user_id: str) -> StoredFile | None:
 
 def _read_stored_docx_bytes(sf: StoredFile) -> bytes:
     try:
-        resp = requests.get(sf.path, timeout=30)
-        resp.raise_for_status()
-        return resp.content
+        return read_stored_file(sf)
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to read stored DOCX template")
 
@@ -204,6 +346,7 @@ class TailorBulletsIn(BaseModel):
     max_roles: int = Field(default=4, ge=1, le=10)
     include_cover_letter: bool = False
     cover_letter_instructions: str = ""
+    refresh: bool = False  # bypass the tailoring cache
 
 
 class TailorBulletsOut(BaseModel):
@@ -212,6 +355,7 @@ class TailorBulletsOut(BaseModel):
     gaps: List[str]
     summary: str = ""
     cover_letter: str = ""
+    cached: bool = False
 
 
 class GenerateResumeFromScratchIn(BaseModel):
@@ -224,40 +368,66 @@ class GenerateResumeFromScratchIn(BaseModel):
     resume_json_text: str = ""
 
 
-def _generate_resume_bundle(
+@dataclass
+class ResumeArtifacts:
+    """Raw output of a resume generation; base64/zip encoding happens only at the HTTP edge."""
+
+    resume_json: Dict[str, Any]
+    docx_bytes: bytes | None = None
+    pdf_bytes: bytes | None = None
+    template_source: str | None = None
+    cover_letter: str | None = None  # None when not requested
+    blocked: bool = False
+    block_reason: str | None = None
+    # endpoint-specific JSON fields (tailoring details, deferred cover letter ids)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _build_resume_artifacts(
     payload: GenerateResumeFromScratchIn,
     db: Session,
     principal: Principal,
-) -> Dict[str, Any]:
+    plan: ExportPlan,
+    generated: Dict[str, Any] | None = None,
+) -> ResumeArtifacts:
+    """Shared generation core for `/v1/resume/generate` and the ingest flow.
+
+    Renders only the formats in `plan`. `generated` is resume-model output
+    produced earlier (speculative pre-generation), used instead of a model call.
+    """
     _check_access(db, principal, payload.user_id)
+    release_connection(db)
 
-    if (payload.resume_json_text or "").strip():
+    if generated is not None:
+        generated = dict(generated)
+    elif (payload.resume_json_text or "").strip():
         try:
-            generated = normalize_imported_resume(
-                resume_data=json.loads(payload.resume_json_text),
-                position=payload.position,
-                include_cover_letter=payload.include_cover_letter,
-            )
+            with stage("resume_import"):
+                generated = normalize_imported_resume(
+                    resume_data=json.loads(payload.resume_json_text),
+                    position=payload.position,
+                    include_cover_letter=payload.include_cover_letter,
+                )
         except Exception as exc:
             raise HTTPException(status_code=400, detail=f"Invalid resume_json_text: {exc}")
     else:
-        generated = generate_resume_from_scratch(
-            jd_text=payload.jd_text,
-            company=payload.company,
-            position=payload.position,
-            include_cover_letter=payload.include_cover_letter,
-        )
+        with stage("resume_model"):
+            generated = generate_resume_from_scratch(
+                jd_text=payload.jd_text,
+                company=payload.company,
+                position=payload.position,
+                include_cover_letter=payload.include_cover_letter,
+            )
 
+    cover = {"cover_letter": ""} if payload.include_cover_letter else {}
     if generated.get("blocked"):
-        out = {
-            "ok": False,
-            "blocked": True,
-            "block_reason": generated.get("block_reason") or "Resume generation blocked",
-            "resume_json": generated,
-        }
-        if payload.include_cover_letter:
-            out["cover_letter"] = ""
-        return out
+        return ResumeArtifacts(
+            resume_json=generated,
+            cover_letter="" if payload.include_cover_letter else None,
+            blocked=True,
+            block_reason=generated.get("block_reason") or "Resume generation blocked",
+            extra={"resume_json": generated, **cover},
+        )
 
     user = db.query(User).filter(User.id == payload.user_id).first()
     cred = (
@@ -270,71 +440,153 @@ def _generate_resume_bundle(
     )
     generated["candidate"] = _build_candidate_header(user, cred.email if cred else None)
     template_file = _get_resume_template_file(db, payload.user_id)
+    release_connection(db)
+    template_bytes = None
     if template_file:
-        template_bytes = _read_stored_docx_bytes(template_file)
-        docx_bytes = render_resume_template_docx_bytes(template_bytes, generated)
-        pdf_bytes = docx_bytes_to_pdf_bytes(docx_bytes)
-    else:
-        docx_bytes = build_resume_docx_bytes(generated)
-        pdf_bytes = build_resume_pdf_bytes(generated)
+        with stage("template_download"):
+            template_bytes = _read_stored_docx_bytes(template_file)
+    docx_bytes, pdf_bytes = render_resume_files(
+        generated,
+        template_bytes,
+        want_pdf=plan.want_pdf,
+        want_docx=plan.want_docx,
+    )
+    cover_letter = generated.get("cover_letter") or "" if payload.include_cover_letter else None
+    return ResumeArtifacts(
+        resume_json=generated,
+        docx_bytes=docx_bytes,
+        pdf_bytes=pdf_bytes,
+        template_source=template_file.filename if template_file else None,
+        cover_letter=cover_letter,
+        extra={
+            "blocked": False,
+            "resume_json": generated,
+            **({"cover_letter": cover_letter} if cover_letter is not None else {}),
+        },
+    )
+
+
+_DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+_EXPORT_MEDIA = {
+    "docx": (_DOCX_MIME, "resume.docx"),
+    "pdf": ("application/pdf", "resume.pdf"),
+    "both": ("application/zip", "resume_bundle.zip"),
+}
+_STREAM_CHUNK = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ExportPlan:
+    """What an export must produce; decided before any generation or rendering."""
 
-    docx_b64 = base64.b64encode(docx_bytes).decode("utf-8")
-    pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-    fmt = (payload.export_format or "both").lower().strip()
-    if fmt not in ("docx", "pdf", "both"):
+    fmt: str  # docx | pdf | both
+    binary: bool = False
+
+    @property
+    def want_docx(self) -> bool:
+        return self.fmt in ("docx", "both")
+
+    @property
+    def want_pdf(self) -> bool:
+        return self.fmt in ("pdf", "both")
+
+
+def _plan_export(export_format: str | None, accept: str | None = None) -> ExportPlan:
+    """Validate the format up front. A specific Accept type picks the format; JSON stays the default."""
+    accept = (accept or "").lower()
+    for fmt, (media, _) in _EXPORT_MEDIA.items():
+        if media in accept:
+            return ExportPlan(fmt=fmt, binary=True)
+    fmt = (export_format or "both").lower().strip()
+    if fmt not in _EXPORT_MEDIA:
         raise HTTPException(
             status_code=400, detail="export_format must be one of: docx, pdf, both"
         )
+    return ExportPlan(fmt=fmt, binary="application/octet-stream" in accept)
+
+
+def _bundle_filenames(art: ResumeArtifacts) -> List[str]:
+    names = ["resume.docx", "resume.pdf"]
+    if (art.cover_letter or "").strip():
+        names.append("cover_letter.txt")
+    return names
+
+
+def _bundle_zip_bytes(art: ResumeArtifacts) -> bytes:
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        # DOCX and PDF are already compressed; deflating them again only costs CPU
+        z.writestr("resume.docx", art.docx_bytes, compress_type=zipfile.ZIP_STORED)
+        z.writestr("resume.pdf", art.pdf_bytes, compress_type=zipfile.ZIP_STORED)
+        if (art.cover_letter or "").strip():
+            z.writestr(
+                "cover_letter.txt",
+                art.cover_letter.strip() + "\n",
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+    return buf.getvalue()
 
-    if fmt == "both":
-        buf = BytesIO()
-        filenames = ["resume.docx", "resume.pdf"]
-        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as z:
-            z.writestr("resume.docx", docx_bytes)
-            z.writestr("resume.pdf", pdf_bytes)
-            if (generated.get("cover_letter") or "").strip():
-                z.writestr("cover_letter.txt", generated["cover_letter"].strip() + "\n")
-                filenames.append("cover_letter.txt")
-        return {
-            "ok": True,
-            "blocked": False,
-            "bundle_zip_base64": base64.b64encode(buf.getvalue()).decode("utf-8"),
-            "bundle_filenames": filenames,
-            "template_source": template_file.filename if template_file else None,
-            "resume_json": generated,
-            **(
-                {"cover_letter": generated.get("cover_letter") or ""}
-                if payload.include_cover_letter
-                else {}
-            ),
-        }
 
-    if fmt == "pdf":
-        return {
-            "ok": True,
-            "blocked": False,
-            "resume_pdf_base64": pdf_b64,
-            "template_source": template_file.filename if template_file else None,
-            "resume_json": generated,
-            **(
-                {"cover_letter": generated.get("cover_letter") or ""}
-                if payload.include_cover_letter
-                else {}
-            ),
+def _iter_chunks(data: bytes):
+    view = memoryview(data)
+    for i in range(0, len(view), _STREAM_CHUNK):
+        yield view[i : i + _STREAM_CHUNK]
+
+
+def _binary_export_response(
+    art: ResumeArtifacts, plan: ExportPlan, headers: Dict[str, str] | None = None
+) -> StreamingResponse:
+    if art.blocked:
+        raise HTTPException(status_code=422, detail=art.block_reason or "Resume generation blocked")
+    if plan.fmt == "both":
+        data = _bundle_zip_bytes(art)
+    elif plan.fmt == "pdf":
+        data = art.pdf_bytes
+    else:
+        data = art.docx_bytes
+    media_type, filename = _EXPORT_MEDIA[plan.fmt]
+    return StreamingResponse(
+        _iter_chunks(data),
+        media_type=media_type,
+        headers={
+            "Content-Length": str(len(data)),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            **(headers or {}),
+        },
+    )
+
+
+def _json_export_response(art: ResumeArtifacts, plan: ExportPlan) -> Dict[str, Any]:
+    if plan.fmt == "both":
+        files = {
+            "bundle_zip_base64": base64.b64encode(_bundle_zip_bytes(art)).decode("utf-8"),
+            "bundle_filenames": _bundle_filenames(art),
         }
+    elif plan.fmt == "pdf":
+        files = {"resume_pdf_base64": base64.b64encode(art.pdf_bytes).decode("utf-8")}
+    else:
+        files = {"resume_docx_base64": base64.b64encode(art.docx_bytes).decode("utf-8")}
+    return {"ok": True, **files, "template_source": art.template_source, **art.extra}
 
-    return {
-        "ok": True,
-        "blocked": False,
-        "resume_docx_base64": docx_b64,
-        "template_source": template_file.filename if template_file else None,
-        "resume_json": generated,
-        **(
-            {"cover_letter": generated.get("cover_letter") or ""}
-            if payload.include_cover_letter
-            else {}
-        ),
-    }
+
+def _generate_resume_bundle(
+    payload: GenerateResumeFromScratchIn,
+    db: Session,
+    principal: Principal,
+) -> Dict[str, Any]:
+    plan = _plan_export(payload.export_format)
+    with track_pipeline("resume_generate", payload.user_id) as timer:
+        art = _build_resume_artifacts(payload, db, principal, plan)
+        if art.blocked:
+            timer.status = "blocked"
+            return {
+                "ok": False,
+                "blocked": True,
+                "block_reason": art.block_reason,
+                **art.extra,
+            }
+        with stage("encode"):
+            return _json_export_response(art, plan)
 
 
 @router.post("/v1/resume/generate")
@@ -342,8 +594,19 @@ def generate_resume_from_jd(
     payload: GenerateResumeFromScratchIn,
     db: Session = Depends(get_db),
     principal: Principal = Depends(get_principal),
+    accept: Optional[str] = Header(default=None),
+    include_timings: Optional[str] = Header(default=None, alias=TIMINGS_HEADER),
 ):
-    return _generate_resume_bundle(payload, db, principal)
+    """JSON with base64 files by default; send `Accept: application/zip|pdf|<docx mime>` for raw bytes."""
+    plan = _plan_export(payload.export_format, accept)
+    with track_pipeline("resume_generate", payload.user_id) as timer:
+        if not plan.binary:
+            out = _generate_resume_bundle(payload, db, principal)
+        else:
+            art = _build_resume_artifacts(payload, db, principal, plan)
+            with stage("encode"):
+                out = _binary_export_response(art, plan)
+    return attach_timings(out, timer, include_timings)
 
 
 def _build_candidate_header(user: User | None, email: str | None) -> Dict[str, Any]:
@@ -367,6 +630,77 @@ def _build_candidate_header(user: User | None, email: str | None) -> Dict[str, A
     return {"name": name, "contact_items": contact_items}
 
 
+# ---------------------------
+# Tailoring cache
+# ---------------------------
+
+
+def _tailor_cache_key(payload: TailorBulletsIn, base_resume_hash: str, model: str) -> str:
+    parts = {
+        "user_id": payload.user_id,
+        "base_resume_hash": base_resume_hash,
+        "jd_key_id": payload.jd_key_id,
+        "max_roles": payload.max_roles,
+        "include_cover_letter": bool(payload.include_cover_letter),
+        "cover_letter_instructions": (
+            payload.cover_letter_instructions if payload.include_cover_letter else ""
+        ),
+        "model": model,
+    }
+    return _sha256(json.dumps(parts, sort_keys=True))
+
+
+def _get_cached_tailoring(db: Session, cache_key: str) -> TailorBulletsOut | None:
+    row = db.query(TailorCache).filter(TailorCache.cache_key == cache_key).first()
+    if not row:
+        return None
+    try:
+        out = TailorBulletsOut.model_validate_json(row.result_json)
+    except Exception:
+        return None
+    out.cached = True
+    return out
+
+
+def _store_cached_tailoring(
+    cache_key: str,
+    payload: TailorBulletsIn,
+    base_resume_hash: str,
+    model: str,
+    out: TailorBulletsOut,
+) -> None:
+    row = TailorCache(
+        cache_key=cache_key,
+        user_id=payload.user_id,
+        base_resume_hash=base_resume_hash,
+        jd_key_id=payload.jd_key_id,
+        max_roles=payload.max_roles,
+        include_cover_letter=1 if payload.include_cover_letter else 0,
+        cover_letter_hash=(
+            _sha256(payload.cover_letter_instructions or "")
+            if payload.include_cover_letter
+            else None
+        ),
+        model=model,
+        result_json=out.model_dump_json(),
+        created_at=dt.datetime.now(),
+    )
+    # Committed on its own session: the cache is shared, not part of the
+    # caller's transaction (a queued job's rows wait for the job to finish)
+    cache_db = SessionLocal()
+    try:
+        cache_db.query(TailorCache).filter(TailorCache.cache_key == cache_key).delete(
+            synchronize_session=False
+        )
+        cache_db.add(row)
+        cache_db.commit()
+    except IntegrityError:
+        # A concurrent request stored the same key first; theirs is just as good.
+        cache_db.rollback()
+    finally:
+        cache_db.close()
+
+
 # ---------------------------
 # Endpoint: tailor bullets + summary (ONE OPENAI CALL)
 # ---------------------------
@@ -390,6 +724,14 @@ def tailor_bullets(
         print("jd+++++++++++++++++")
         raise HTTPException(status_code=404, detail="JD keys not found")
 
+    model = DEFAULT_TAILOR_MODEL
+    base_resume_hash = _sha256(br.content_text or "")
+    cache_key = _tailor_cache_key(payload, base_resume_hash, model)
+    if not payload.refresh:
+        cached = _get_cached_tailoring(db, cache_key)
+        if cached is not None:
+            return cached
+
     resume = _load_base_resume_json(br)
     exps = resume.get("experiences") or []
     if not isinstance(exps, list) or not exps:
@@ -432,6 +774,7 @@ def tailor_bullets(
         )
 
     # ONE OpenAI call
+    release_connection(db)
     try:
         ai = tailor_rewrite_resume(
             summary_text=summary_original,
@@ -441,6 +784,7 @@ def tailor_bullets(
             required_phrases=required_phrases,
             include_cover_letter=payload.include_cover_letter,
             cover_letter_instructions=payload.cover_letter_instructions,
+            model=model,
         )
     except Exception as e:
         print("AI error:", e)
@@ -523,13 +867,15 @@ def tailor_bullets(
 
     gaps = [req for req in core_hard if _norm(req) not in covered_all]
 
-    return TailorBulletsOut(
+    out = TailorBulletsOut(
         selected_experiences=selected,
         keywords_covered=sorted(list(covered_all)),
         gaps=gaps,
         summary=tailored_summary,
         cover_letter=tailored_cover_letter,
     )
+    _store_cached_tailoring(cache_key, payload, base_resume_hash, model, out)
+    return out
 
 
 # ---------------------------
@@ -545,36 +891,71 @@ class ExportTailoredDocxIn(BaseModel):
     export_format: str = Field(default="docx", description="docx | pdf | both")
     include_cover_letter: bool = False
     cover_letter_instructions: str = ""
+    cover_letter_mode: str = Field(default="inline", description="inline | lazy | background")
+    refresh_tailoring: bool = False
 
 
-@router.post("/v1/resume/export-tailored-docx")
-def export_tailored_docx(
+def _defer_cover_letter(
+    db: Session,
+    background_tasks: BackgroundTasks,
     payload: ExportTailoredDocxIn,
-    db: Session = Depends(get_db),
-    principal: Principal = Depends(get_principal),
-):
+    resume: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Store the tailored resume as a ResumeVersion whose cover letter comes later."""
+    rv = create_deferred_version(
+        db,
+        user_id=payload.user_id,
+        resume=resume,
+        jd_key_id=payload.jd_key_id,
+        cover_letter_instructions=payload.cover_letter_instructions,
+    )
+    rv_id = rv.id
+    db.commit()
+    if payload.cover_letter_mode == "background":
+        background_tasks.add_task(generate_cover_letter_in_background, rv_id)
+    return {
+        "resume_version_id": rv_id,
+        "cover_letter_status": "pending",
+        "cover_letter_url": cover_letter_url(rv_id),
+    }
+
+
+def _build_tailored_artifacts(
+    payload: ExportTailoredDocxIn,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    principal: Principal,
+    plan: ExportPlan,
+) -> ResumeArtifacts:
+    """Tailor the base resume to a JD and render it (template or base DOCX).
+
+    The PDF (a LibreOffice conversion) is only produced when `plan` asks for it.
+    """
     _check_access(db, principal, payload.user_id)
+    payload.cover_letter_mode = validate_cover_letter_mode(payload.cover_letter_mode)
+    defer_cover_letter = (
+        payload.include_cover_letter and payload.cover_letter_mode != "inline"
+    )
+    deferred: Dict[str, Any] = {}
 
     br = db.query(BaseResume).filter(BaseResume.user_id == payload.user_id).first()
     if not br:
         print("br in export+++++++++++++++++")
         raise HTTPException(status_code=404, detail="Base resume not found")
     resume = _load_base_resume_json(br)
+    tailor_in = TailorBulletsIn(
+        user_id=payload.user_id,
+        jd_key_id=payload.jd_key_id,
+        bullets_per_role=payload.bullets_per_role,
+        max_roles=payload.max_roles,
+        include_cover_letter=payload.include_cover_letter and not defer_cover_letter,
+        cover_letter_instructions=payload.cover_letter_instructions,
+        refresh=payload.refresh_tailoring,
+    )
     template_sf = _get_resume_template_file(db, payload.user_id)
     if template_sf:
-        tailored = tailor_bullets(
-            TailorBulletsIn(
-                user_id=payload.user_id,
-                jd_key_id=payload.jd_key_id,
-                bullets_per_role=payload.bullets_per_role,
-                max_roles=payload.max_roles,
-                include_cover_letter=payload.include_cover_letter,
-                cover_letter_instructions=payload.cover_letter_instructions,
-            ),
-            db=db,
-            principal=principal,
-        )
-        template_bytes = _read_stored_docx_bytes(template_sf)
+        with stage("tailor_model"):
+            tailored = tailor_bullets(tailor_in, db=db, principal=principal)
         user = db.query(User).filter(User.id == payload.user_id).first()
         cred = (
             db.query(AuthCredential)
@@ -589,159 +970,533 @@ def export_tailored_docx(
             user,
             cred.email if cred else None,
         )
-        out_bytes = render_resume_template_docx_bytes(template_bytes, tailored_resume)
-        pdf_bytes = docx_bytes_to_pdf_bytes(out_bytes)
-        docx_b64 = base64.b64encode(out_bytes).decode("utf-8")
-        pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
+        if defer_cover_letter:
+            deferred = _defer_cover_letter(db, background_tasks, payload, tailored_resume)
+        release_connection(db)
+        with stage("template_download"):
+            template_bytes = _read_stored_docx_bytes(template_sf)
+        with stage("render_docx"):
+            out_bytes = render_resume_template_docx_bytes(template_bytes, tailored_resume)
+        template_source = template_sf.filename
+    else:
+        sf = (
+            db.query(StoredFile)
+            .filter(
+                StoredFile.user_id == payload.user_id,
+                StoredFile.application_id == "base",
+                StoredFile.kind == "base_resume_docx",
+            )
+            .order_by(StoredFile.created_at.desc())
+            .first()
+        )
+        if not sf:
+            print("sf+++++++++++++++++")
+            raise HTTPException(
+                status_code=404,
+                detail="Base resume DOCX not uploaded yet. Use PUT /v1/users/{user_id}/base-resume-docx",
+            )
 
-        fmt = (payload.export_format or "docx").lower().strip()
-        if fmt not in ("docx", "pdf", "both"):
+        release_connection(db)
+        try:
+            with stage("template_download"):
+                docx_bytes = read_stored_file(sf)
+
+        except Exception:
             raise HTTPException(
-                status_code=400, detail="export_format must be one of: docx, pdf, both"
+                status_code=500, detail="Failed to read stored base resume docx"
             )
-        if fmt == "both":
-            buf = BytesIO()
-            with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as z:
-                z.writestr("resume.docx", out_bytes)
-                z.writestr("resume.pdf", pdf_bytes)
-                if (tailored.cover_letter or "").strip():
-                    z.writestr("cover_letter.txt", tailored.cover_letter.strip() + "\n")
-            return {
-                "ok": True,
-                "bundle_zip_base64": base64.b64encode(buf.getvalue()).decode("utf-8"),
-                "bundle_filenames": ["resume.docx", "resume.pdf"]
-                + (["cover_letter.txt"] if (tailored.cover_letter or "").strip() else []),
-                "template_source": template_sf.filename,
-                "summary": tailored.summary,
-                "cover_letter": tailored.cover_letter,
-                "selected_experiences": tailored.selected_experiences,
-                "gaps": tailored.gaps,
-            }
-        if fmt == "pdf":
-            return {
-                "ok": True,
-                "resume_pdf_base64": pdf_b64,
-                "template_source": template_sf.filename,
-                "summary": tailored.summary,
-                "cover_letter": tailored.cover_letter,
-                "selected_experiences": tailored.selected_experiences,
-                "gaps": tailored.gaps,
-            }
-        return {
-            "ok": True,
-            "resume_docx_base64": docx_b64,
-            "template_source": template_sf.filename,
+
+        with stage("tailor_model"):
+            tailored = tailor_bullets(tailor_in, db=db, principal=principal)
+        if defer_cover_letter:
+            deferred = _defer_cover_letter(
+                db, background_tasks, payload, _tailored_resume_json(resume, tailored)
+            )
+        release_connection(db)
+
+        with stage("render_docx"):
+            # Replace summary first (if indices exist in stored resume JSON)
+            summary_idxs = resume.get("summary_para_idxs") or []
+            if summary_idxs and (tailored.summary or "").strip():
+                docx_bytes = replace_summary_in_docx(docx_bytes, summary_idxs, tailored.summary)
+
+            # Replace bullets
+            bullet_blocks = resume.get("experiences") or []
+            new_by_block: Dict[int, List[str]] = {}
+            for i, exp in enumerate(tailored.selected_experiences):
+                new_by_block[i] = exp.get("bullets") or []
+
+            out_bytes = replace_bullets_in_docx(docx_bytes, bullet_blocks, new_by_block)
+        template_source = sf.filename
+
+    pdf_bytes = docx_bytes_to_pdf_bytes(out_bytes) if plan.want_pdf else None
+    print("cover letter+++++++++++++++++", tailored.cover_letter)
+    return ResumeArtifacts(
+        resume_json=_tailored_resume_json(resume, tailored),
+        docx_bytes=out_bytes,
+        pdf_bytes=pdf_bytes,
+        template_source=template_source,
+        cover_letter=tailored.cover_letter,
+        extra={
             "summary": tailored.summary,
             "cover_letter": tailored.cover_letter,
             "selected_experiences": tailored.selected_experiences,
             "gaps": tailored.gaps,
+            **deferred,
+        },
+    )
+
+
+@router.post("/v1/resume/export-tailored-docx")
+def export_tailored_docx(
+    payload: ExportTailoredDocxIn,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+    accept: Optional[str] = Header(default=None),
+    include_timings: Optional[str] = Header(default=None, alias=TIMINGS_HEADER),
+):
+    """JSON with base64 files by default; send `Accept: application/zip|pdf|<docx mime>` for raw bytes."""
+    plan = _plan_export(payload.export_format or "docx", accept)
+    with track_pipeline("export_tailored", payload.user_id) as timer:
+        art = _build_tailored_artifacts(payload, background_tasks, db, principal, plan)
+        with stage("encode"):
+            if not plan.binary:
+                out = _json_export_response(art, plan)
+            else:
+                headers = {}
+                if art.extra.get("resume_version_id"):
+                    headers["X-Resume-Version-Id"] = art.extra["resume_version_id"]
+                    headers["X-Cover-Letter-Url"] = art.extra["cover_letter_url"]
+                out = _binary_export_response(art, plan, headers)
+    return attach_timings(out, timer, include_timings)
+
+
+# ---------------------------
+# Local ATS match score (no model calls)
+# ---------------------------
+
+
+class ATSScoreIn(BaseModel):
+    user_id: str
+    jd_key_id: int
+    resume_version_id: Optional[str] = None
+    resume_json: Optional[Dict[str, Any]] = None
+
+
+def _load_resume_version_json(rv: ResumeVersion) -> Dict[str, Any]:
+    try:
+        obj = json.loads(rv.tailored_json or "{}")
+        return obj if isinstance(obj, dict) else {}
+    except Exception:
+        return {}
+
+
+@router.post("/v1/resume/ats-score")
+def ats_score(
+    payload: ATSScoreIn,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Score a resume JSON against stored JD keys.
+
+    Resume source, in order: `resume_json`, `resume_version_id`, the user's base resume.
+    """
+    _check_access(db, principal, payload.user_id)
+
+    jd = db.get(JDKeyInfo, payload.jd_key_id)
+    if not jd:
+        raise HTTPException(status_code=404, detail="JD keys not found")
+
+    if payload.resume_json is not None:
+        resume = payload.resume_json
+        source = "payload"
+    elif payload.resume_version_id:
+        rv = db.get(ResumeVersion, payload.resume_version_id)
+        if not rv or rv.user_id != payload.user_id:
+            raise HTTPException(status_code=404, detail="Resume version not found")
+        resume = _load_resume_version_json(rv)
+        source = "resume_version"
+    else:
+        br = db.get(BaseResume, payload.user_id)
+        if not br:
+            raise HTTPException(status_code=404, detail="Base resume not found")
+        resume = _load_base_resume_json(br)
+        source = "base_resume"
+
+    compiled = _compile_jd_keys(_parse_jd_keys(jd.keys_json))
+    return {
+        "user_id": payload.user_id,
+        "jd_key_id": jd.id,
+        "resume_version_id": payload.resume_version_id,
+        "resume_source": source,
+        **_score_resume_against_keys(resume, compiled),
+    }
+
+
+@router.get("/v1/users/{user_id}/ats-scores")
+def ats_scores_for_user(
+    user_id: str,
+    include_sections: bool = True,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Score the latest resume version of every application of a user in one call.
+
+    JD keys come from the version's `jd_key_id`, falling back to a `JDKeyInfo`
+    row with the same normalized JD text hash.
+    """
+    _check_access(db, principal, user_id)
+
+    apps = (
+        db.query(Application.id, Application.company, Application.role)
+        .filter(Application.user_id == user_id)
+        .order_by(Application.created_at.desc())
+        .all()
+    )
+
+    latest_rv: Dict[str, Any] = {}
+    for rv in (
+        db.query(
+            ResumeVersion.id,
+            ResumeVersion.application_id,
+            ResumeVersion.jd_key_id,
+            ResumeVersion.tailored_json,
+        )
+        .filter(ResumeVersion.user_id == user_id, ResumeVersion.application_id.isnot(None))
+        .order_by(ResumeVersion.created_at.desc())
+        .all()
+    ):
+        latest_rv.setdefault(rv.application_id, rv)
+
+    key_id_by_app: Dict[str, int] = {
+        app_id: rv.jd_key_id for app_id, rv in latest_rv.items() if rv.jd_key_id
+    }
+
+    # Fallback: match JD text hash for versions generated without a jd_key_id.
+    missing = [a.id for a in apps if a.id in latest_rv and a.id not in key_id_by_app]
+    if missing:
+        hash_by_app: Dict[str, str] = {}
+        for jd_row in (
+            db.query(JobDescription)
+            .filter(JobDescription.application_id.in_(missing))
+            .order_by(JobDescription.created_at.desc())
+            .all()
+        ):
+            if jd_row.application_id not in hash_by_app and (jd_row.jd_text or "").strip():
+                hash_by_app[jd_row.application_id] = _sha256(_norm_text(jd_row.jd_text))
+        if hash_by_app:
+            id_by_hash: Dict[str, int] = {}
+            for row_id, text_hash in (
+                db.query(JDKeyInfo.id, JDKeyInfo.text_hash)
+                .filter(JDKeyInfo.text_hash.in_(set(hash_by_app.values())))
+                .order_by(JDKeyInfo.created_at.desc())
+                .all()
+            ):
+                id_by_hash.setdefault(text_hash, row_id)
+            for app_id, text_hash in hash_by_app.items():
+                if text_hash in id_by_hash:
+                    key_id_by_app[app_id] = id_by_hash[text_hash]
+
+    compiled_by_id: Dict[int, Dict[str, List[Tuple[str, frozenset]]]] = {}
+    key_ids = set(key_id_by_app.values())
+    if key_ids:
+        for row_id, keys_json in (
+            db.query(JDKeyInfo.id, JDKeyInfo.keys_json)
+            .filter(JDKeyInfo.id.in_(key_ids))
+            .all()
+        ):
+            compiled_by_id[row_id] = _compile_jd_keys(_parse_jd_keys(keys_json))
+
+    items: List[Dict[str, Any]] = []
+    for a in apps:
+        rv = latest_rv.get(a.id)
+        key_id = key_id_by_app.get(a.id)
+        item: Dict[str, Any] = {
+            "application_id": a.id,
+            "company": a.company,
+            "role": a.role,
+            "resume_version_id": rv.id if rv else None,
+            "jd_key_id": key_id,
         }
+        if rv is None or key_id not in compiled_by_id:
+            item["score"] = None
+            item["skipped"] = "no_resume_version" if rv is None else "no_jd_keys"
+            items.append(item)
+            continue
+        result = _score_resume_against_keys(
+            _load_resume_version_json(rv), compiled_by_id[key_id]
+        )
+        if not include_sections:
+            result.pop("sections", None)
+        item.update(result)
+        items.append(item)
 
-    sf = (
-        db.query(StoredFile)
+    scored = [x["score"] for x in items if x.get("score") is not None]
+    return {
+        "user_id": user_id,
+        "count": len(items),
+        "scored": len(scored),
+        "average_score": round(sum(scored) / len(scored), 4) if scored else None,
+        "items": items,
+    }
+
+
+# ---------------------------
+# Re-render stored resume versions (no model calls)
+# ---------------------------
+
+RERENDER_PROCESSES = int(os.getenv("RERENDER_PROCESSES", "0")) or None  # None = cpu count
+_RERENDER_SKIP_SCHEMAS = ("manual_upload_v1",)
+
+
+class RenderVersionIn(BaseModel):
+    export_format: str = Field(default="both", description="docx | pdf | both")
+
+
+def _renderable_resume(rv: ResumeVersion) -> Dict[str, Any] | None:
+    if rv.schema_version in _RERENDER_SKIP_SCHEMAS:
+        return None
+    resume = _load_resume_version_json(rv)
+    if not (resume.get("experiences") or (resume.get("summary") or "").strip()):
+        return None
+    return resume
+
+
+def _candidate_for_user(db: Session, user_id: str) -> Tuple[User | None, Dict[str, Any]]:
+    user = db.query(User).filter(User.id == user_id).first()
+    cred = (
+        db.query(AuthCredential)
         .filter(
-            StoredFile.user_id == payload.user_id,
-            StoredFile.application_id == "base",
-            StoredFile.kind == "base_resume_docx",
+            AuthCredential.principal_type == "user",
+            AuthCredential.principal_id == user_id,
         )
-        .order_by(StoredFile.created_at.desc())
         .first()
     )
-    if not sf:
-        print("sf+++++++++++++++++")
-        raise HTTPException(
-            status_code=404,
-            detail="Base resume DOCX not uploaded yet. Use PUT /v1/users/{user_id}/base-resume-docx",
+    return user, _build_candidate_header(user, cred.email if cred else None)
+
+
+def _store_rendered_files(
+    db: Session,
+    rv: ResumeVersion,
+    user: User | None,
+    docx_bytes: bytes | None,
+    pdf_bytes: bytes | None,
+) -> Dict[str, Any]:
+    """Upload re-rendered files and replace this version's previous StoredFile rows.
+
+    Uploads happen before any DB write so no transaction is open while they run.
+    """
+    now = dt.datetime.now()
+    application_id = rv.application_id or rv.id
+    user_info = f"{user.name}-{user.id}" if user else rv.user_id
+    base_id = f"file{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+    pdf_id = base_id + "p"
+
+    release_connection(db)
+    uploads = {}
+    if docx_bytes is not None:
+        uploads["docx"] = Upload(user_info, application_id, base_id + ".docx", docx_bytes)
+    if pdf_bytes is not None:
+        uploads["pdf"] = Upload(user_info, application_id, pdf_id + ".pdf", pdf_bytes)
+    paths = dict(zip(uploads, (r.url for r in save_many(list(uploads.values())))))
+    docx_path = paths.get("docx")
+    pdf_path = paths.get("pdf")
+
+    kinds = []
+    if docx_bytes is not None:
+        kinds.append("resume_docx")
+    if pdf_bytes is not None:
+        kinds.append("resume_pdf")
+    replaced = db.query(StoredFile).filter(
+        StoredFile.resume_version_id == rv.id, StoredFile.kind.in_(kinds)
+    )
+    replaced_rows = replaced.with_entities(StoredFile.id, StoredFile.path).all()
+    release_after_commit(db, [p for _, p in replaced_rows])
+    invalidate_after_commit(db, [i for i, _ in replaced_rows])
+    replaced.delete(synchronize_session=False)
+
+    out: Dict[str, Any] = {"resume_version_id": rv.id, "application_id": application_id}
+    if docx_bytes is not None:
+        db.add(
+            StoredFile(
+                id=base_id,
+                user_id=rv.user_id,
+                application_id=application_id,
+                resume_version_id=rv.id,
+                kind="resume_docx",
+                path=docx_path,
+                filename="resume.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                created_at=now,
+            )
+        )
+        out["resume_docx_file_id"] = base_id
+        out["resume_docx_download_url"] = f"/v1/files/{base_id}/download"
+    if pdf_bytes is not None:
+        db.add(
+            StoredFile(
+                id=pdf_id,
+                user_id=rv.user_id,
+                application_id=application_id,
+                resume_version_id=rv.id,
+                kind="resume_pdf",
+                path=pdf_path,
+                filename="resume.pdf",
+                mime="application/pdf",
+                created_at=now,
+            )
         )
+        out["resume_pdf_file_id"] = pdf_id
+        out["resume_pdf_download_url"] = f"/v1/files/{pdf_id}/download"
+    return out
 
-    try:
-        # docx_bytes = open(sf.path, "rb").read()
-        resp = requests.get(sf.path, timeout=30)
-        resp.raise_for_status()
-        docx_bytes = resp.content
 
-    except Exception:
+@router.post("/v1/resume-versions/{rv_id}/render")
+def render_resume_version(
+    rv_id: str,
+    payload: RenderVersionIn | None = None,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Re-render a stored version with the current template and profile, without the model."""
+    plan = _plan_export((payload or RenderVersionIn()).export_format)
+
+    rv = db.get(ResumeVersion, rv_id)
+    if not rv:
+        raise HTTPException(status_code=404, detail="Resume version not found")
+    _check_access(db, principal, rv.user_id)
+
+    resume = _renderable_resume(rv)
+    if resume is None:
         raise HTTPException(
-            status_code=500, detail="Failed to read stored base resume docx"
+            status_code=400, detail="Resume version has no stored resume JSON to render"
         )
 
-    tailored = tailor_bullets(
-        TailorBulletsIn(
-            user_id=payload.user_id,
-            jd_key_id=payload.jd_key_id,
-            bullets_per_role=payload.bullets_per_role,
-            max_roles=payload.max_roles,
-            include_cover_letter=payload.include_cover_letter,
-            cover_letter_instructions=payload.cover_letter_instructions,
-        ),
-        db=db,
-        principal=principal,
+    user, candidate = _candidate_for_user(db, rv.user_id)
+    resume["candidate"] = candidate
+    template_file = _get_resume_template_file(db, rv.user_id)
+    release_connection(db)
+    docx_bytes, pdf_bytes = render_resume_files(
+        resume,
+        _read_stored_docx_bytes(template_file) if template_file else None,
+        want_pdf=plan.want_pdf,
+        want_docx=plan.want_docx,
     )
 
-    # Replace summary first (if indices exist in stored resume JSON)
-    summary_idxs = resume.get("summary_para_idxs") or []
-    if summary_idxs and (tailored.summary or "").strip():
-        docx_bytes = replace_summary_in_docx(docx_bytes, summary_idxs, tailored.summary)
+    out = _store_rendered_files(
+        db, rv, user, docx_bytes if plan.want_docx else None, pdf_bytes
+    )
+    db.commit()
+    return {
+        "ok": True,
+        "template_source": template_file.filename if template_file else None,
+        **out,
+    }
 
-    # Replace bullets
-    bullet_blocks = resume.get("experiences") or []
-    new_by_block: Dict[int, List[str]] = {}
-    for i, exp in enumerate(tailored.selected_experiences):
-        new_by_block[i] = exp.get("bullets") or []
 
-    out_bytes = replace_bullets_in_docx(docx_bytes, bullet_blocks, new_by_block)
+def rerender_user_versions_job(user_id: str, export_format: str = "both") -> Dict[str, Any]:
+    """Re-render the current version of each of a user's applications in a process pool.
 
-    # Optional PDF export
-    pdf_bytes = docx_bytes_to_pdf_bytes(out_bytes)
+    Versions a newer one has replaced are skipped, so they do not get live files
+    again. Rendering (template fill + soffice) runs in worker processes; uploads
+    and DB writes stay in this thread.
+    """
+    with work_lane("background"):
+        return _rerender_user_versions(user_id, export_format)
 
-    docx_b64 = base64.b64encode(out_bytes).decode("utf-8")
-    pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
 
-    fmt = (payload.export_format or "docx").lower().strip()
-    if fmt not in ("docx", "pdf", "both"):
-        raise HTTPException(
-            status_code=400, detail="export_format must be one of: docx, pdf, both"
-        )
-    print("cover letter+++++++++++++++++", tailored.cover_letter)
-    # If both, return a zip (base64)
-    if fmt == "both":
-        buf = BytesIO()
-        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as z:
-            z.writestr("resume.docx", out_bytes)
-            z.writestr("resume.pdf", pdf_bytes)
-            if (tailored.cover_letter or "").strip():
-                z.writestr("cover_letter.txt", tailored.cover_letter.strip() + "\n")
-        zip_b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-        return {
-            "ok": True,
-            "bundle_zip_base64": zip_b64,
-            "bundle_filenames": ["resume.docx", "resume.pdf"]
-            + (["cover_letter.txt"] if (tailored.cover_letter or "").strip() else []),
-            "template_source": sf.filename,
-            "summary": tailored.summary,
-            "cover_letter": tailored.cover_letter,
-            "selected_experiences": tailored.selected_experiences,
-            "gaps": tailored.gaps,
-        }
+def _current_versions(db: Session, user_id: str) -> List[ResumeVersion]:
+    """The newest version per application (versions without one stand alone)."""
+    newest: Dict[str, ResumeVersion] = {}
+    for rv in (
+        db.query(ResumeVersion)
+        .filter(ResumeVersion.user_id == user_id)
+        .order_by(ResumeVersion.created_at.desc())
+    ):
+        newest.setdefault(rv.application_id or rv.id, rv)
+    return sorted(newest.values(), key=lambda rv: rv.created_at)
 
-    if fmt == "pdf":
-        return {
-            "ok": True,
-            "resume_pdf_base64": pdf_b64,
-            "template_source": sf.filename,
-            "summary": tailored.summary,
-            "cover_letter": tailored.cover_letter,
-            "selected_experiences": tailored.selected_experiences,
-            "gaps": tailored.gaps,
-        }
 
-    # default: docx
-    return {
-        "ok": True,
-        "resume_docx_base64": docx_b64,
-        "template_source": sf.filename,
-        "summary": tailored.summary,
-        "cover_letter": tailored.cover_letter,
-        "selected_experiences": tailored.selected_experiences,
-        "gaps": tailored.gaps,
-    }
+def _rerender_user_versions(user_id: str, export_format: str) -> Dict[str, Any]:
+    plan = _plan_export(export_format)
+    db = SessionLocal()
+    rendered = failed = 0
+    try:
+        versions = [
+            (rv, resume)
+            for rv in _current_versions(db, user_id)
+            for resume in [_renderable_resume(rv)]
+            if resume is not None
+        ]
+        if not versions:
+            return {"user_id": user_id, "rendered": 0, "failed": 0}
+
+        user, candidate = _candidate_for_user(db, user_id)
+        template_file = _get_resume_template_file(db, user_id)
+        release_connection(db)
+        template_bytes = _read_stored_docx_bytes(template_file) if template_file else None
+
+        # Pool processes have their own scheduler, so soffice slots are taken here
+        soffice = scheduler.gate("soffice") if template_bytes and plan.want_pdf else None
+        tenant = current_tenant()
+        with ProcessPoolExecutor(max_workers=RERENDER_PROCESSES) as pool:
+            futures = []
+            for _, resume in versions:
+                if soffice:
+                    soffice.acquire(tenant=tenant)
+                try:
+                    fut = pool.submit(
+                        render_resume_files,
+                        {**resume, "candidate": candidate},
+                        template_bytes,
+                        plan.want_pdf,
+                        plan.want_docx,
+                    )
+                except BaseException:
+                    if soffice:
+                        soffice.release(tenant)
+                    raise
+                if soffice:
+                    fut.add_done_callback(lambda _: soffice.release(tenant))
+                futures.append(fut)
+            for (rv, _), fut in zip(versions, futures):
+                try:
+                    docx_bytes, pdf_bytes = fut.result()
+                    _store_rendered_files(
+                        db, rv, user, docx_bytes if plan.want_docx else None, pdf_bytes
+                    )
+                    release_connection(db)
+                    rendered += 1
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    print("re-render failed:", rv.id, e)
+    finally:
+        db.close()
+
+    print(f"re-render user={user_id} rendered={rendered} failed={failed}")
+    return {"user_id": user_id, "rendered": rendered, "failed": failed}
+
+
+@router.post("/v1/users/{user_id}/resume-versions/rerender")
+def rerender_user_versions(
+    user_id: str,
+    background_tasks: BackgroundTasks,
+    payload: RenderVersionIn | None = None,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Queue a background re-render of all of a user's versions (e.g. after a template change)."""
+    _check_access(db, principal, user_id)
+    export_format = (payload or RenderVersionIn()).export_format
+    _plan_export(export_format)
+
+    queued = sum(
+        1
+        for rv in db.query(ResumeVersion).filter(ResumeVersion.user_id == user_id).all()
+        if _renderable_resume(rv) is not None
+    )
+    if queued:
+        background_tasks.add_task(rerender_user_versions_job, user_id, export_format)
+    return {"ok": True, "user_id": user_id, "queued": queued}
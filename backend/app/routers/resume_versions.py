@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from ..auth import Principal, get_db, get_principal
+from ..db import SessionLocal, release_connection
+from ..models import (
+    AdminUser,
+    Application,
+    JDKeyInfo,
+    JobDescription,
+    ResumeVersion,
+    User,
+)
+from ..ai import generate_cover_letter
+from ..scheduler import work_lane
+
+router = APIRouter(prefix="/v1", tags=["resume-versions"])
+
+COVER_LETTER_MODES = ("inline", "lazy", "background")
+
+# One in-flight cover letter generation per resume version (per process).
+# Concurrent callers for the same version wait on the first one's event; no lock
+# is held across the model call, and entries are dropped once it finishes.
+_COVER_LETTER_INFLIGHT: Dict[str, threading.Event] = {}
+_COVER_LETTER_INFLIGHT_LOCK = threading.Lock()
+
+
+def _ensure_access(db: Session, principal: Principal, user_id: str) -> None:
+    if principal.type == "user":
+        if principal.id != user_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return
+    ok = (
+        db.query(AdminUser)
+        .filter(AdminUser.admin_id == principal.id, AdminUser.user_id == user_id)
+        .first()
+    )
+    if not ok:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def validate_cover_letter_mode(mode: str) -> str:
+    mode = (mode or "inline").lower().strip()
+    if mode not in COVER_LETTER_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail="cover_letter_mode must be one of: inline, lazy, background",
+        )
+    return mode
+
+
+def cover_letter_url(rv_id: str) -> str:
+    return f"/v1/resume-versions/{rv_id}/cover-letter"
+
+
+def create_deferred_version(
+    db: Session,
+    *,
+    user_id: str,
+    resume: Dict[str, Any],
+    jd_key_id: Optional[int] = None,
+    application_id: Optional[str] = None,
+    schema_version: str = "tailor_v2",
+    cover_letter_instructions: str = "",
+) -> ResumeVersion:
+    """Persist a resume whose cover letter will be generated later.
+
+    The instructions are stored with it, so the lazy GET and background task
+    write the letter the caller asked for.
+    """
+    now = dt.datetime.now()
+    rv = ResumeVersion(
+        id=f"rv{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}",
+        user_id=user_id,
+        application_id=application_id,
+        jd_key_id=jd_key_id,
+        schema_version=schema_version,
+        tailored_json=json.dumps(resume or {}, ensure_ascii=False),
+        cover_letter_status="pending",
+        cover_letter_instructions=cover_letter_instructions or None,
+        created_at=now,
+    )
+    db.add(rv)
+    return rv
+
+
+def _cover_letter_context(db: Session, rv: ResumeVersion) -> Dict[str, Any]:
+    ctx: Dict[str, Any] = {}
+    if rv.application_id:
+        app_row = db.get(Application, rv.application_id)
+        if app_row:
+            ctx["company"] = app_row.company
+            ctx["position"] = app_row.role
+        jd_row = (
+            db.query(JobDescription)
+            .filter(JobDescription.application_id == rv.application_id)
+            .order_by(JobDescription.created_at.desc())
+            .first()
+        )
+        if jd_row:
+            ctx["jd_text"] = jd_row.jd_text or ""
+    if rv.jd_key_id:
+        jd_keys = db.get(JDKeyInfo, rv.jd_key_id)
+        if jd_keys:
+            try:
+                keys = json.loads(jd_keys.keys_json or "{}")
+            except Exception:
+                keys = {}
+            if isinstance(keys, dict):
+                ctx["core_hard"] = keys.get("core_hard") or []
+                ctx["core_soft"] = keys.get("core_soft") or []
+                ctx["required_phrases"] = keys.get("required_phrases") or []
+    return ctx
+
+
+def _claim_cover_letter(rv_id: str) -> Optional[threading.Event]:
+    """None if we are now generating `rv_id`, else the in-flight run's event."""
+    with _COVER_LETTER_INFLIGHT_LOCK:
+        running = _COVER_LETTER_INFLIGHT.get(rv_id)
+        if running is None:
+            _COVER_LETTER_INFLIGHT[rv_id] = threading.Event()
+        return running
+
+
+def _release_cover_letter(rv_id: str) -> None:
+    with _COVER_LETTER_INFLIGHT_LOCK:
+        _COVER_LETTER_INFLIGHT.pop(rv_id).set()
+
+
+def ensure_cover_letter(
+    db: Session, rv_id: str, instructions: Optional[str] = None
+) -> ResumeVersion:
+    """Return the version with its cover letter, generating and storing it once.
+
+    `instructions` defaults to the ones stored when the version was created.
+    """
+    while True:
+        rv = db.get(ResumeVersion, rv_id)
+        if not rv:
+            raise HTTPException(status_code=404, detail="Resume version not found")
+        db.refresh(rv)
+        if rv.cover_letter_status == "ready":
+            return rv
+        running = _claim_cover_letter(rv_id)
+        if running is None:
+            break
+        release_connection(db)
+        running.wait()
+
+    try:
+        try:
+            resume = json.loads(rv.tailored_json or "{}")
+        except Exception:
+            resume = {}
+        if instructions is None:
+            instructions = rv.cover_letter_instructions or ""
+        context = _cover_letter_context(db, rv)
+        user = db.get(User, rv.user_id)
+        release_connection(db)
+        try:
+            letter = generate_cover_letter(
+                resume=resume if isinstance(resume, dict) else {},
+                instructions=instructions,
+                **context,
+            )
+        except Exception as e:
+            print("cover letter generation failed:", rv_id, e)
+            rv.cover_letter_status = "failed"
+            db.commit()
+            raise HTTPException(status_code=502, detail="Cover letter generation failed")
+
+        if user and user.first_name:
+            letter = re.sub(r"\n{1,2}\[Your Name\]", f"\n{user.first_name}", letter)
+        rv.cover_letter = letter
+        rv.cover_letter_status = "ready"
+        db.commit()
+        return rv
+    finally:
+        _release_cover_letter(rv_id)
+
+
+def generate_cover_letter_in_background(rv_id: str, instructions: Optional[str] = None) -> None:
+    """BackgroundTasks entry point: uses its own session, never raises."""
+    db = SessionLocal()
+    try:
+        with work_lane("background"):
+            ensure_cover_letter(db, rv_id, instructions)
+    except Exception as e:
+        print("background cover letter failed:", rv_id, e)
+    finally:
+        db.close()
+
+
+@router.get("/resume-versions/{rv_id}/cover-letter")
+def get_cover_letter(
+    rv_id: str,
+    instructions: Optional[str] = None,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Serve the stored cover letter, generating it on first request (deferred mode)."""
+    rv = db.get(ResumeVersion, rv_id)
+    if not rv:
+        raise HTTPException(status_code=404, detail="Resume version not found")
+    _ensure_access(db, principal, rv.user_id)
+
+    generated = rv.cover_letter_status != "ready"
+    if generated:
+        rv = ensure_cover_letter(db, rv_id, instructions)
+    return {
+        "resume_version_id": rv.id,
+        "application_id": rv.application_id,
+        "status": rv.cover_letter_status,
+        "generated": generated,
+        "cover_letter": rv.cover_letter or "",
+    }
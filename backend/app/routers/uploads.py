@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import tempfile
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from ..auth import Principal, get_db, get_principal
+from ..db import SessionLocal, release_connection
+from ..models import AdminUser, Application, StoredFile, UploadSession, User
+from ..resume_docx import extract_resume_json_from_docx
+from ..services.file_cache import read_stored_file
+from ..services.upload_service import (
+    UPLOAD_MAX_BYTES,
+    check_head,
+    check_size,
+    validate_file,
+)
+from ..storage import (
+    backend_named,
+    get_backend,
+    read_bytes,
+    release_after_commit,
+    safe_filename,
+    verify_local_upload_token,
+)
+from .files import invalidate_after_commit
+from .ingest import TAILORED_UPLOAD_TYPES, _upload_ext, record_tailored_upload
+from .users import upsert_base_resume
+
+# Direct-to-storage uploads.
+#
+# 1. POST /v1/uploads/sign returns short-lived upload parameters for the
+#    configured backend. For Cloudinary these are signed form fields for its
+#    upload API; the local backend's stand-in signer points at
+#    PUT /v1/uploads/{id}/content with an HMAC token.
+# 2. The client uploads the file straight to that URL.
+# 3. POST /v1/uploads/{id}/complete verifies the upload, registers the
+#    StoredFile, and queues validation/parsing. Poll GET /v1/uploads/{id}.
+#    A tailored resume replaces the application's current files, so it is only
+#    recorded after validation passes; a bad upload leaves them untouched.
+
+router = APIRouter(prefix="/v1", tags=["uploads"])
+
+DIRECT_UPLOAD_TTL_SECONDS = int(os.getenv("DIRECT_UPLOAD_TTL_SECONDS", "900"))
+
+_DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# purpose -> (allowed extensions, minimum size)
+_PURPOSES = {
+    "base_resume_docx": ((".docx",), 1000),
+    "resume_template_docx": ((".docx",), 1000),
+    "tailored_resume": (tuple(TAILORED_UPLOAD_TYPES), 1),
+}
+
+
+def _ensure_access(db: Session, principal: Principal, user_id: str) -> None:
+    if principal.type == "user":
+        if principal.id != user_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return
+    ok = (
+        db.query(AdminUser)
+        .filter(AdminUser.admin_id == principal.id, AdminUser.user_id == user_id)
+        .first()
+    )
+    if not ok:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def _ext(filename: str) -> str:
+    return "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+def _upload_status(row: UploadSession) -> Dict[str, Any]:
+    return {
+        "upload_id": row.id,
+        "purpose": row.purpose,
+        "status": row.status,
+        "error": row.error,
+        "stored_file_id": row.stored_file_id,
+        "result": json.loads(row.result_json) if row.result_json else None,
+        "expires_at": row.expires_at.isoformat(),
+    }
+
+
+def _get_upload_for(db: Session, principal: Principal, upload_id: str) -> UploadSession:
+    row = db.get(UploadSession, upload_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    _ensure_access(db, principal, row.user_id)
+    return row
+
+
+class SignUploadIn(BaseModel):
+    user_id: str
+    purpose: str = Field(description="base_resume_docx | resume_template_docx | tailored_resume")
+    filename: str
+    application_id: Optional[str] = None  # required for tailored_resume
+    size: Optional[int] = Field(default=None, ge=0)
+
+
+@router.post("/uploads/sign")
+def sign_upload(
+    payload: SignUploadIn,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    _ensure_access(db, principal, payload.user_id)
+    if payload.purpose not in _PURPOSES:
+        raise HTTPException(status_code=400, detail="Unknown upload purpose")
+    exts, _ = _PURPOSES[payload.purpose]
+    filename = (payload.filename or "").strip()
+    ext = _ext(filename)
+    if ext not in exts:
+        raise HTTPException(
+            status_code=400, detail=f"Only {', '.join(exts)} files are supported for this upload"
+        )
+    if payload.size is not None:
+        check_size(payload.size)
+    backend = get_backend()
+    if not backend.supports_direct_upload:
+        raise HTTPException(status_code=501, detail="Storage backend does not support direct uploads")
+
+    now = dt.datetime.now()
+    upload_id = f"upl{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+    if payload.purpose == "tailored_resume":
+        app_row = db.get(Application, payload.application_id or "")
+        if not app_row or app_row.user_id != payload.user_id:
+            raise HTTPException(status_code=404, detail="Application not found")
+        user = db.get(User, payload.user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        # Same naming as the proxied upload-tailored-resume
+        user_info, application_id = f"{user.name or user.id}-{user.id}", app_row.id
+        object_name = f"{upload_id}{ext}"
+    else:
+        user_info, application_id = payload.user_id, "base"
+        object_name = safe_filename(filename)
+
+    expires_at = now + dt.timedelta(seconds=DIRECT_UPLOAD_TTL_SECONDS)
+    signed = backend.sign_upload(upload_id, user_info, application_id, object_name, expires_at)
+
+    db.add(
+        UploadSession(
+            id=upload_id,
+            user_id=payload.user_id,
+            principal_type=principal.type,
+            principal_id=principal.id,
+            purpose=payload.purpose,
+            application_id=application_id,
+            filename=filename,
+            backend=backend.name,
+            object_key=signed.get("object_key"),
+            status="pending",
+            expires_at=expires_at,
+            created_at=now,
+            updated_at=now,
+        )
+    )
+    db.commit()
+    return {
+        "upload_id": upload_id,
+        "backend": backend.name,
+        "method": signed["method"],
+        "url": signed["url"],
+        "fields": signed["fields"],
+        "max_bytes": UPLOAD_MAX_BYTES,
+        "expires_at": expires_at.isoformat(),
+        "complete_url": f"/v1/uploads/{upload_id}/complete",
+    }
+
+
+@router.put("/uploads/{upload_id}/content")
+async def put_local_upload_content(
+    upload_id: str,
+    request: Request,
+    expires: str,
+    token: str,
+    db: Session = Depends(get_db),
+):
+    """Upload target of the local stand-in signer; the token is the credential."""
+    if not verify_local_upload_token(upload_id, expires, token):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload signature")
+    row = db.get(UploadSession, upload_id)
+    if not row or row.backend != "local":
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if row.status != "pending":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    check_size(int(request.headers.get("content-length") or 0))
+
+    _, min_bytes = _PURPOSES[row.purpose]
+    kind = _ext(row.filename)[1:]
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+        size, head = 0, b""
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            if len(head) < 8:  # body chunks can be tiny; check magic once 8 bytes are in
+                head += chunk[: 8 - len(head)]
+                if len(head) == 8:
+                    check_head(head, kind)
+            size += len(chunk)
+            check_size(size)
+            spool.write(chunk)
+        validate_file(spool, kind, min_bytes=min_bytes)
+
+        release_connection(db)
+        path = await run_in_threadpool(
+            backend_named("local").save_file, row.user_id, row.application_id, row.filename, spool
+        )
+
+    row = db.get(UploadSession, upload_id)
+    previous = row.path
+    row.path = path
+    row.updated_at = dt.datetime.now()
+    if previous and previous != path:
+        release_after_commit(db, [previous])
+    db.commit()
+    return {"ok": True, "upload_id": upload_id, "size": size}
+
+
+class CompleteUploadIn(BaseModel):
+    # The storage service's upload response, relayed by the client
+    # (Cloudinary: public_id, version, signature, bytes). Empty for local.
+    result: Dict[str, Any] = Field(default_factory=dict)
+
+
+def _register_upload(db: Session, row: UploadSession, path: str) -> Optional[str]:
+    """Create the StoredFile for a finished base/template upload; returns its id.
+
+    Tailored resumes replace the application's current files, so they are only
+    recorded once the bytes pass validation (`_record_tailored`).
+    """
+    if row.purpose == "tailored_resume":
+        return None
+    now = dt.datetime.now()
+    stamp = f"{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}"
+    prefix = "base_resume" if row.purpose == "base_resume_docx" else "resume_template"
+    sf = StoredFile(
+        id=f"{prefix}_{row.user_id}_{stamp}",
+        user_id=row.user_id,
+        application_id="base",
+        kind=row.purpose,
+        path=path,
+        mime=_DOCX_MIME,
+        filename=safe_filename(row.filename),
+        created_at=now,
+    )
+    db.add(sf)
+    return sf.id
+
+
+@router.post("/uploads/{upload_id}/complete", status_code=202)
+def complete_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    payload: Optional[CompleteUploadIn] = None,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    """Register the uploaded file and queue its validation/parsing."""
+    row = _get_upload_for(db, principal, upload_id)
+    if row.status != "pending":
+        return _upload_status(row)  # completing twice is harmless
+    if row.expires_at < dt.datetime.now():
+        row.status, row.error = "failed", "Upload expired"
+        if row.path:
+            release_after_commit(db, [row.path])
+        db.commit()
+        raise HTTPException(status_code=410, detail="Upload expired")
+
+    result = (payload or CompleteUploadIn()).result
+    try:
+        path = backend_named(row.backend).confirm_upload(row, result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result.get("bytes") is not None:
+        check_size(int(result["bytes"]))
+
+    row.stored_file_id = _register_upload(db, row, path)
+    row.path = path
+    row.status = "processing"
+    row.updated_at = dt.datetime.now()
+    db.commit()
+    background_tasks.add_task(process_direct_upload, upload_id)
+    return _upload_status(row)
+
+
+@router.get("/uploads/{upload_id}")
+def get_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_principal),
+):
+    return _upload_status(_get_upload_for(db, principal, upload_id))
+
+
+def _record_tailored(db: Session, row: UploadSession) -> str:
+    """Record a validated tailored upload, replacing the application's resume files."""
+    app_row = db.get(Application, row.application_id)
+    if not app_row:
+        raise HTTPException(status_code=404, detail="Application not found")
+    now = dt.datetime.now()
+    out = record_tailored_upload(
+        db,
+        app_row,
+        file_id=f"file{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}",
+        path=row.path,
+        filename=row.filename,
+        ext=_upload_ext(row.filename),
+    )
+    return out["stored_file_id"]
+
+
+def _discard_registered(db: Session, row: UploadSession) -> None:
+    sf = db.get(StoredFile, row.stored_file_id) if row.stored_file_id else None
+    if sf:
+        release_after_commit(db, [sf.path])
+        invalidate_after_commit(db, [sf.id])
+        db.delete(sf)
+    elif row.path:
+        release_after_commit(db, [row.path])  # tailored upload, never recorded
+    row.stored_file_id = None
+
+
+def process_direct_upload(upload_id: str) -> None:
+    """BackgroundTasks entry point: validate the stored bytes and parse base resumes."""
+    db = SessionLocal()
+    try:
+        row = db.get(UploadSession, upload_id)
+        if not row or row.status != "processing":
+            return
+        _, min_bytes = _PURPOSES[row.purpose]
+        try:
+            if row.stored_file_id:
+                # Through the download cache, so a new template is already warm
+                data = read_stored_file(db.get(StoredFile, row.stored_file_id))
+            else:
+                data = read_bytes(row.path)
+            fh = validate_file(BytesIO(data), _ext(row.filename)[1:], min_bytes=min_bytes)
+            result: Dict[str, Any] = {}
+            if row.purpose == "tailored_resume":
+                row.stored_file_id = _record_tailored(db, row)
+            elif row.purpose == "base_resume_docx":
+                resume_json = extract_resume_json_from_docx(fh)
+                upsert_base_resume(db, row.user_id, resume_json)
+                exps = resume_json.get("experiences") or []
+                result["extracted"] = {
+                    "experiences": len(exps),
+                    "bullets": sum(len(e.get("bullets") or []) for e in exps),
+                }
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            print("direct upload rejected:", upload_id, detail)
+            db.rollback()
+            row = db.get(UploadSession, upload_id)
+            _discard_registered(db, row)
+            row.status, row.error = "failed", str(detail)[:2000]
+        else:
+            row.status = "completed"
+            row.result_json = json.dumps(result)
+        row.updated_at = dt.datetime.now()
+        db.commit()
+    except Exception as e:
+        print("direct upload processing failed:", upload_id, e)
+    finally:
+        db.close()
@@ -5,14 +5,14 @@ import json
 from io import BytesIO
 from typing import List, Optional
 
-import requests
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
 from pydantic import BaseModel, EmailStr, Field
 from docx import Document
 
 from sqlalchemy.orm import Session
 
 from ..auth import Principal, get_db, get_principal, require_admin
+from ..db import release_connection
 from ..models import AdminUser, User, AuthCredential
 from ..security import hash_password
 
@@ -170,11 +170,15 @@ def admin_create_user_and_link(
 
 from ..models import BaseResume
 from ..models import StoredFile
-from ..storage import save_bytes, safe_filename
+from ..services.file_cache import read_stored_file
+from ..services.upload_service import receive_upload
+from ..storage import save_file, safe_filename
 from ..resume_docx import extract_resume_json_from_docx
 from ..services.pdf_service import docx_bytes_to_pdf_bytes
+from .resume_builder import rerender_user_versions_job
 
 from fastapi import UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 
 
 class BaseResumeIn(BaseModel):
@@ -210,9 +214,7 @@ def _get_assigned_resume_template(db: Session, user_id: str) -> StoredFile | Non
 
 def _extract_template_preview(sf: StoredFile) -> dict:
     try:
-        resp = requests.get(sf.path, timeout=30)
-        resp.raise_for_status()
-        doc = Document(BytesIO(resp.content))
+        doc = Document(BytesIO(read_stored_file(sf)))
     except Exception:
         raise HTTPException(
             status_code=500, detail="Failed to read assigned DOCX template"
@@ -250,9 +252,7 @@ def _extract_template_preview(sf: StoredFile) -> dict:
 
 def _read_stored_docx(sf: StoredFile) -> bytes:
     try:
-        resp = requests.get(sf.path, timeout=30)
-        resp.raise_for_status()
-        return resp.content
+        return read_stored_file(sf)
     except Exception:
         raise HTTPException(
             status_code=500, detail="Failed to read assigned DOCX template"
@@ -262,7 +262,9 @@ def _read_stored_docx(sf: StoredFile) -> bytes:
 @router.put("/users/{user_id}/resume-template-docx")
 async def put_resume_template_docx(
     user_id: str,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    rerender_versions: bool = False,
     db: Session = Depends(get_db),
     principal: Principal = Depends(get_principal),
 ):
@@ -271,13 +273,12 @@ async def put_resume_template_docx(
     if not (file.filename or "").lower().endswith(".docx"):
         raise HTTPException(status_code=400, detail="Only .docx files are supported")
 
-    data = await file.read()
-    if not data or len(data) < 1000:
-        raise HTTPException(status_code=400, detail="Invalid DOCX")
+    fh = await receive_upload(file, "docx", min_bytes=1000)
 
     now = dt.datetime.now()
     filename = safe_filename(file.filename) or "resume_template.docx"
-    path = save_bytes(user_id, "base", filename, data)
+    release_connection(db)
+    path = await run_in_threadpool(save_file, user_id, "base", filename, fh)
     sf = StoredFile(
         id=f"resume_template_{user_id}_{now.strftime('%Y%m%d%H%M%S')}{now.microsecond}",
         user_id=user_id,
@@ -290,11 +291,15 @@ async def put_resume_template_docx(
     )
     db.add(sf)
     db.commit()
+    if rerender_versions:
+        # Bring existing resume versions onto the new template (no model calls).
+        background_tasks.add_task(rerender_user_versions_job, user_id)
     return {
         "ok": True,
         "user_id": user_id,
         "stored_file_id": sf.id,
         "filename": sf.filename,
+        "rerender_queued": rerender_versions,
         "updated_at": now.isoformat(),
     }
 
@@ -340,6 +345,25 @@ def get_resume_template_preview_pdf(
     return Response(content=pdf_bytes, media_type="application/pdf")
 
 
+def upsert_base_resume(db: Session, user_id: str, resume_json: dict) -> BaseResume:
+    """Store extracted base resume JSON (caller commits)."""
+    now = dt.datetime.now()
+    row = db.get(BaseResume, user_id)
+    content_text = json.dumps(resume_json, ensure_ascii=False)
+    if row:
+        row.content_text = content_text
+        row.updated_at = now
+    else:
+        row = BaseResume(
+            user_id=user_id,
+            content_text=content_text,
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(row)
+    return row
+
+
 @router.put("/users/{user_id}/base-resume-docx")
 async def put_base_resume_docx(
     user_id: str,
@@ -359,36 +383,23 @@ async def put_base_resume_docx(
     if not file.filename.lower().endswith(".docx"):
         raise HTTPException(status_code=400, detail="Only .docx files are supported")
 
-    data = await file.read()
-    if not data or len(data) < 1000:
-        raise HTTPException(status_code=400, detail="Invalid DOCX")
+    fh = await receive_upload(file, "docx", min_bytes=1000)
 
     # Extract JSON representation
     try:
-        resume_json = extract_resume_json_from_docx(data)
+        resume_json = extract_resume_json_from_docx(fh)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to parse DOCX: {str(e)}")
 
     now = dt.datetime.now()
 
-    # Upsert BaseResume row
-    row = db.get(BaseResume, user_id)
-    content_text = json.dumps(resume_json, ensure_ascii=False)
-    if row:
-        row.content_text = content_text
-        row.updated_at = now
-    else:
-        row = BaseResume(
-            user_id=user_id,
-            content_text=content_text,
-            created_at=now,
-            updated_at=now,
-        )
-        db.add(row)
-
-    # Save original DOCX
+    # Save original DOCX (before any row is written, so no transaction spans the upload)
     filename = safe_filename(file.filename) or "base_resume.docx"
-    path = save_bytes(user_id, "base", filename, data)
+    release_connection(db)
+    path = await run_in_threadpool(save_file, user_id, "base", filename, fh)
+
+    upsert_base_resume(db, user_id, resume_json)
+
     sf = StoredFile(
         id=f"base_resume_{user_id}_{int(now.timestamp())}",
         user_id=user_id,
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .deadlines import check_deadline, current_deadline
+from .timings import percentile, stage
+
+# Priority lanes for scarce work (model calls, soffice conversions, mailbox syncs).
+#
+# Every slow call site wraps itself in `scheduled("llm" | "soffice" | "sync")`.
+# The caller's lane comes from a contextvar: request handlers are
+# "interactive" by default, and background entry points (re-renders, deferred
+# cover letters, speculative jobs, mailbox syncs) enter `work_lane("background")`.
+# Each (resource, lane) pair has its own concurrency limit, so a bulk re-render
+# can never take the soffice slots an apply click needs.
+#
+# Limits come from WORK_<RESOURCE>_<LANE>_CONCURRENCY, e.g.
+# WORK_SOFFICE_BACKGROUND_CONCURRENCY=1. Limits are per process. Time spent
+# queued shows up as a `queue_<resource>` stage in the pipeline timings.
+#
+# Within a gate, slots are shared fairly between tenants (the authenticated
+# principal, "admin:<id>" or "user:<id>"; "system" for scripts). A tenant can
+# hold at most WORK_<RESOURCE>_<LANE>_TENANT_CONCURRENCY slots, and freed
+# slots go to the waiting tenant with the fewest running calls per weight.
+# Weights come from WORK_TENANT_WEIGHTS="admin:a1=2,user:u7=0.5" (default 1).
+# Over-quota calls queue; they are never rejected (beyond the queue timeout).
+
+LANES = ("interactive", "background")
+
+_DEFAULT_LIMITS: Dict[str, Dict[str, int]] = {
+    "llm": {"interactive": 8, "background": 2},
+    "soffice": {"interactive": 2, "background": 1},
+    "sync": {"interactive": 2, "background": 2},
+}
+_FALLBACK_LIMITS = {"interactive": 4, "background": 1}
+# Per-tenant caps; a missing entry means a tenant may use the whole lane
+_DEFAULT_TENANT_LIMITS: Dict[str, Dict[str, int]] = {
+    "llm": {"interactive": 6},
+}
+
+WORK_QUEUE_TIMEOUT_SECONDS = float(os.getenv("WORK_QUEUE_TIMEOUT_SECONDS", "300"))
+
+SYSTEM_TENANT = "system"
+
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("work_lane", default="interactive")
+
+
+class _TenantCell:
+    """Mutable holder, so a dependency run in a copied context can still set it."""
+
+    def __init__(self, tenant: Optional[str] = None) -> None:
+        self.tenant = tenant
+
+
+_tenant: contextvars.ContextVar[Optional[_TenantCell]] = contextvars.ContextVar(
+    "work_tenant", default=None
+)
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in raw.split(","):
+        name, sep, value = part.strip().rpartition("=")
+        if not sep or not name:
+            continue
+        try:
+            out[name.strip()] = max(0.01, float(value))
+        except ValueError:
+            print("scheduler: ignoring bad WORK_TENANT_WEIGHTS entry", part)
+    return out
+
+
+_TENANT_WEIGHTS = _parse_weights(os.getenv("WORK_TENANT_WEIGHTS", ""))
+
+
+def tenant_weight(tenant: str) -> float:
+    return _TENANT_WEIGHTS.get(tenant, 1.0)
+
+
+def tenant_key(principal_type: str, principal_id: str) -> str:
+    return f"{principal_type}:{principal_id}"
+
+
+def current_tenant() -> str:
+    cell = _tenant.get()
+    return (cell.tenant if cell else None) or SYSTEM_TENANT
+
+
+@contextmanager
+def tenant_scope(tenant: Optional[str] = None) -> Iterator[None]:
+    """Start a fresh tenant binding (per request, per job)."""
+    token = _tenant.set(_TenantCell(tenant))
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def bind_tenant(tenant: str) -> None:
+    """Attribute the current scope's work to `tenant` (called once auth resolves)."""
+    cell = _tenant.get()
+    if cell is None:
+        _tenant.set(_TenantCell(tenant))
+    else:
+        cell.tenant = tenant
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+@contextmanager
+def work_lane(lane: str) -> Iterator[None]:
+    """Run the enclosed work (and anything it schedules) in `lane`."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown work lane: {lane}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def _limit_for(resource: str, lane: str) -> int:
+    default = _DEFAULT_LIMITS.get(resource, _FALLBACK_LIMITS)[lane]
+    return max(1, int(os.getenv(f"WORK_{resource.upper()}_{lane.upper()}_CONCURRENCY", str(default))))
+
+
+def _tenant_limit_for(resource: str, lane: str, limit: int) -> int:
+    default = _DEFAULT_TENANT_LIMITS.get(resource, {}).get(lane, limit)
+    env = os.getenv(f"WORK_{resource.upper()}_{lane.upper()}_TENANT_CONCURRENCY")
+    return max(1, min(limit, int(env) if env else default))
+
+
+class _TenantStats:
+    def __init__(self) -> None:
+        self.running = 0
+        self.waiting: Deque["_Ticket"] = deque()
+        self.acquired = 0
+        self.last_served = 0  # dispatch sequence number, for round-robin ties
+        self.waits: Deque[float] = deque(maxlen=200)
+
+
+class _Ticket:
+    __slots__ = ("tenant", "granted")
+
+    def __init__(self, tenant: str) -> None:
+        self.tenant = tenant
+        self.granted = False
+
+
+class LaneGate:
+    """Counting gate for one (resource, lane), shared fairly between tenants.
+
+    Waiters queue per tenant. A freed slot goes to the waiting tenant with the
+    fewest running calls for its weight, so one tenant's backlog cannot hold
+    every slot while others wait. Ties go to the tenant served longest ago.
+    """
+
+    def __init__(self, resource: str, lane: str, limit: int, tenant_limit: int) -> None:
+        self.resource = resource
+        self.lane = lane
+        self.limit = limit
+        self.tenant_limit = tenant_limit
+        self._cond = threading.Condition()
+        self._tenants: Dict[str, _TenantStats] = {}
+        self._seq = 0
+        self.running = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self._waits: Deque[float] = deque(maxlen=1000)  # seconds, most recent
+
+    def _stats(self, tenant: str) -> _TenantStats:
+        t = self._tenants.get(tenant)
+        if t is None:
+            t = self._tenants[tenant] = _TenantStats()
+        return t
+
+    def _dispatch(self) -> None:
+        # Caller holds self._cond
+        granted = False
+        while self.running < self.limit:
+            best = None
+            for name, t in self._tenants.items():
+                if not t.waiting or t.running >= self.tenant_limit:
+                    continue
+                rank = (t.running / tenant_weight(name), t.last_served)
+                if best is None or rank < best[0]:
+                    best = (rank, t)
+            if best is None:
+                break
+            t = best[1]
+            t.waiting.popleft().granted = True
+            t.running += 1
+            self._seq += 1
+            t.last_served = self._seq
+            self.running += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, timeout: Optional[float] = None, tenant: Optional[str] = None) -> float:
+        """Block until a slot is free; returns the seconds spent waiting."""
+        tenant = tenant or current_tenant()
+        client = current_deadline()
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + timeout
+        with self._cond:
+            stats = self._stats(tenant)
+            ticket = _Ticket(tenant)
+            stats.waiting.append(ticket)
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                self._dispatch()
+                while not ticket.granted:
+                    reason = client.exceeded() if client is not None else None
+                    if reason:
+                        stats.waiting.remove(ticket)
+                        raise client.fail(reason, f"queue_{self.resource}")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        stats.waiting.remove(ticket)
+                        self.timeouts += 1
+                        raise HTTPException(
+                            status_code=503,
+                            detail=f"Too much {self.resource} work queued; try again shortly",
+                            headers={"Retry-After": "10"},
+                        )
+                    if client is not None:
+                        # Wake up to notice a cancelled client
+                        remaining = 0.25 if remaining is None else min(remaining, 0.25)
+                    self._cond.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.acquired += 1
+            stats.acquired += 1
+            waited = time.monotonic() - t0
+            self._waits.append(waited)
+            stats.waits.append(waited)
+        return waited
+
+    def release(self, tenant: Optional[str] = None) -> None:
+        tenant = tenant or current_tenant()
+        with self._cond:
+            self.running -= 1
+            self._stats(tenant).running -= 1
+            self._dispatch()
+
+    def report(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            tenants = {}
+            for name, t in sorted(self._tenants.items()):
+                tw = sorted(t.waits)
+                tenants[name] = {
+                    "weight": tenant_weight(name),
+                    "running": t.running,
+                    "queued": len(t.waiting),
+                    "acquired": t.acquired,
+                    "wait_ms_p50": round(percentile(tw, 50) * 1000, 1) if tw else None,
+                    "wait_ms_p95": round(percentile(tw, 95) * 1000, 1) if tw else None,
+                    "wait_ms_max": round(tw[-1] * 1000, 1) if tw else None,
+                }
+            return {
+                "limit": self.limit,
+                "tenant_limit": self.tenant_limit,
+                "running": self.running,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "wait_ms_p50": round(percentile(waits, 50) * 1000, 1) if waits else None,
+                "wait_ms_p95": round(percentile(waits, 95) * 1000, 1) if waits else None,
+                "wait_ms_max": round(waits[-1] * 1000, 1) if waits else None,
+                "tenants": tenants,
+            }
+
+
+class WorkScheduler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._gates: Dict[Tuple[str, str], LaneGate] = {}
+
+    def gate(self, resource: str, lane: Optional[str] = None) -> LaneGate:
+        lane = lane or current_lane()
+        key = (resource, lane)
+        with self._lock:
+            g = self._gates.get(key)
+            if g is None:
+                limit = _limit_for(resource, lane)
+                g = self._gates[key] = LaneGate(
+                    resource, lane, limit, _tenant_limit_for(resource, lane, limit)
+                )
+            return g
+
+    @contextmanager
+    def slot(self, resource: str, lane: Optional[str] = None) -> Iterator[None]:
+        g = self.gate(resource, lane)
+        tenant = current_tenant()
+        check_deadline(resource)
+        with stage(f"queue_{resource}"):
+            g.acquire(WORK_QUEUE_TIMEOUT_SECONDS, tenant)
+        try:
+            yield
+        finally:
+            g.release(tenant)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """{resource: {lane: stats}}"""
+        with self._lock:
+            gates = list(self._gates.values())
+        out: Dict[str, Dict[str, Any]] = {}
+        for g in sorted(gates, key=lambda g: (g.resource, LANES.index(g.lane))):
+            out.setdefault(g.resource, {})[g.lane] = g.report()
+        return out
+
+
+scheduler = WorkScheduler()
+
+
+def scheduled(resource: str, lane: Optional[str] = None):
+    """`with scheduled("soffice"):` runs the block in a slot of the caller's lane."""
+    return scheduler.slot(resource, lane)
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import contextvars
 import json
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field, ValidationError
@@ -10,10 +13,20 @@ from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from ..deadlines import timeout_for
+from ..scheduler import scheduled
+from ..timings import stage
+
 load_dotenv()
 
 DEFAULT_JD_MODEL = os.getenv("OPENAI_JD_MODEL", "gpt-5-mini")
 DEFAULT_RESUME_MODEL = os.getenv("OPENAI_RESUME_MODEL", "gpt-5.2")
+DEFAULT_TAILOR_MODEL = os.getenv("OPENAI_TAILOR_MODEL", "gpt-4.1-mini")
+# The SDK default; shortened to the client's deadline when it sends one
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "600"))
+# Fan-out tailoring: one call per resume section instead of one monolithic call.
+TAILOR_PARALLEL = os.getenv("OPENAI_TAILOR_PARALLEL", "0") == "1"
+TAILOR_PARALLEL_WORKERS = int(os.getenv("OPENAI_TAILOR_PARALLEL_WORKERS", "6"))
 
 
 class AIService:
@@ -184,6 +197,134 @@ class GeneratedResumeResult(BaseModel):
     cover_letter: str = ""
 
 
+_TAILOR_CONSTRAINTS_COMMON = [
+    "Do NOT add new tools, employers, years, certifications, metrics, scope, outcomes, or responsibilities not present in the original text.",
+    "MUST Use all JD keywords as verbatim in total",
+]
+_TAILOR_CONSTRAINT_SUMMARY = "Summary: 3-4 sentences. Target <= 350 chars; hard cap <= 420 chars."
+_TAILOR_CONSTRAINTS_BULLETS = [
+    "Bullets: rewrite EVERY bullet. Do not drop bullets and do not add bullets.",
+    "Bullets must keep same count and same order as provided. source_index must match.",
+    "Bullets: target <= 200 chars, hard cap <= 250 chars (10pt, max ~3 lines). Past tense. Strong verb first.",
+]
+_TAILOR_CONSTRAINT_COVER_LETTER = (
+    "Cover letter:180-260 words, professional tone, no fabricated claims, no addresses"
+)
+
+
+def _part_schema(name: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": properties,
+            "required": list(properties.keys()),
+        },
+    }
+
+
+_TAILOR_SUMMARY_SCHEMA = _part_schema(
+    "resume_tailor_summary_v1", {"summary": {"type": "string"}}
+)
+_TAILOR_EXPERIENCE_SCHEMA = _part_schema(
+    "resume_tailor_experience_v1",
+    {
+        "exp_index": _TAILOR_RESUME_SCHEMA["schema"]["properties"]["experiences"]["items"]["properties"]["exp_index"],
+        "rewrites": _TAILOR_RESUME_SCHEMA["schema"]["properties"]["experiences"]["items"]["properties"]["rewrites"],
+    },
+)
+_TAILOR_COVER_LETTER_SCHEMA = _part_schema(
+    "resume_tailor_cover_letter_v1", {"cover_letter": {"type": "string"}}
+)
+
+
+class TailoredSummary(BaseModel):
+    summary: str
+
+
+class TailoredCoverLetter(BaseModel):
+    cover_letter: str = ""
+
+
+def _structured_json_call(
+    svc: AIService,
+    *,
+    model: str,
+    model_input: Dict[str, Any],
+    schema: Dict[str, Any],
+    result_model: type[BaseModel],
+) -> Dict[str, Any]:
+    """Strict JSON-schema call with one repair round trip on validation errors."""
+    text_format = {
+        "format": {
+            "type": "json_schema",
+            "name": schema["name"],
+            "schema": schema["schema"],
+        }
+    }
+    with scheduled("llm"):
+        resp = svc.client.responses.create(
+            model=model,
+            input=[
+                {
+                    "role": "user",
+                    "content": [{"type": "input_text", "text": json.dumps(model_input)}],
+                }
+            ],
+            text=text_format,
+            timeout=timeout_for(OPENAI_TIMEOUT_SECONDS),
+        )
+    raw = resp.output_text or ""
+    data = json.loads(raw)
+    try:
+        validated = result_model.model_validate(data)
+        return validated.model_dump()
+    except ValidationError:
+        with scheduled("llm"):
+            repair = svc.client.responses.create(
+                model=model,
+                input=[
+                    {
+                        "role": "system",
+                        "content": [
+                            {
+                                "type": "input_text",
+                                "text": "Return VALID JSON that matches the provided JSON Schema exactly. Fix any issues and return only the corrected JSON.",
+                            }
+                        ],
+                    },
+                    {"role": "user", "content": [{"type": "input_text", "text": raw}]},
+                ],
+                text=text_format,
+                timeout=timeout_for(OPENAI_TIMEOUT_SECONDS),
+            )
+        repaired_raw = repair.output_text or ""
+        repaired = json.loads(repaired_raw)
+        validated2 = result_model.model_validate(repaired)
+        return validated2.model_dump()
+
+
+def _tailor_jd_context(
+    core_hard: List[str], core_soft: List[str], required_phrases: List[str]
+) -> Dict[str, Any]:
+    return {
+        "core_hard_skills": core_hard,
+        "core_soft_skills": core_soft,
+        "required_phrases": required_phrases,
+    }
+
+
+def _tailor_experiences_input(experiences: List[List[str]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "exp_index": i,
+            "bullets": [{"source_index": j, "text": b} for j, b in enumerate(bullets)],
+        }
+        for i, bullets in enumerate(experiences)
+    ]
+
+
 def tailor_rewrite_resume(
     *,
     summary_text: str,
@@ -193,97 +334,255 @@ def tailor_rewrite_resume(
     required_phrases: List[str],
     include_cover_letter: bool = False,
     cover_letter_instructions: str = "",
-    model: str = "gpt-4.1-mini",
+    model: str = DEFAULT_TAILOR_MODEL,
+    parallel: Optional[bool] = None,
 ) -> Dict[str, Any]:
-    """ONE OpenAI call to rewrite summary + bullets and optionally produce a cover letter.
+    """Rewrite summary + bullets and optionally produce a cover letter.
+
+    By default this is ONE OpenAI call. With `parallel=True` (or OPENAI_TAILOR_PARALLEL=1)
+    the summary, each experience and the cover letter are requested concurrently and
+    merged; if any part fails we fall back to the single call.
 
-    cover_letter is ALWAYS returned. If include_cover_letter=False, the model should return "".
-    This keeps the number of OpenAI requests the same as before.
+    cover_letter is ALWAYS returned. If include_cover_letter=False, it is "".
+    The result also carries a `timing` dict for latency comparison between modes.
     """
+    kwargs = dict(
+        summary_text=summary_text,
+        experiences=experiences,
+        core_hard=core_hard,
+        core_soft=core_soft,
+        required_phrases=required_phrases,
+        include_cover_letter=include_cover_letter,
+        cover_letter_instructions=cover_letter_instructions,
+        model=model,
+    )
+    use_parallel = TAILOR_PARALLEL if parallel is None else parallel
+
+    if use_parallel:
+        try:
+            return tailor_rewrite_resume_parallel(**kwargs)
+        except Exception as e:
+            print("parallel tailoring failed, falling back to single call:", e)
+
+    started = time.perf_counter()
+    out = _tailor_rewrite_resume_single(**kwargs)
+    out["timing"] = {
+        "mode": "single",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return out
+
 
+def _tailor_rewrite_resume_single(
+    *,
+    summary_text: str,
+    experiences: List[List[str]],
+    core_hard: List[str],
+    core_soft: List[str],
+    required_phrases: List[str],
+    include_cover_letter: bool,
+    cover_letter_instructions: str,
+    model: str,
+) -> Dict[str, Any]:
     svc = AIService()
 
     model_input = {
         "task": "Rewrite the resume summary and each bullet to better match JD keys while staying strictly truthful. Optionally draft a cover letter.",
         "constraints": [
-            "Do NOT add new tools, employers, years, certifications, metrics, scope, outcomes, or responsibilities not present in the original text.",
-            "Summary: 3-4 sentences. Target <= 350 chars; hard cap <= 420 chars.",
-            "Bullets: rewrite EVERY bullet. Do not drop bullets and do not add bullets.",
-            "Bullets must keep same count and same order as provided. source_index must match.",
-            "Bullets: target <= 200 chars, hard cap <= 250 chars (10pt, max ~3 lines). Past tense. Strong verb first.",
-            "MUST Use all JD keywords as verbatim in total",
+            _TAILOR_CONSTRAINTS_COMMON[0],
+            _TAILOR_CONSTRAINT_SUMMARY,
+            *_TAILOR_CONSTRAINTS_BULLETS,
+            _TAILOR_CONSTRAINTS_COMMON[1],
             # "Cover letter: if cover_letter.include is true, 180-260 words, professional tone, no fabricated claims, no addresses; otherwise return empty string.",
-            "Cover letter:180-260 words, professional tone, no fabricated claims, no addresses",
+            _TAILOR_CONSTRAINT_COVER_LETTER,
         ],
-        "jd": {
-            "core_hard_skills": core_hard,
-            "core_soft_skills": core_soft,
-            "required_phrases": required_phrases,
-        },
+        "jd": _tailor_jd_context(core_hard, core_soft, required_phrases),
         "summary_original": summary_text or "",
-        "experiences": [
-            {
-                "exp_index": i,
-                "bullets": [
-                    {"source_index": j, "text": b} for j, b in enumerate(bullets)
-                ],
-            }
-            for i, bullets in enumerate(experiences)
-        ],
+        "experiences": _tailor_experiences_input(experiences),
         "cover_letter": {
             "include": bool(include_cover_letter),
             "instructions": cover_letter_instructions or "",
         },
     }
-
-    resp = svc.client.responses.create(
+    return _structured_json_call(
+        svc,
         model=model,
-        input=[
-            {
-                "role": "user",
-                "content": [{"type": "input_text", "text": json.dumps(model_input)}],
-            }
-        ],
-        text={
-            "format": {
-                "type": "json_schema",
-                "name": _TAILOR_RESUME_SCHEMA["name"],
-                "schema": _TAILOR_RESUME_SCHEMA["schema"],
-            }
-        },
+        model_input=model_input,
+        schema=_TAILOR_RESUME_SCHEMA,
+        result_model=TailorResumeResult,
     )
-    raw = resp.output_text or ""
-    data = json.loads(raw)
-    try:
-        validated = TailorResumeResult.model_validate(data)
-        return validated.model_dump()
-    except ValidationError as e:
-        repair = svc.client.responses.create(
+
+
+def tailor_rewrite_resume_parallel(
+    *,
+    summary_text: str,
+    experiences: List[List[str]],
+    core_hard: List[str],
+    core_soft: List[str],
+    required_phrases: List[str],
+    include_cover_letter: bool = False,
+    cover_letter_instructions: str = "",
+    model: str = DEFAULT_TAILOR_MODEL,
+    max_workers: int = 0,
+) -> Dict[str, Any]:
+    """Fan-out/fan-in variant of `tailor_rewrite_resume`.
+
+    Issues one call for the summary, one per experience block and one for the cover
+    letter, all sharing the same JD key context, then merges them in exp_index order.
+    Raises if any part fails so the caller can fall back to the single call.
+    """
+    svc = AIService()
+    jd = _tailor_jd_context(core_hard, core_soft, required_phrases)
+    all_experiences = _tailor_experiences_input(experiences)
+
+    parts: Dict[str, Any] = {
+        "summary": lambda: _structured_json_call(
+            svc,
             model=model,
-            input=[
-                {
-                    "role": "system",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": "Return VALID JSON that matches the provided JSON Schema exactly. Fix any issues and return only the corrected JSON.",
-                        }
-                    ],
+            model_input={
+                "task": "Rewrite the resume summary to better match JD keys while staying strictly truthful to the summary and experience bullets.",
+                "constraints": [*_TAILOR_CONSTRAINTS_COMMON, _TAILOR_CONSTRAINT_SUMMARY],
+                "jd": jd,
+                "summary_original": summary_text or "",
+                "experiences": all_experiences,
+            },
+            schema=_TAILOR_SUMMARY_SCHEMA,
+            result_model=TailoredSummary,
+        )
+    }
+    for exp in all_experiences:
+        parts[f"experience_{exp['exp_index']}"] = (
+            lambda exp=exp: _structured_json_call(
+                svc,
+                model=model,
+                model_input={
+                    "task": "Rewrite each bullet of this experience to better match JD keys while staying strictly truthful.",
+                    "constraints": [*_TAILOR_CONSTRAINTS_COMMON, *_TAILOR_CONSTRAINTS_BULLETS],
+                    "jd": jd,
+                    "experience": exp,
                 },
-                {"role": "user", "content": [{"type": "input_text", "text": raw}]},
-            ],
-            text={
-                "format": {
-                    "type": "json_schema",
-                    "name": _TAILOR_RESUME_SCHEMA["name"],
-                    "schema": _TAILOR_RESUME_SCHEMA["schema"],
-                }
+                schema=_TAILOR_EXPERIENCE_SCHEMA,
+                result_model=TailoredExperience,
+            )
+        )
+    if include_cover_letter:
+        parts["cover_letter"] = lambda: _structured_json_call(
+            svc,
+            model=model,
+            model_input={
+                "task": "Draft a cover letter for this candidate that matches the JD keys while staying strictly truthful.",
+                "constraints": [_TAILOR_CONSTRAINTS_COMMON[0], _TAILOR_CONSTRAINT_COVER_LETTER],
+                "jd": jd,
+                "summary_original": summary_text or "",
+                "experiences": all_experiences,
+                "instructions": cover_letter_instructions or "",
             },
+            schema=_TAILOR_COVER_LETTER_SCHEMA,
+            result_model=TailoredCoverLetter,
         )
-        repaired_raw = repair.output_text or ""
-        repaired = json.loads(repaired_raw)
-        validated2 = TailorResumeResult.model_validate(repaired)
-        return validated2.model_dump()
+
+    def _timed(name, fn):
+        # Experience parts are summed into one stage of the caller's pipeline
+        part = "experiences" if name.startswith("experience_") else name
+        t0 = time.perf_counter()
+        with stage(f"tailor_{part}"):
+            result = fn()
+        return result, round((time.perf_counter() - t0) * 1000, 1)
+
+    started = time.perf_counter()
+    workers = max_workers or TAILOR_PARALLEL_WORKERS
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(parts)))) as pool:
+        # Each part keeps the caller's context (work lane, pipeline timer)
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, _timed, name, fn)
+            for name, fn in parts.items()
+        }
+        results = {name: f.result() for name, f in futures.items()}
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    # Deterministic merge: experiences are keyed by our own index, not the model's echo.
+    merged_experiences = []
+    for exp in all_experiences:
+        data, _ = results[f"experience_{exp['exp_index']}"]
+        merged_experiences.append(
+            {"exp_index": exp["exp_index"], "rewrites": data.get("rewrites") or []}
+        )
+    merged = TailorResumeResult.model_validate(
+        {
+            "summary": results["summary"][0].get("summary") or "",
+            "cover_letter": (
+                results["cover_letter"][0].get("cover_letter") or ""
+                if "cover_letter" in results
+                else ""
+            ),
+            "experiences": merged_experiences,
+        }
+    ).model_dump()
+
+    parts_ms = {name: ms for name, (_, ms) in results.items()}
+    merged["timing"] = {
+        "mode": "parallel",
+        "elapsed_ms": elapsed_ms,
+        "parts_ms": parts_ms,
+        # What the same calls would cost back to back; the single call is usually
+        # close to the slowest part plus everything else's output tokens.
+        "sequential_estimate_ms": round(sum(parts_ms.values()), 1),
+        "slowest_part": max(parts_ms, key=parts_ms.get) if parts_ms else None,
+    }
+    return merged
+
+
+def generate_cover_letter(
+    *,
+    resume: Dict[str, Any],
+    jd_text: str = "",
+    core_hard: Optional[List[str]] = None,
+    core_soft: Optional[List[str]] = None,
+    required_phrases: Optional[List[str]] = None,
+    company: str = "",
+    position: str = "",
+    instructions: str = "",
+    model: str = DEFAULT_TAILOR_MODEL,
+) -> str:
+    """Draft a cover letter from an already generated/tailored resume.
+
+    Used by the deferred cover letter flow, so the main resume call stays short.
+    """
+    svc = AIService()
+    experiences = []
+    for exp in resume.get("experiences") or []:
+        if not isinstance(exp, dict):
+            continue
+        experiences.append(
+            {
+                "company": exp.get("company") or exp.get("header") or "",
+                "job_title": exp.get("job_title") or exp.get("title") or "",
+                "bullets": exp.get("sentences") or exp.get("bullets") or [],
+            }
+        )
+    model_input = {
+        "task": "Draft a cover letter for this candidate that matches the job while staying strictly truthful to the resume.",
+        "constraints": [_TAILOR_CONSTRAINTS_COMMON[0], _TAILOR_CONSTRAINT_COVER_LETTER],
+        "target": {"company": company or "", "role": position or ""},
+        "jd": {
+            **_tailor_jd_context(core_hard or [], core_soft or [], required_phrases or []),
+            "text": jd_text or "",
+        },
+        "resume": {
+            "job_title": resume.get("job_title") or "",
+            "summary": resume.get("summary") or "",
+            "experiences": experiences,
+        },
+        "instructions": instructions or "",
+    }
+    out = _structured_json_call(
+        svc,
+        model=model,
+        model_input=model_input,
+        schema=_TAILOR_COVER_LETTER_SCHEMA,
+        result_model=TailoredCoverLetter,
+    )
+    return (out.get("cover_letter") or "").strip()
 
 
 _RESUME_GENERATION_PROMPT_TEMPLATE = """
@@ -372,24 +671,26 @@ def generate_resume_from_scratch(
     if include_cover_letter:
         prompt += "\nReturn a concise professional cover letter."
 
-    resp = svc.client.responses.create(
-        model=model,
-        input=[
-            {
-                "role": "user",
-                "content": [{"type": "input_text", "text": prompt}],
-            }
-        ],
-        reasoning={"effort": "low"},
-        text={
-            "verbosity": "medium",
-            "format": {
-                "type": "json_schema",
-                "name": schema["name"],
-                "schema": schema["schema"],
+    with scheduled("llm"):
+        resp = svc.client.responses.create(
+            model=model,
+            input=[
+                {
+                    "role": "user",
+                    "content": [{"type": "input_text", "text": prompt}],
+                }
+            ],
+            reasoning={"effort": "low"},
+            text={
+                "verbosity": "medium",
+                "format": {
+                    "type": "json_schema",
+                    "name": schema["name"],
+                    "schema": schema["schema"],
+                },
             },
-        },
-    )
+            timeout=timeout_for(OPENAI_TIMEOUT_SECONDS),
+        )
 
     raw = resp.output_text or ""
     data = json.loads(raw)
@@ -0,0 +1,199 @@
+"""Read-through disk cache for StoredFile downloads (templates, base resume DOCX).
+
+Entries are keyed by StoredFile id and content sha256. A cached copy younger
+than FILE_CACHE_REVALIDATE_SECONDS is served as-is; older ones are revalidated
+with If-None-Match against the stored ETag, so an overwritten Cloudinary object
+is picked up. The directory is kept under FILE_CACHE_MAX_BYTES by evicting the
+least recently used entries.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+
+from ..db import DATA_DIR
+from ..storage import is_local_path, read_bytes
+
+FILE_CACHE_DIR = Path(os.getenv("FILE_CACHE_DIR", str(DATA_DIR / "file_cache")))
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+FILE_CACHE_REVALIDATE_SECONDS = float(os.getenv("FILE_CACHE_REVALIDATE_SECONDS", "300"))
+
+
+@dataclass
+class _Entry:
+    file_id: str
+    source: str  # StoredFile.path the bytes came from
+    sha256: str
+    size: int
+    etag: Optional[str]
+    validated_at: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.file_id}-{self.sha256}"
+
+
+class FileCache:
+    def __init__(self, root: Path, max_bytes: int, revalidate_seconds: float) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # LRU order, oldest first
+        self._loaded = False
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "evictions": 0}
+
+    # -- index -------------------------------------------------------------
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        metas = sorted(self.root.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for meta in metas:
+            try:
+                entry = _Entry(**json.loads(meta.read_text()))
+            except Exception:
+                meta.unlink(missing_ok=True)
+                continue
+            if (self.root / entry.name).exists():
+                self._entries[entry.file_id] = entry
+            else:
+                meta.unlink(missing_ok=True)
+        self._loaded = True
+
+    def _total_bytes(self) -> int:
+        return sum(e.size for e in self._entries.values())
+
+    def _remove(self, entry: _Entry) -> None:
+        (self.root / entry.name).unlink(missing_ok=True)
+        (self.root / f"{entry.file_id}.json").unlink(missing_ok=True)
+
+    def _write_atomic(self, target: Path, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _store(self, file_id: str, source: str, data: bytes, etag: Optional[str]) -> None:
+        entry = _Entry(
+            file_id=file_id,
+            source=source,
+            sha256=hashlib.sha256(data).hexdigest(),
+            size=len(data),
+            etag=etag,
+            validated_at=time.time(),
+        )
+        if entry.size > self.max_bytes:
+            return
+        self._write_atomic(self.root / entry.name, data)
+        self._write_atomic(self.root / f"{file_id}.json", json.dumps(asdict(entry)).encode())
+        with self._lock:
+            old = self._entries.pop(file_id, None)
+            if old and old.name != entry.name:
+                (self.root / old.name).unlink(missing_ok=True)
+            self._entries[file_id] = entry
+            while self._total_bytes() > self.max_bytes and len(self._entries) > 1:
+                _, victim = self._entries.popitem(last=False)
+                self._remove(victim)
+                self.stats["evictions"] += 1
+
+    def _touch(self, entry: _Entry, validated: bool = False) -> None:
+        with self._lock:
+            if validated:
+                entry.validated_at = time.time()
+            if entry.file_id in self._entries:
+                self._entries.move_to_end(entry.file_id)
+        meta = self.root / f"{entry.file_id}.json"
+        if validated:
+            self._write_atomic(meta, json.dumps(asdict(entry)).encode())
+        else:
+            try:
+                os.utime(meta)  # keeps LRU order across restarts
+            except FileNotFoundError:
+                pass
+
+    def _read_entry(self, entry: _Entry) -> Optional[bytes]:
+        try:
+            data = (self.root / entry.name).read_bytes()
+        except FileNotFoundError:
+            return None
+        # Content hash is part of the key; a damaged file is a miss
+        return data if hashlib.sha256(data).hexdigest() == entry.sha256 else None
+
+    # -- public ------------------------------------------------------------
+
+    def get(self, file_id: str, source: str) -> bytes:
+        """Bytes of StoredFile `file_id` stored at `source`, from cache when valid."""
+        if is_local_path(source):
+            return read_bytes(source)  # already on local disk
+
+        with self._lock:
+            self._load()
+            entry = self._entries.get(file_id)
+        if entry and entry.source != source:
+            entry = None
+
+        data = self._read_entry(entry) if entry else None
+        if data is not None and time.time() - entry.validated_at < self.revalidate_seconds:
+            self.stats["hits"] += 1
+            self._touch(entry)
+            return data
+
+        headers = {"If-None-Match": entry.etag} if data is not None and entry.etag else {}
+        resp = requests.get(source, headers=headers, timeout=30)
+        if resp.status_code == 304 and data is not None:
+            self.stats["revalidated"] += 1
+            self._touch(entry, validated=True)
+            return data
+        resp.raise_for_status()
+        self.stats["misses"] += 1
+        self._store(file_id, source, resp.content, resp.headers.get("ETag"))
+        return resp.content
+
+    def local_copy(self, file_id: str, source: str) -> Optional[Path]:
+        """On-disk cached copy of StoredFile `file_id` (for streamed/Range responses).
+
+        None when the file is too large to cache.
+        """
+        self.get(file_id, source)
+        with self._lock:
+            entry = self._entries.get(file_id)
+        if entry is None or entry.source != source:
+            return None
+        return self.root / entry.name
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            served = self.stats["hits"] + self.stats["revalidated"]
+            total = served + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(served / total, 4) if total else None,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+file_cache = FileCache(FILE_CACHE_DIR, FILE_CACHE_MAX_BYTES, FILE_CACHE_REVALIDATE_SECONDS)
+
+
+def read_stored_file(sf) -> bytes:
+    """Read-through fetch of a StoredFile's bytes (shared by resume_builder and users)."""
+    return file_cache.get(sf.id, sf.path)
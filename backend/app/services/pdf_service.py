@@ -1,6 +1,51 @@
+import os
+import signal
 import subprocess
 import tempfile
-import os
+from pathlib import Path
+
+from ..deadlines import current_deadline
+from ..scheduler import scheduled
+from ..timings import stage
+
+
+def _kill(proc: subprocess.Popen) -> None:
+    # soffice forks soffice.bin, so take down the whole process group
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+def _run_soffice(cmd) -> None:
+    """Run a conversion, killing it if the client's deadline passes or it disconnects."""
+    deadline = current_deadline()
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        while True:
+            try:
+                returncode = proc.wait(timeout=0.25 if deadline else None)
+                break
+            except subprocess.TimeoutExpired:
+                reason = deadline.exceeded()
+                if reason:
+                    _kill(proc)
+                    raise deadline.fail(reason, "soffice")
+    except BaseException:
+        if proc.poll() is None:
+            _kill(proc)
+        raise
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
 
 
 def docx_bytes_to_pdf_bytes(docx_bytes: bytes) -> bytes:
@@ -12,20 +57,23 @@ def docx_bytes_to_pdf_bytes(docx_bytes: bytes) -> bytes:
         with open(docx_path, "wb") as f:
             f.write(docx_bytes)
 
-        subprocess.run(
-            [
-                soffice_bin,
-                "--headless",
-                "--convert-to",
-                "pdf",
-                "--outdir",
-                tmp,
-                docx_path,
-            ],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        # A profile per conversion: concurrent soffice runs sharing the default
+        # profile lock each other out and fail or hang
+        profile = Path(tmp, "profile").as_uri()
+
+        with scheduled("soffice"), stage("soffice"):
+            _run_soffice(
+                [
+                    soffice_bin,
+                    f"-env:UserInstallation={profile}",
+                    "--headless",
+                    "--convert-to",
+                    "pdf",
+                    "--outdir",
+                    tmp,
+                    docx_path,
+                ]
+            )
 
         with open(pdf_path, "rb") as f:
             return f.read()
@@ -0,0 +1,34 @@
+from typing import Any, Dict, Optional, Tuple
+
+from ..pdf import build_resume_pdf_bytes
+from ..resume_docx import build_resume_docx_bytes
+from ..resume_template_docx import render_resume_template_docx_bytes
+from ..timings import stage
+from .pdf_service import docx_bytes_to_pdf_bytes
+
+
+def render_resume_files(
+    resume: Dict[str, Any],
+    template_bytes: Optional[bytes] = None,
+    want_pdf: bool = True,
+    want_docx: bool = True,
+) -> Tuple[Optional[bytes], Optional[bytes]]:
+    """Render resume JSON to DOCX and/or PDF with the user's template or the built-in layout.
+
+    Only the requested formats are built, except that a template PDF needs the
+    filled DOCX first (it is returned as well). Module-level and DB-free so it
+    can run in a process pool.
+    """
+    if template_bytes:
+        with stage("render_docx"):
+            docx_bytes = render_resume_template_docx_bytes(template_bytes, resume)
+        pdf_bytes = docx_bytes_to_pdf_bytes(docx_bytes) if want_pdf else None  # "soffice"
+    else:
+        docx_bytes = pdf_bytes = None
+        if want_docx:
+            with stage("render_docx"):
+                docx_bytes = build_resume_docx_bytes(resume)
+        if want_pdf:
+            with stage("render_pdf"):
+                pdf_bytes = build_resume_pdf_bytes(resume)
+    return docx_bytes, pdf_bytes
@@ -0,0 +1,168 @@
+"""Size-bounded, streamed validation of multipart resume uploads.
+
+UploadSizeLimitMiddleware counts multipart request bytes as they arrive and
+answers 413 once they pass UPLOAD_MAX_BYTES (plus framing), so an oversized
+body is never spooled in full, with or without a Content-Length.
+
+Starlette spools each uploaded file (in memory up to 1 MB, then on disk). We
+read that spool in chunks: the first chunk must carry the expected magic
+bytes, and the read stops with 413 as soon as the running size passes
+UPLOAD_MAX_BYTES. Nothing is joined into one bytes object. DOCX files must also
+have a sane zip central directory, which is read without inflating any member.
+The rewound file object is handed to storage as-is.
+"""
+from __future__ import annotations
+
+import os
+import zipfile
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Sum of uncompressed member sizes a DOCX may claim (zip bomb guard)
+UPLOAD_MAX_UNZIPPED_BYTES = int(os.getenv("UPLOAD_MAX_UNZIPPED_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_MAX_ZIP_ENTRIES = int(os.getenv("UPLOAD_MAX_ZIP_ENTRIES", "2000"))
+# Multipart framing on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+_CHUNK = 64 * 1024
+
+_MAGIC = {
+    "pdf": b"%PDF-",
+    "docx": b"PK\x03\x04",
+    "doc": b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",  # OLE2 compound file
+}
+_DOCX_REQUIRED = ("[Content_Types].xml", "word/document.xml")
+
+
+def _check_docx_zip(fh: BinaryIO) -> None:
+    try:
+        with zipfile.ZipFile(fh) as zf:
+            infos = zf.infolist()
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid DOCX: not a zip archive")
+    if len(infos) > UPLOAD_MAX_ZIP_ENTRIES:
+        raise HTTPException(status_code=400, detail="Invalid DOCX: too many entries")
+    names = {i.filename for i in infos}
+    if any(n not in names for n in _DOCX_REQUIRED):
+        raise HTTPException(status_code=400, detail="Invalid DOCX: missing word/document.xml")
+    if sum(i.file_size for i in infos) > UPLOAD_MAX_UNZIPPED_BYTES:
+        raise HTTPException(status_code=413, detail="DOCX expands beyond the allowed size")
+
+
+def check_head(chunk: bytes, kind: str) -> None:
+    """First bytes of an upload must carry the magic for `kind` (docx | pdf | doc)."""
+    if not chunk.startswith(_MAGIC[kind]):
+        raise HTTPException(status_code=400, detail=f"File content is not a valid .{kind}")
+
+
+def check_size(size: int, max_bytes: int | None = None) -> None:
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    if size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File is larger than {max_bytes // (1024 * 1024)} MB",
+        )
+
+
+def _check_complete(fh: BinaryIO, kind: str, size: int, min_bytes: int) -> BinaryIO:
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    if size < min_bytes:
+        raise HTTPException(status_code=400, detail=f"Invalid {kind.upper()}")
+    if kind == "docx":
+        fh.seek(0)
+        _check_docx_zip(fh)
+    fh.seek(0)
+    return fh
+
+
+async def receive_upload(
+    file: UploadFile,
+    kind: str,
+    *,
+    min_bytes: int = 1,
+    max_bytes: int | None = None,
+) -> BinaryIO:
+    """Validate `file` as `kind` (docx | pdf | doc) and return its rewound file object."""
+    await file.seek(0)
+    size = 0
+    while True:
+        chunk = await file.read(_CHUNK)
+        if not chunk:
+            break
+        if size == 0:
+            check_head(chunk, kind)
+        size += len(chunk)
+        check_size(size, max_bytes)
+    return _check_complete(file.file, kind, size, min_bytes)
+
+
+def validate_file(
+    fh: BinaryIO,
+    kind: str,
+    *,
+    min_bytes: int = 1,
+    max_bytes: int | None = None,
+) -> BinaryIO:
+    """Synchronous `receive_upload` for a file already on hand (e.g. fetched back from storage)."""
+    fh.seek(0)
+    size = 0
+    for chunk in iter(lambda: fh.read(_CHUNK), b""):
+        if size == 0:
+            check_head(chunk, kind)
+        size += len(chunk)
+        check_size(size, max_bytes)
+    return _check_complete(fh, kind, size, min_bytes)
+
+
+def upload_too_large(content_type: str | None, content_length: str | None) -> bool:
+    """True when a multipart request declares a body no accepted upload can fit in."""
+    if not (content_type or "").startswith("multipart/form-data"):
+        return False
+    try:
+        return int(content_length or 0) > UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+    except ValueError:
+        return False
+
+
+class UploadSizeLimitMiddleware:
+    """Pure ASGI middleware: 413 for multipart bodies past the upload limit.
+
+    A declared Content-Length is checked before anything is read. Otherwise
+    (chunked bodies) the received bytes are counted, and the multipart parser
+    gets a 413 HTTPException from `receive` as soon as the count is too high.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        if not content_type.startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+        if upload_too_large(content_type, headers.get(b"content-length", b"").decode("latin-1")):
+            response = JSONResponse(status_code=413, content={"detail": "Upload is too large"})
+            await response(scope, receive, send)
+            return
+
+        limit = UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+        received = 0
+
+        async def counted_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="Upload is too large")
+            return message
+
+        await self.app(scope, counted_receive, send)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .ai import generate_resume_from_scratch
+from .auth import Principal
+from .db import SessionLocal, release_connection
+from .idempotency import canonical_url
+from .jobs import enqueue_job, register_job_handler
+from .models import GenerationJob
+
+# Speculative resume pre-generation.
+#
+# With SPECULATIVE_GENERATION=1, a client that passes `speculate` when a
+# posting is opened (/v1/jd/keys, /v1/applications/exists) gets a low-priority
+# job queued. It extracts the JD keys and runs the resume model for that user,
+# URL and JD text. apply-and-generate for the same posting takes the stored
+# result instead of calling the model. If the job is still running, it waits
+# up to SPECULATIVE_JOIN_SECONDS. A queued job that loses the race is cancelled.
+# Results are only used within SPECULATIVE_TTL_SECONDS; older job rows are
+# deleted.
+#
+# Jobs need a worker (worker.py or GENERATION_WORKER_INLINE=1).
+
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "0") == "1"
+SPECULATIVE_TTL_SECONDS = int(os.getenv("SPECULATIVE_TTL_SECONDS", "3600"))
+SPECULATIVE_JOIN_SECONDS = float(os.getenv("SPECULATIVE_JOIN_SECONDS", "20"))
+
+SPECULATIVE_JOB_KIND = "speculative_resume"
+SPECULATIVE_JOB_PRIORITY = -10
+_MIN_JD_CHARS = 20  # GenerateResumeFromScratchIn.jd_text
+
+
+def _jd_hash(jd_text: str) -> str:
+    return hashlib.sha256(" ".join((jd_text or "").split()).lower().encode("utf-8")).hexdigest()
+
+
+def speculation_key(user_id: str, url: str, jd_text: str) -> str:
+    raw = "\n".join([user_id, canonical_url(url), _jd_hash(jd_text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _same(a: Optional[str], b: Optional[str]) -> bool:
+    return (a or "").strip().lower() == (b or "").strip().lower()
+
+
+def _expire(db: Session, now: dt.datetime) -> None:
+    db.query(GenerationJob).filter(
+        GenerationJob.kind == SPECULATIVE_JOB_KIND,
+        GenerationJob.status != "running",
+        GenerationJob.created_at < now - dt.timedelta(seconds=SPECULATIVE_TTL_SECONDS),
+    ).delete(synchronize_session=False)
+
+
+def queue_speculation(
+    db: Session,
+    principal: Principal,
+    *,
+    user_id: str,
+    url: Optional[str],
+    jd_text: str,
+    company: Optional[str],
+    position: Optional[str],
+) -> Optional[str]:
+    """Queue pre-generation for a viewed posting (commits); returns the job id or None."""
+    if not SPECULATIVE_GENERATION or not url or len((jd_text or "").strip()) < _MIN_JD_CHARS:
+        return None
+    now = dt.datetime.now()
+    key = speculation_key(user_id, url, jd_text)
+    _expire(db, now)
+    existing = (
+        db.query(GenerationJob)
+        .filter(
+            GenerationJob.kind == SPECULATIVE_JOB_KIND,
+            GenerationJob.dedupe_key == key,
+            GenerationJob.status.in_(("queued", "running", "succeeded")),
+        )
+        .order_by(GenerationJob.created_at.desc())
+        .first()
+    )
+    if existing:
+        db.commit()
+        return existing.id
+    job, _ = enqueue_job(
+        db,
+        kind=SPECULATIVE_JOB_KIND,
+        user_id=user_id,
+        principal=principal,
+        payload={
+            "user_id": user_id,
+            "url": url,
+            "jd_text": jd_text,
+            "company": company or "",
+            "position": position or "",
+        },
+        dedupe_key=key,
+        priority=SPECULATIVE_JOB_PRIORITY,
+    )
+    db.commit()
+    print("speculation: queued", job.id, "for", user_id, canonical_url(url))
+    return job.id
+
+
+def take_speculative_resume(
+    *,
+    user_id: str,
+    url: str,
+    jd_text: str,
+    company: str,
+    position: str,
+) -> Optional[Dict[str, Any]]:
+    """Pre-generated resume JSON for this posting, or None to generate it now.
+
+    Uses its own session: cancelling the speculative job must not commit the
+    caller's transaction (a queued apply job's is held until it finishes).
+    """
+    if not SPECULATIVE_GENERATION:
+        return None
+    db = SessionLocal()
+    try:
+        return _take_speculative_resume(
+            db,
+            key=speculation_key(user_id, url, jd_text),
+            company=company,
+            position=position,
+        )
+    finally:
+        db.close()
+
+
+def _take_speculative_resume(
+    db: Session, *, key: str, company: str, position: str
+) -> Optional[Dict[str, Any]]:
+    deadline = time.monotonic() + SPECULATIVE_JOIN_SECONDS
+    while True:
+        db.expire_all()
+        job = (
+            db.query(GenerationJob)
+            .filter(
+                GenerationJob.kind == SPECULATIVE_JOB_KIND,
+                GenerationJob.dedupe_key == key,
+                GenerationJob.created_at
+                >= dt.datetime.now() - dt.timedelta(seconds=SPECULATIVE_TTL_SECONDS),
+            )
+            .order_by(GenerationJob.created_at.desc())
+            .first()
+        )
+        if job is None or job.status == "failed":
+            return None
+        if job.status == "queued":
+            # Not started yet: the caller does the work, so drop the duplicate
+            db.query(GenerationJob).filter(
+                GenerationJob.id == job.id, GenerationJob.status == "queued"
+            ).update(
+                {
+                    GenerationJob.status: "failed",
+                    GenerationJob.error: "Superseded by apply-and-generate",
+                    GenerationJob.finished_at: dt.datetime.now(),
+                    GenerationJob.updated_at: dt.datetime.now(),
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+            return None
+        if job.status == "succeeded":
+            result = json.loads(job.result_json or "{}")
+            if not (_same(result.get("company"), company) and _same(result.get("position"), position)):
+                return None
+            print("speculation: hit", job.id)
+            return result.get("resume_json")
+        # running
+        if time.monotonic() >= deadline:
+            return None
+        db.commit()  # ends the read; nothing else is pending on this session
+        time.sleep(0.5)
+
+
+def _run_speculative_job(db: Session, job: GenerationJob) -> Dict[str, Any]:
+    # Imported here: the jd router imports this module
+    from .routers.jd import JDKeysIn, get_or_create_jd_keys
+
+    p = json.loads(job.payload_json or "{}")
+    principal = Principal(type=job.principal_type, id=job.principal_id)
+    keys = get_or_create_jd_keys(
+        JDKeysIn(user_id=p["user_id"], url=p.get("url"), jd_text=p["jd_text"]), db, principal
+    )
+    release_connection(db)
+    generated = generate_resume_from_scratch(
+        jd_text=p["jd_text"],
+        company=p.get("company") or "",
+        position=p.get("position") or "",
+        include_cover_letter=True,  # usable whether or not the apply wants one
+    )
+    return {
+        "jd_key_id": keys.get("id"),
+        "company": p.get("company") or "",
+        "position": p.get("position") or "",
+        "resume_json": generated,
+    }
+
+
+register_job_handler(SPECULATIVE_JOB_KIND, _run_speculative_job, lane="background")
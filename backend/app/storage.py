@@ -1,8 +1,71 @@
 # backend/app/storage.py
+import abc
+import datetime as dt
+import hashlib
+import hmac
+import logging
 import os
+import random
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: in-process locking only
+    fcntl = None
+
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
+import requests
+from cloudinary.exceptions import (
+    AlreadyExists,
+    AuthorizationRequired,
+    BadRequest,
+    NotAllowed,
+    NotFound,
+)
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from .db import DATA_DIR, SessionLocal
+from .deadlines import Deadline, DeadlineExceeded, check_deadline, current_deadline
+from .models import BlobRef
+from .timings import current_timer
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary").lower().strip()
+LOCAL_STORAGE_DIR = Path(os.getenv("LOCAL_STORAGE_DIR", str(DATA_DIR / "blobs")))
+LOCAL_SCHEME = "local://"
+# Placeholder path for a file rendered on first download, e.g. pending://docx
+PENDING_SCHEME = "pending://"
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_RETRIES = int(os.getenv("STORAGE_UPLOAD_RETRIES", "3"))
+UPLOAD_BACKOFF_SECONDS = float(os.getenv("STORAGE_UPLOAD_BACKOFF_SECONDS", "0.5"))
+UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))
+
+# Signs the local stand-in for direct uploads; set it when running several API processes
+UPLOAD_SIGNING_SECRET = (os.getenv("UPLOAD_SIGNING_SECRET") or os.urandom(32).hex()).encode()
+
+# Errors that will not go away on retry
+_PERMANENT_UPLOAD_ERRORS = (
+    AlreadyExists,
+    AuthorizationRequired,
+    BadRequest,
+    NotAllowed,
+    NotFound,
+)
 
 
 def safe_filename(s: str) -> str:
@@ -12,29 +75,584 @@ def safe_filename(s: str) -> str:
     return s[:80] or "file"
 
 
-# Cloudinary config via env vars
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True,
-)
-
+class StorageBackend(abc.ABC):
+    """Where file bytes live. `StoredFile.path` holds whatever `save` returns.
 
-def save_bytes(user_info: str, application_id: str, filename: str, data: bytes) -> str:
+    Backends that set `supports_direct_upload` implement `sign_upload` and
+    `confirm_upload`, so clients can upload to them without the API in between.
     """
-    Upload file bytes to Cloudinary.
-    Returns a secure URL that we store in DB.
+
+    name = "base"
+    supports_direct_upload = False
+
+    @abc.abstractmethod
+    def save(self, user_info: str, application_id: str, filename: str, data: bytes) -> str:
+        ...
+
+    def save_file(
+        self, user_info: str, application_id: str, filename: str, fh: BinaryIO
+    ) -> str:
+        """Like `save`, but reads from a (seekable) file object."""
+        fh.seek(0)
+        return self.save(user_info, application_id, filename, fh.read())
+
+    @abc.abstractmethod
+    def read(self, path: str) -> bytes:
+        ...
+
+    def sign_upload(
+        self, upload_id: str, user_info: str, application_id: str, filename: str, expires_at: dt.datetime
+    ) -> Dict[str, Any]:
+        """Parameters for a client to upload straight to this backend.
+
+        Returns {"method", "url", "fields", "object_key"}; `fields` go into the
+        multipart form (or query) next to the file.
+        """
+        raise NotImplementedError
+
+    def confirm_upload(self, session, result: Dict[str, Any]) -> str:
+        """Check a finished direct upload for `session`; returns the `StoredFile.path`."""
+        raise NotImplementedError
+
+    def release(self, path: str) -> None:
+        """Drop one reference to `path` (no-op where the backend overwrites in place)."""
+
+
+class CloudinaryBackend(StorageBackend):
+    name = "cloudinary"
+    supports_direct_upload = True
+
+    def __init__(self) -> None:
+        self._configured = False
+
+    def _configure(self) -> None:
+        if self._configured:
+            return
+        # Cloudinary config via env vars
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+            secure=True,
+        )
+        self._configured = True
+
+    def save(self, user_info: str, application_id: str, filename: str, data: bytes) -> str:
+        """
+        Upload file bytes to Cloudinary.
+        Returns a secure URL that we store in DB.
+        """
+        self._configure()
+        filename = safe_filename(filename)
+
+        # `data` may also be a file object; the SDK streams those
+        result = cloudinary.uploader.upload(
+            data,
+            resource_type="raw",  # IMPORTANT for pdf/docx/etc
+            type="upload",
+            folder=f"career-os/{application_id}",
+            # user_info carries the user's name: keep the public id URL-safe
+            public_id=f"{safe_filename(user_info)}/{application_id}/{filename}",
+            overwrite=True,
+        )
+
+        return result["secure_url"]
+
+    def save_file(
+        self, user_info: str, application_id: str, filename: str, fh: BinaryIO
+    ) -> str:
+        fh.seek(0)
+        return self.save(user_info, application_id, filename, fh)
+
+    def read(self, path: str) -> bytes:
+        resp = requests.get(path, timeout=30)
+        resp.raise_for_status()
+        return resp.content
+
+    def sign_upload(
+        self, upload_id: str, user_info: str, application_id: str, filename: str, expires_at: dt.datetime
+    ) -> Dict[str, Any]:
+        self._configure()
+        cfg = cloudinary.config()
+        # Same placement as `save`, so direct and proxied uploads look alike
+        params = {
+            "folder": f"career-os/{application_id}",
+            "public_id": f"{safe_filename(user_info)}/{application_id}/{safe_filename(filename)}",
+            "overwrite": "true",
+            "timestamp": str(int(time.time())),
+        }
+        fields = {
+            **params,
+            "signature": cloudinary.utils.api_sign_request(params, cfg.api_secret),
+            "api_key": cfg.api_key,
+        }
+        return {
+            "method": "POST",
+            "url": f"https://api.cloudinary.com/v1_1/{cfg.cloud_name}/raw/upload",
+            "fields": fields,
+            "object_key": params["public_id"],
+        }
+
+    def confirm_upload(self, session, result: Dict[str, Any]) -> str:
+        # The client relays Cloudinary's upload response; its signature proves
+        # the asset exists and was not made up by the client.
+        self._configure()
+        public_id = str(result.get("public_id") or "")
+        version = result.get("version")
+        signature = result.get("signature")
+        key = session.object_key or ""
+        if not (public_id == key or public_id.endswith("/" + key)):
+            raise ValueError("Uploaded asset does not match the signed upload")
+        if not (version and signature) or not cloudinary.utils.verify_api_response_signature(
+            public_id, version, signature
+        ):
+            raise ValueError("Invalid upload signature")
+        url, _ = cloudinary.utils.cloudinary_url(
+            public_id, resource_type="raw", type="upload", version=version, secure=True
+        )
+        return url
+
+    @staticmethod
+    def public_id_of(url: str) -> Optional[str]:
+        """Public id inside a delivery URL (".../raw/upload/v123/<public_id>").
+
+        The URL path is percent-encoded (older uploads have spaces and non-ASCII
+        names in their ids), so it is decoded to compare with the Admin API's ids.
+        """
+        m = re.search(r"/raw/upload/(?:v\d+/)?([^?#]+)", url or "")
+        return unquote(m.group(1)) if m else None
+
+    def iter_assets(self, prefix: str) -> Iterator[Dict[str, Any]]:
+        """Raw uploads under `prefix` (Admin API, paged)."""
+        self._configure()
+        cursor = None
+        while True:
+            page = cloudinary.api.resources(
+                type="upload",
+                resource_type="raw",
+                prefix=prefix,
+                max_results=500,
+                next_cursor=cursor,
+            )
+            yield from page.get("resources", [])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+    def delete_asset(self, public_id: str) -> None:
+        self._configure()
+        cloudinary.uploader.destroy(public_id, resource_type="raw", type="upload", invalidate=True)
+
+
+class LocalBlobBackend(StorageBackend):
+    """Content-addressed store on local disk: `<root>/<aa>/<sha256>`.
+
+    Identical bytes are written once; `blob_refs` counts how many saves point at
+    each blob and the file is removed when the count drops to zero.
     """
-    filename = safe_filename(filename)
-
-    result = cloudinary.uploader.upload(
-        data,
-        resource_type="raw",  # IMPORTANT for pdf/docx/etc
-        type="upload",
-        folder=f"career-os/{application_id}",
-        public_id=f"{user_info}/{application_id}/{filename}",
-        overwrite=True,
+
+    name = "local"
+    supports_direct_upload = True
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> Path:
+        if not re.fullmatch(r"[0-9a-f]{64}", digest or ""):
+            raise ValueError("Invalid blob id")
+        return self.root / digest[:2] / digest
+
+    @staticmethod
+    def digest_of(path: str) -> str:
+        return path[len(LOCAL_SCHEME):] if path.startswith(LOCAL_SCHEME) else path
+
+    @contextmanager
+    def _locked(self):
+        # Serialises refcount changes with file creation/removal, across threads
+        # and (where fcntl exists) across worker processes.
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.root / ".lock", "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _write_atomic(self, target: Path, data: bytes) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _add_ref(self, digest: str, size: int, delta: int) -> int:
+        db = SessionLocal()
+        try:
+            now = dt.datetime.now()
+            n = (
+                db.query(BlobRef)
+                .filter(BlobRef.sha256 == digest)
+                .update(
+                    {BlobRef.refcount: BlobRef.refcount + delta, BlobRef.updated_at: now},
+                    synchronize_session=False,
+                )
+            )
+            if not n:
+                db.add(
+                    BlobRef(
+                        sha256=digest,
+                        size=size,
+                        refcount=max(delta, 0),
+                        created_at=now,
+                        updated_at=now,
+                    )
+                )
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return self._add_ref(digest, size, delta)
+            row = db.get(BlobRef, digest)
+            return row.refcount if row else 0
+        finally:
+            db.close()
+
+    def save(self, user_info: str, application_id: str, filename: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.blob_path(digest)
+        with self._locked():
+            if not target.exists():
+                self._write_atomic(target, data)
+            else:
+                logger.debug("local storage: dedupe hit %s %s", digest[:12], filename)
+            self._add_ref(digest, len(data), +1)
+        return LOCAL_SCHEME + digest
+
+    def save_file(
+        self, user_info: str, application_id: str, filename: str, fh: BinaryIO
+    ) -> str:
+        # Hash while copying to a temp file so the upload is never held in memory
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            h = hashlib.sha256()
+            size = 0
+            fh.seek(0)
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: fh.read(64 * 1024), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            digest = h.hexdigest()
+            target = self.blob_path(digest)
+            with self._locked():
+                if not target.exists():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp, target)
+                else:
+                    logger.debug("local storage: dedupe hit %s %s", digest[:12], filename)
+                self._add_ref(digest, size, +1)
+        finally:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+        return LOCAL_SCHEME + digest
+
+    def read(self, path: str) -> bytes:
+        return self.blob_path(self.digest_of(path)).read_bytes()
+
+    def sign_upload(
+        self, upload_id: str, user_info: str, application_id: str, filename: str, expires_at: dt.datetime
+    ) -> Dict[str, Any]:
+        # Stand-in for a real object store: the "signed URL" is our own PUT endpoint
+        expires = str(int(expires_at.timestamp()))
+        return {
+            "method": "PUT",
+            "url": f"/v1/uploads/{upload_id}/content",
+            "fields": {"expires": expires, "token": local_upload_token(upload_id, expires)},
+            "object_key": None,
+        }
+
+    def confirm_upload(self, session, result: Dict[str, Any]) -> str:
+        if not session.path:
+            raise ValueError("Nothing was uploaded for this upload id")
+        return session.path
+
+    def release(self, path: str) -> None:
+        digest = self.digest_of(path)
+        with self._locked():
+            remaining = self._add_ref(digest, 0, -1)
+            if remaining > 0:
+                return
+            db = SessionLocal()
+            try:
+                db.query(BlobRef).filter(
+                    BlobRef.sha256 == digest, BlobRef.refcount <= 0
+                ).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+            try:
+                self.blob_path(digest).unlink()
+            except FileNotFoundError:
+                pass
+
+    def iter_blobs(self) -> Iterator[Tuple[str, int, float]]:
+        """(digest, size, mtime) of every blob on disk."""
+        if not self.root.is_dir():
+            return
+        for sub in self.root.iterdir():
+            if not (sub.is_dir() and len(sub.name) == 2):
+                continue
+            for f in sub.iterdir():
+                if re.fullmatch(r"[0-9a-f]{64}", f.name):
+                    st = f.stat()
+                    yield f.name, st.st_size, st.st_mtime
+
+    def iter_temp_files(self) -> Iterator[Path]:
+        """Leftovers of interrupted writes."""
+        if not self.root.is_dir():
+            return
+        yield from self.root.glob(".tmp-*")
+        yield from self.root.glob("??/.tmp-*")
+
+    def reconcile(
+        self, digest: str, expected: int, cutoff: dt.datetime, dry_run: bool = False
+    ) -> Tuple[str, int]:
+        """Bring one blob in line with the `expected` number of rows pointing at it.
+
+        Returns (action, bytes freed); action is "ok", "fixed" (refcount
+        corrected), "deleted", "missing" (referenced but not on disk) or
+        "recent" (touched after `cutoff`, so a save may still be in flight).
+        """
+        target = self.blob_path(digest)
+        with self._locked():
+            db = SessionLocal()
+            try:
+                row = db.get(BlobRef, digest)
+                exists = target.exists()
+                if row is not None and row.updated_at >= cutoff:
+                    return "recent", 0
+                if exists and dt.datetime.fromtimestamp(target.stat().st_mtime) >= cutoff:
+                    return "recent", 0
+                if expected > 0:
+                    if not exists:
+                        return "missing", 0
+                    if row is not None and row.refcount == expected:
+                        return "ok", 0
+                    if not dry_run:
+                        now = dt.datetime.now()
+                        if row is None:
+                            db.add(
+                                BlobRef(
+                                    sha256=digest,
+                                    size=target.stat().st_size,
+                                    refcount=expected,
+                                    created_at=now,
+                                    updated_at=now,
+                                )
+                            )
+                        else:
+                            row.refcount, row.updated_at = expected, now
+                        db.commit()
+                    return "fixed", 0
+
+                size = target.stat().st_size if exists else 0
+                if not dry_run:
+                    if row is not None:
+                        db.delete(row)
+                        db.commit()
+                    try:
+                        target.unlink()
+                    except FileNotFoundError:
+                        pass
+                return "deleted", size
+            finally:
+                db.close()
+
+
+_BACKENDS = {
+    "cloudinary": CloudinaryBackend(),
+    "local": LocalBlobBackend(LOCAL_STORAGE_DIR),
+}
+if STORAGE_BACKEND not in _BACKENDS:
+    raise RuntimeError("STORAGE_BACKEND must be one of: cloudinary, local")
+
+
+def get_backend(path: Optional[str] = None) -> StorageBackend:
+    """The backend that owns `path`, or the configured one for new writes."""
+    if path is not None:
+        return _BACKENDS["local"] if is_local_path(path) else _BACKENDS["cloudinary"]
+    return _BACKENDS[STORAGE_BACKEND]
+
+
+def backend_named(name: str) -> StorageBackend:
+    return _BACKENDS[name]
+
+
+def is_local_path(path: Optional[str]) -> bool:
+    return bool(path) and path.startswith(LOCAL_SCHEME)
+
+
+def is_pending_path(path: Optional[str]) -> bool:
+    return bool(path) and path.startswith(PENDING_SCHEME)
+
+
+def pending_path(source: str) -> str:
+    return PENDING_SCHEME + source
+
+
+def local_blob_path(path: str) -> Path:
+    return _BACKENDS["local"].blob_path(LocalBlobBackend.digest_of(path))
+
+
+def local_upload_token(upload_id: str, expires: str) -> str:
+    return hmac.new(
+        UPLOAD_SIGNING_SECRET, f"{upload_id}:{expires}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def verify_local_upload_token(upload_id: str, expires: str, token: str) -> bool:
+    try:
+        if int(expires) < time.time():
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(local_upload_token(upload_id, expires), token or "")
+
+
+def save_bytes(user_info: str, application_id: str, filename: str, data: bytes) -> str:
+    """Store file bytes with the configured backend; returns the value for `StoredFile.path`."""
+    check_deadline("upload")
+    return get_backend().save(user_info, application_id, filename, data)
+
+
+def save_file(user_info: str, application_id: str, filename: str, fh: BinaryIO) -> str:
+    """`save_bytes` for an open file (e.g. a spooled upload); the caller keeps ownership of `fh`."""
+    return get_backend().save_file(user_info, application_id, filename, fh)
+
+
+def read_bytes(path: str) -> bytes:
+    return get_backend(path).read(path)
+
+
+def download_url(sf) -> str:
+    """URL a client can fetch a StoredFile from (local blobs go through /v1/files)."""
+    if is_local_path(sf.path) or is_pending_path(sf.path):
+        return f"/v1/files/{sf.id}/download"
+    return sf.path
+
+
+def release_after_commit(db, paths: Iterable[str]) -> None:
+    """Drop blob references once `db` commits (rows replaced in this transaction)."""
+    db.info.setdefault("release_blob_paths", []).extend(
+        p for p in paths if p and not is_pending_path(p)
     )
 
-    return result["secure_url"]
+
+@event.listens_for(SessionLocal, "after_commit")
+def _release_blobs_after_commit(session) -> None:
+    paths = session.info.pop("release_blob_paths", None) or []
+    for path in paths:
+        try:
+            get_backend(path).release(path)
+        except Exception as e:
+            logger.warning("storage: release failed: %s: %s", path, e)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _forget_blobs_after_rollback(session, previous_transaction) -> None:
+    session.info.pop("release_blob_paths", None)
+
+
+@dataclass
+class Upload:
+    user_info: str
+    application_id: str
+    filename: str
+    data: bytes
+
+
+@dataclass
+class UploadResult:
+    url: str
+    filename: str
+    seconds: float
+    attempts: int
+
+
+def _save_with_retry(upload: Upload, deadline: Optional[Deadline] = None) -> UploadResult:
+    t0 = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        if deadline is not None:
+            deadline.check("upload")
+        try:
+            url = save_bytes(
+                upload.user_info, upload.application_id, upload.filename, upload.data
+            )
+            return UploadResult(
+                url=url,
+                filename=upload.filename,
+                seconds=time.perf_counter() - t0,
+                attempts=attempt,
+            )
+        except (DeadlineExceeded, *_PERMANENT_UPLOAD_ERRORS):
+            raise
+        except Exception as e:
+            if attempt > UPLOAD_RETRIES:
+                raise
+            delay = UPLOAD_BACKOFF_SECONDS * (2 ** (attempt - 1)) * (1 + random.random() / 4)
+            logger.warning(
+                "upload retry %d/%d for %s in %.2fs: %s",
+                attempt,
+                UPLOAD_RETRIES,
+                upload.filename,
+                delay,
+                e,
+            )
+            time.sleep(delay)
+
+
+def save_many(uploads: List[Upload]) -> List[UploadResult]:
+    """Upload several files concurrently, retrying transient failures with backoff.
+
+    Results come back in input order. Raises if any upload still fails, so
+    callers should only write StoredFile rows after this returns. Each upload
+    is recorded as an `upload_<ext>` stage, with its attempts, on the current
+    pipeline timer.
+    """
+    if not uploads:
+        return []
+    # Pool threads do not inherit the request context, so pass the deadline along
+    deadline = current_deadline()
+    if len(uploads) == 1:
+        results = [_save_with_retry(uploads[0], deadline)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(uploads), UPLOAD_CONCURRENCY)) as pool:
+            results = list(pool.map(lambda u: _save_with_retry(u, deadline), uploads))
+    timer = current_timer()
+    if timer is not None:
+        for r in results:
+            name = f"upload_{Path(r.filename).suffix.lstrip('.').lower() or 'file'}"
+            timer.add(name, r.seconds * 1000)
+            timer.count(f"{name}_attempts", r.attempts)
+    return results
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import contextvars
+import datetime as dt
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .deadlines import DeadlineExceeded
+from .models import StageTiming
+
+# Named stage timers for the generation pipelines.
+#
+# An endpoint opens `track_pipeline("apply_and_generate")`; anything it calls
+# (routers, render_service, storage) wraps slow steps in `stage("name")`, which
+# is a no-op when no pipeline is being tracked (e.g. inside pool processes).
+# The same stage entered twice in one run is summed. Finished runs are written
+# to stage_timings for the p50/p95 report. Counters (e.g. upload attempts) are
+# only reported with the run's breakdown, not stored.
+
+TIMINGS_HEADER = "X-Include-Timings"
+# The p50/p95 report reads at most this many of the newest stage rows
+STAGE_TIMINGS_MAX_ROWS = int(os.getenv("STAGE_TIMINGS_MAX_ROWS", "50000"))
+
+_current: contextvars.ContextVar[Optional["PipelineTimer"]] = contextvars.ContextVar(
+    "pipeline_timer", default=None
+)
+
+
+class PipelineTimer:
+    def __init__(self, pipeline: str) -> None:
+        self.pipeline = pipeline
+        self.run_id = uuid.uuid4().hex
+        self.stages: Dict[str, float] = {}  # stage -> ms, in first-entered order
+        self.counters: Dict[str, int] = {}
+        self.status = "ok"  # ok|blocked|error
+        self.record = True  # False for runs that did no work (e.g. replays)
+        self._t0 = time.perf_counter()
+        self.total_ms: Optional[float] = None
+        self._lock = threading.Lock()  # stages can run in fan-out threads
+
+    def add(self, name: str, ms: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self) -> None:
+        self.total_ms = (time.perf_counter() - self._t0) * 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        total = self.total_ms
+        if total is None:
+            total = (time.perf_counter() - self._t0) * 1000
+        out = {
+            "pipeline": self.pipeline,
+            "total_ms": round(total, 1),
+            "stages": {k: round(v, 1) for k, v in self.stages.items()},
+        }
+        if self.counters:
+            out["counters"] = dict(self.counters)
+        return out
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing header (used when the body is a file)."""
+        parts = [f"{k};dur={v:.1f}" for k, v in self.stages.items()]
+        parts.append(f"total;dur={self.as_dict()['total_ms']:.1f}")
+        return ", ".join(parts)
+
+
+def wants_timings(header_value: Optional[str]) -> bool:
+    return (header_value or "").strip().lower() in ("1", "true", "yes")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, (time.perf_counter() - t0) * 1000)
+
+
+def current_timer() -> Optional[PipelineTimer]:
+    return _current.get()
+
+
+@contextmanager
+def track_pipeline(pipeline: str, user_id: Optional[str] = None) -> Iterator[PipelineTimer]:
+    """Time one pipeline run and persist its stages when it ends.
+
+    Nested calls (e.g. the ingest flow calling the shared generation core)
+    reuse the outer timer, so each request is recorded once.
+    """
+    outer = _current.get()
+    if outer is not None:
+        yield outer
+        return
+    timer = PipelineTimer(pipeline)
+    token = _current.set(timer)
+    try:
+        yield timer
+    except BaseException as e:
+        timer.status = "cancelled" if isinstance(e, DeadlineExceeded) else "error"
+        raise
+    finally:
+        _current.reset(token)
+        timer.finish()
+        _persist(timer, user_id)
+
+
+def _persist(timer: PipelineTimer, user_id: Optional[str]) -> None:
+    if not timer.record:
+        return
+    db = SessionLocal()
+    try:
+        now = dt.datetime.now()
+        rows = [(name, ms) for name, ms in timer.stages.items()]
+        rows.append(("total", timer.total_ms or 0.0))
+        for name, ms in rows:
+            db.add(
+                StageTiming(
+                    run_id=timer.run_id,
+                    pipeline=timer.pipeline,
+                    stage=name,
+                    ms=ms,
+                    status=timer.status,
+                    user_id=user_id,
+                    created_at=now,
+                )
+            )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print("timings: failed to persist", timer.pipeline, e)
+    finally:
+        db.close()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending, non-empty list."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def stage_percentiles(
+    db: Session,
+    *,
+    pipeline: Optional[str] = None,
+    since: Optional[dt.datetime] = None,
+    status: Optional[str] = "ok",
+    limit: Optional[int] = None,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """{pipeline: {stage: {count, p50_ms, p95_ms, max_ms}}} over the stored runs.
+
+    Only the newest `limit` rows (default STAGE_TIMINGS_MAX_ROWS) are read, so
+    the report stays bounded however many runs are stored.
+    """
+    q = db.query(StageTiming.pipeline, StageTiming.stage, StageTiming.ms)
+    if pipeline:
+        q = q.filter(StageTiming.pipeline == pipeline)
+    if since:
+        q = q.filter(StageTiming.created_at >= since)
+    if status:
+        q = q.filter(StageTiming.status == status)
+    q = q.order_by(StageTiming.created_at.desc()).limit(limit or STAGE_TIMINGS_MAX_ROWS)
+
+    grouped: Dict[str, Dict[str, List[float]]] = {}
+    for p, s, ms in q.all():
+        grouped.setdefault(p, {}).setdefault(s, []).append(float(ms))
+
+    out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for p, stages in grouped.items():
+        out[p] = {}
+        for s, values in stages.items():
+            values.sort()
+            out[p][s] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "max_ms": round(values[-1], 1),
+            }
+    return out
+
+
+def attach_timings(out: Any, timer: PipelineTimer, requested: Optional[str]) -> Any:
+    """Add the breakdown to a response when the client sent X-Include-Timings.
+
+    JSON bodies get a `timings` field; file responses a Server-Timing header.
+    """
+    if not wants_timings(requested):
+        return out
+    if isinstance(out, dict):
+        return {**out, "timings": timer.as_dict()}
+    out.headers["Server-Timing"] = timer.server_timing()
+    return out
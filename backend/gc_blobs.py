@@ -0,0 +1,36 @@
+"""Delete storage blobs no stored_files row points at (see app/blob_gc.py).
+
+    python gc_blobs.py                   # dry run: report what would be reclaimed
+    python gc_blobs.py --delete          # actually delete
+    python gc_blobs.py --delete --backend local --max-deletes 200 --rate 2
+    python gc_blobs.py --keep-superseded # leave older templates/base DOCX uploads alone
+"""
+from __future__ import annotations
+
+import argparse
+import json
+
+from app.blob_gc import collect_garbage
+from app.init_db import ensure_schema
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delete", action="store_true", help="delete instead of a dry run")
+    parser.add_argument("--backend", action="append", choices=["local", "cloudinary"])
+    parser.add_argument("--keep-superseded", action="store_true")
+    parser.add_argument("--min-age", type=int, help="seconds; newer blobs are skipped")
+    parser.add_argument("--max-deletes", type=int)
+    parser.add_argument("--rate", type=float, help="deletes per second")
+    args = parser.parse_args()
+
+    ensure_schema()
+    report = collect_garbage(
+        dry_run=not args.delete,
+        backends=args.backend,
+        prune_superseded=not args.keep_superseded,
+        min_age_seconds=args.min_age,
+        max_deletes=args.max_deletes,
+        deletes_per_second=args.rate,
+    )
+    print(json.dumps(report.as_dict(), indent=2))
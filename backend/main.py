@@ -1,9 +1,15 @@
 from __future__ import annotations
 
-from fastapi import FastAPI
+import os
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.deadlines import ClientDeadlineMiddleware
 from app.init_db import ensure_schema
+from app.jobs import start_worker_thread
+from app.scheduler import tenant_scope
+from app.services.upload_service import UploadSizeLimitMiddleware
 from app.routers import (
     auth_routes,
     users,
@@ -13,14 +19,33 @@ from app.routers import (
     assistant,
     jd,
     resume_builder,
+    resume_versions,
     outlook,
     email_updates,
     gate,
+    metrics,
+    uploads,
 )
 
 app = FastAPI(title="CareerOS API")
 
-# Dev CORS
+# Refuse oversized multipart bodies while they stream in, before they are spooled.
+# Added first so it sits next to the app: the 413 it raises from `receive` must
+# reach the body parser directly, not through another middleware's task group.
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
+@app.middleware("http")
+async def _scope_work_tenant(request: Request, call_next):
+    # get_principal fills this in, so scheduled work is attributed to the caller
+    with tenant_scope():
+        return await call_next(request)
+
+
+# Client deadline / disconnect tracking (see app/deadlines.py)
+app.add_middleware(ClientDeadlineMiddleware)
+
+# Dev CORS (added last so it also wraps the responses above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,6 +58,8 @@ app.add_middleware(
 @app.on_event("startup")
 def _startup():
     ensure_schema()
+    if os.getenv("GENERATION_WORKER_INLINE", "0") == "1":
+        start_worker_thread()
 
 
 # Routers
@@ -44,9 +71,12 @@ app.include_router(files.router)
 app.include_router(assistant.router)
 app.include_router(jd.router)
 app.include_router(resume_builder.router)
+app.include_router(resume_versions.router)
 app.include_router(outlook.router)
 app.include_router(email_updates.router)
 app.include_router(gate.router)
+app.include_router(metrics.router)
+app.include_router(uploads.router)
 
 
 @app.get("/healthz")
@@ -0,0 +1,157 @@
+import datetime as dt
+import json
+import os
+import tempfile
+import time
+import uuid
+
+# The app reads its configuration at import time, so set it up first
+_TMP = tempfile.mkdtemp(prefix="careeros-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = os.path.join(_TMP, "blobs")
+os.environ["FILE_CACHE_DIR"] = os.path.join(_TMP, "file_cache")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["SPECULATIVE_GENERATION"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.auth import mint_token
+from app.db import Base, SessionLocal, engine
+from app.migrations import migrate_sqlite
+from app.models import Admin, AdminUser, AuthCredential, User
+
+Base.metadata.create_all(bind=engine)
+migrate_sqlite(engine)
+
+GENERATED_RESUME = {
+    "blocked": False,
+    "block_reason": "",
+    "job_title": "Backend Engineer",
+    "summary": "Python <b>FastAPI</b> engineer",
+    "skills": [{"category": "Languages", "items": ["Python", "SQL"]}],
+    "experiences": [
+        {
+            "company": "Acme",
+            "location": "",
+            "job_title": "Backend Engineer",
+            "duration": "2022-2025",
+            "sentences": ["Built FastAPI services on PostgreSQL."],
+        }
+    ],
+    "education": [],
+}
+
+JD_TEXT = "We are hiring a backend engineer with Python, SQL and FastAPI experience."
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def seeded():
+    """A fresh admin managing two fresh users, with auth tokens for each."""
+    suffix = uuid.uuid4().hex[:8]
+    now = dt.datetime.now()
+    admin_id, user_id, other_id = f"a{suffix}", f"u{suffix}", f"v{suffix}"
+    session = SessionLocal()
+    try:
+        session.add(Admin(id=admin_id, name="Admin", created_at=now, updated_at=now))
+        for uid, name in ((user_id, "Jane Doe"), (other_id, "José Núñez")):
+            first, last = name.split(" ")
+            session.add(
+                User(
+                    id=uid,
+                    name=name,
+                    first_name=first,
+                    last_name=last,
+                    created_at=now,
+                    updated_at=now,
+                )
+            )
+            session.add(AdminUser(admin_id=admin_id, user_id=uid, created_at=now))
+        session.add(
+            AuthCredential(
+                email=f"{user_id}@example.com",
+                password_hash="x",
+                principal_type="user",
+                principal_id=user_id,
+                principal_name="Jane",
+                created_at=now,
+            )
+        )
+        tokens = {
+            "user": mint_token(session, "user", user_id, "Jane"),
+            "admin": mint_token(session, "admin", admin_id, "Admin"),
+        }
+        session.commit()
+    finally:
+        session.close()
+    return {
+        "admin_id": admin_id,
+        "user_id": user_id,
+        "other_user_id": other_id,
+        "user_headers": {"X-Auth-Token": tokens["user"]},
+        "admin_headers": {"X-Auth-Token": tokens["admin"]},
+    }
+
+
+@pytest.fixture
+def client():
+    # No lifespan: the schema is created above and no inline worker is wanted
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Stub the model calls and the renderer.
+
+    `calls` counts resume generations; `delay` makes the model and the renderer
+    each take that many seconds, like the real ones do.
+    """
+    import app.routers.jd as jd
+    import app.routers.resume_builder as resume_builder
+
+    state = {"calls": 0, "delay": 0.0}
+
+    def generate(**kwargs):
+        state["calls"] += 1
+        time.sleep(state["delay"])
+        out = json.loads(json.dumps(GENERATED_RESUME))
+        if kwargs.get("include_cover_letter"):
+            out["cover_letter"] = "Dear team,\n\n[Your Name]"
+        return out
+
+    def render(resume, template_bytes=None, want_pdf=True, want_docx=True):
+        time.sleep(state["delay"])
+        return (
+            b"docx:" + resume["job_title"].encode() if want_docx else None,
+            b"%PDF-1.4 " + resume["job_title"].encode() if want_pdf else None,
+        )
+
+    monkeypatch.setattr(resume_builder, "generate_resume_from_scratch", generate)
+    monkeypatch.setattr(resume_builder, "render_resume_files", render)
+    monkeypatch.setattr(jd, "_extract_keys", lambda text: {"core_hard": ["python"]})
+    return state
+
+
+def apply_payload(user_id: str, **overrides):
+    body = {
+        "user_id": user_id,
+        "url": f"https://jobs.example.com/{uuid.uuid4().hex}",
+        "company": "Acme",
+        "position": "Backend Engineer",
+        "jd_text": JD_TEXT,
+        "include_cover_letter": False,
+        "pdf_mode": "lazy",
+    }
+    body.update(overrides)
+    return body
@@ -0,0 +1,37 @@
+import uuid
+
+import app.speculation as speculation
+
+from .conftest import apply_payload
+
+
+def _exists(client, headers, user_id, url):
+    res = client.get(
+        "/v1/applications/exists",
+        params={"user_id": user_id, "url": url, "speculate": "true"},
+        headers=headers,
+    )
+    assert res.status_code == 200
+    return res.json()
+
+
+def test_speculation_only_reuses_postings_the_caller_can_see(
+    client, seeded, fake_model, monkeypatch
+):
+    monkeypatch.setattr(speculation, "SPECULATIVE_GENERATION", True)
+    url = f"https://jobs.example.com/{uuid.uuid4().hex}"
+    # The admin applied for the other managed user at this URL
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=apply_payload(seeded["other_user_id"], url=url, have_to_generate=False),
+        headers=seeded["admin_headers"],
+    )
+    assert res.status_code == 200
+
+    as_user = _exists(client, seeded["user_headers"], seeded["user_id"], url)
+    assert as_user["exists"] is False
+    assert as_user["speculation_job_id"] is None
+
+    as_admin = _exists(client, seeded["admin_headers"], seeded["user_id"], url)
+    assert as_admin["exists"] is False
+    assert as_admin["speculation_job_id"]
@@ -0,0 +1,76 @@
+import datetime as dt
+import uuid
+
+from app.blob_gc import collect_garbage
+from app.models import StoredFile
+from app.storage import LocalBlobBackend, backend_named
+
+
+def _add_file(db, user_id: str, path: str) -> StoredFile:
+    sf = StoredFile(
+        id=f"file_{uuid.uuid4().hex}",
+        user_id=user_id,
+        application_id=f"app_{uuid.uuid4().hex[:8]}",
+        kind="resume_docx",
+        path=path,
+        mime="application/octet-stream",
+        filename="resume.docx",
+        created_at=dt.datetime.now(),
+    )
+    db.add(sf)
+    db.commit()
+    return sf
+
+
+def _gc(**kwargs):
+    return collect_garbage(
+        prune_superseded=False, min_age_seconds=0, deletes_per_second=0, **kwargs
+    )
+
+
+def test_local_dry_run_reports_orphans_without_deleting(db, seeded):
+    backend: LocalBlobBackend = backend_named("local")
+    kept = backend.save("Jane", "app", "kept.docx", uuid.uuid4().bytes)
+    orphan = backend.save("Jane", "app", "orphan.docx", uuid.uuid4().bytes)
+    _add_file(db, seeded["user_id"], kept)
+    kept_blob = backend.blob_path(LocalBlobBackend.digest_of(kept))
+    orphan_blob = backend.blob_path(LocalBlobBackend.digest_of(orphan))
+
+    dry = _gc(dry_run=True, backends=["local"])
+    assert dry.deleted >= 1
+    assert kept_blob.exists() and orphan_blob.exists()
+
+    real = _gc(dry_run=False, backends=["local"])
+    assert real.deleted == dry.deleted
+    assert kept_blob.exists()
+    assert not orphan_blob.exists()
+    assert backend.read(kept)
+
+
+def test_cloudinary_keeps_assets_whose_urls_are_percent_encoded(db, seeded, monkeypatch):
+    backend = backend_named("cloudinary")
+    base = "https://res.cloudinary.com/demo/raw/upload/v1700000000"
+    live_ids = [
+        "career-os/app1/Jane Doe/app1/resume.docx",
+        "career-os/app2/José Núñez/app2/resume.pdf",
+    ]
+    _add_file(db, seeded["user_id"], f"{base}/career-os/app1/Jane%20Doe/app1/resume.docx")
+    _add_file(
+        db,
+        seeded["user_id"],
+        f"{base}/career-os/app2/Jos%C3%A9%20N%C3%BA%C3%B1ez/app2/resume.pdf",
+    )
+    orphan_id = "career-os/app3/Jane_Doe/app3/resume.docx"
+    assets = [
+        {"public_id": pid, "created_at": "2020-01-01T00:00:00Z", "bytes": 10}
+        for pid in live_ids + [orphan_id]
+    ]
+    deleted = []
+    monkeypatch.setattr(backend, "iter_assets", lambda prefix: iter(assets))
+    monkeypatch.setattr(backend, "delete_asset", deleted.append)
+
+    report = _gc(dry_run=False, backends=["cloudinary"])
+
+    assert report.errors == []
+    assert report.referenced == 2
+    assert deleted == [orphan_id]
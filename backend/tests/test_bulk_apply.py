@@ -0,0 +1,68 @@
+from .conftest import apply_payload
+
+
+def _bulk_body(user_ids, **overrides):
+    body = apply_payload(user_ids[0], **overrides)
+    del body["user_id"]
+    return {**body, "user_ids": user_ids}
+
+
+def test_bulk_apply_generates_per_user_and_isolates_failures(
+    client, seeded, fake_model, monkeypatch
+):
+    import app.routers.jd as jd
+
+    extractions = []
+
+    def extract(text):
+        extractions.append(text)
+        return {"core_hard": ["python"]}
+
+    monkeypatch.setattr(jd, "_extract_keys", extract)
+    user_id, other_id = seeded["user_id"], seeded["other_user_id"]
+    body = _bulk_body([user_id, other_id, user_id, "unmanaged-user"])
+
+    res = client.post(
+        "/v1/ingest/apply-and-generate/bulk",
+        json=body,
+        headers={**seeded["admin_headers"], "Idempotency-Key": f"bulk-{user_id}"},
+    )
+
+    assert res.status_code == 200, res.text
+    out = res.json()
+    # one result per distinct user, in request order
+    assert [r["user_id"] for r in out["results"]] == [user_id, other_id, "unmanaged-user"]
+    assert [r["status"] for r in out["results"]] == ["succeeded", "succeeded", "failed"]
+    assert out["results"][2]["status_code"] == 403
+    assert (out["succeeded"], out["blocked"], out["failed"]) == (2, 0, 1)
+    applications = {r["result"]["application_id"] for r in out["results"][:2]}
+    assert len(applications) == 2
+    # JD keys once for the posting, one generation per user
+    assert len(extractions) == 1
+    assert out["jd_key_id"] is not None
+    assert fake_model["calls"] == 2
+
+    again = client.post(
+        "/v1/ingest/apply-and-generate/bulk",
+        json=body,
+        headers={**seeded["admin_headers"], "Idempotency-Key": f"bulk-{user_id}"},
+    ).json()
+    assert [r.get("replayed") for r in again["results"][:2]] == [True, True]
+    assert [r["result"] for r in again["results"][:2]] == [r["result"] for r in out["results"][:2]]
+    assert fake_model["calls"] == 2
+
+
+def test_bulk_apply_checks_access_per_user(client, seeded, fake_model):
+    user_id, other_id = seeded["user_id"], seeded["other_user_id"]
+
+    res = client.post(
+        "/v1/ingest/apply-and-generate/bulk",
+        json=_bulk_body([user_id, other_id]),
+        headers=seeded["user_headers"],
+    )
+
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert [r["status"] for r in results] == ["succeeded", "failed"]
+    assert results[1]["status_code"] == 403
+    assert fake_model["calls"] == 1
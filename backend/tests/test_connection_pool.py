@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.db import DATABASE_URL, SessionLocal
+
+from .conftest import apply_payload
+
+
+@pytest.fixture
+def small_pool():
+    """Bind SessionLocal to an engine with only two pooled connections."""
+    small = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=2,
+        max_overflow=0,
+        pool_timeout=5,
+    )
+    original = SessionLocal.kw["bind"]
+    SessionLocal.configure(bind=small)
+    try:
+        yield small
+    finally:
+        SessionLocal.configure(bind=original)
+        small.dispose()
+
+
+def test_reads_are_served_while_generations_wait_on_the_model(
+    client, seeded, fake_model, small_pool
+):
+    # Each generation spends ~2s in the model and renderer. Were a request to
+    # hold its connection throughout, four of them would starve a two-slot pool.
+    fake_model["delay"] = 1.0
+    user_id, headers = seeded["user_id"], seeded["user_headers"]
+
+    def generate():
+        return client.post(
+            "/v1/ingest/apply-and-generate",
+            json=apply_payload(user_id),
+            headers=headers,
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        generations = [pool.submit(generate) for _ in range(4)]
+        time.sleep(0.5)  # let them all reach the model call
+
+        started = time.monotonic()
+        read = client.get("/v1/users", headers=seeded["admin_headers"])
+        elapsed = time.monotonic() - started
+
+        results = [f.result(timeout=30) for f in generations]
+
+    assert read.status_code == 200
+    assert elapsed < 1.0
+    assert [r.status_code for r in results] == [200] * 4
+    assert fake_model["calls"] == 4
+
+
+def test_reads_are_served_while_queued_jobs_wait_on_the_model(
+    client, seeded, fake_model, small_pool
+):
+    from app.jobs import run_pending_jobs
+
+    # Two workers on a two-slot pool: a job may only hold a connection once it
+    # has rows to write, not through the model call.
+    fake_model["delay"] = 1.0
+    user_id, headers = seeded["user_id"], seeded["user_headers"]
+    for _ in range(2):
+        queued = client.post(
+            "/v1/ingest/apply-and-generate/jobs",
+            json=apply_payload(user_id),
+            headers=headers,
+        )
+        assert queued.status_code == 202
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        workers = [pool.submit(run_pending_jobs, f"worker-{i}", 1) for i in range(2)]
+        time.sleep(0.5)  # let both jobs reach the model call
+
+        started = time.monotonic()
+        read = client.get("/v1/users", headers=seeded["admin_headers"])
+        elapsed = time.monotonic() - started
+
+        ran = [f.result(timeout=30) for f in workers]
+
+    assert read.status_code == 200
+    assert elapsed < 1.0
+    assert ran == [1, 1]
+    assert fake_model["calls"] == 2
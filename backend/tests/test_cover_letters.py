@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .conftest import apply_payload
+
+
+@pytest.fixture
+def fake_letter(monkeypatch):
+    """Stub the cover letter model call; records the instructions it was given."""
+    import app.routers.resume_versions as resume_versions
+
+    state = {"instructions": [], "delay": 0.0}
+    lock = threading.Lock()
+
+    def generate(*, resume, instructions="", **context):
+        with lock:
+            state["instructions"].append(instructions)
+        time.sleep(state["delay"])
+        return f"Dear {context.get('company')},\n\n[Your Name]"
+
+    monkeypatch.setattr(resume_versions, "generate_cover_letter", generate)
+    return state
+
+
+def _apply(client, seeded, mode, **overrides):
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=apply_payload(
+            seeded["user_id"], include_cover_letter=True, cover_letter_mode=mode, **overrides
+        ),
+        headers=seeded["user_headers"],
+    )
+    assert res.status_code == 200
+    return res.json()["resume_version_id"]
+
+
+def _cover_letter(client, seeded, rv_id, **params):
+    return client.get(
+        f"/v1/resume-versions/{rv_id}/cover-letter",
+        params=params,
+        headers=seeded["user_headers"],
+    )
+
+
+def test_lazy_cover_letter_uses_the_stored_instructions(client, seeded, fake_model, fake_letter):
+    rv_id = _apply(client, seeded, "lazy", cover_letter_instructions="Keep it to one paragraph")
+    assert fake_letter["instructions"] == []
+
+    res = _cover_letter(client, seeded, rv_id)
+
+    assert res.status_code == 200
+    assert res.json()["generated"] is True
+    assert res.json()["cover_letter"].startswith("Dear Acme")
+    assert fake_letter["instructions"] == ["Keep it to one paragraph"]
+
+    # an explicit query parameter still wins
+    rv_id = _apply(client, seeded, "lazy", cover_letter_instructions="Stored")
+    _cover_letter(client, seeded, rv_id, instructions="From the query")
+    assert fake_letter["instructions"][-1] == "From the query"
+
+
+def test_background_cover_letter_uses_the_stored_instructions(
+    client, seeded, fake_model, fake_letter
+):
+    # TestClient runs background tasks before returning the response
+    rv_id = _apply(client, seeded, "background", cover_letter_instructions="Mention Rust")
+
+    assert fake_letter["instructions"] == ["Mention Rust"]
+    res = _cover_letter(client, seeded, rv_id)
+    assert res.json()["generated"] is False
+
+
+def test_concurrent_requests_share_one_generation(client, seeded, fake_model, fake_letter):
+    rv_ids = [_apply(client, seeded, "lazy") for _ in range(2)]
+    fake_letter["delay"] = 1.0
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        started = time.monotonic()
+        results = list(pool.map(lambda rv_id: _cover_letter(client, seeded, rv_id), rv_ids * 2))
+        elapsed = time.monotonic() - started
+
+    assert [r.status_code for r in results] == [200] * 4
+    # one model call per version, and the two versions did not wait on each other
+    assert len(fake_letter["instructions"]) == 2
+    assert elapsed < 1.8
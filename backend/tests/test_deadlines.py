@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from app.db import SessionLocal
+from app.deadlines import DeadlineExceeded, cancellation_report, deadline_scope
+from app.models import Application, ResumeVersion, StoredFile
+from app.scheduler import LaneGate
+
+from .conftest import apply_payload
+
+
+def test_generation_past_the_client_deadline_is_cancelled(client, seeded, fake_model):
+    fake_model["delay"] = 0.6
+    body = apply_payload(seeded["user_id"])
+    before = cancellation_report()["total"]
+
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=body,
+        headers={**seeded["user_headers"], "X-Client-Deadline": "0.3"},
+    )
+
+    assert res.status_code == 504
+    assert "deadline exceeded" in res.json()["detail"]
+    assert cancellation_report()["total"] == before + 1
+    # the model call ran, but nothing after it did
+    assert fake_model["calls"] == 1
+    db = SessionLocal()
+    try:
+        app_ids = [a.id for a in db.query(Application).filter(Application.url == body["url"])]
+        assert db.query(ResumeVersion).filter(ResumeVersion.application_id.in_(app_ids)).count() == 0
+        assert db.query(StoredFile).filter(StoredFile.application_id.in_(app_ids)).count() == 0
+    finally:
+        db.close()
+
+
+def test_queued_work_gives_up_with_the_client():
+    gate = LaneGate("llm", "interactive", limit=1, tenant_limit=1)
+    gate.acquire(5, "admin:a")
+    try:
+        with deadline_scope(0.2, "/test") as deadline:
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceeded) as exc:
+                gate.acquire(30, "admin:b")
+        assert exc.value.stage == "queue_llm"
+        assert time.monotonic() - started < 1.0
+        assert gate.queued == 0
+        # once the response has started, nothing is cancelled any more
+        deadline.finish()
+        assert deadline.exceeded() is None
+    finally:
+        gate.release("admin:a")
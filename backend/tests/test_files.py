@@ -0,0 +1,62 @@
+from .conftest import apply_payload
+
+
+def _generate(client, seeded, body, key):
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=body,
+        headers={**seeded["user_headers"], "Idempotency-Key": key},
+    )
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def test_download_revalidates_with_etag(client, seeded, fake_model):
+    out = _generate(client, seeded, apply_payload(seeded["user_id"]), "files-etag")
+    url = f"/v1/files/{out['resume_docx_file_id']}/download"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.content.startswith(b"docx:")
+    etag = first.headers["ETag"]
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_download_of_a_replaced_file_is_gone(client, seeded, fake_model):
+    body = apply_payload(seeded["user_id"])
+    old = _generate(client, seeded, body, "files-replace-1")
+    old_url = f"/v1/files/{old['resume_docx_file_id']}/download"
+    assert client.get(old_url).status_code == 200  # location now cached
+
+    new = _generate(client, seeded, {**body, "position": "Staff Engineer"}, "files-replace-2")
+    assert new["application_id"] == old["application_id"]
+    assert new["resume_docx_file_id"] != old["resume_docx_file_id"]
+
+    assert client.get(old_url).status_code == 404
+    assert client.get(f"/v1/files/{new['resume_docx_file_id']}/download").status_code == 200
+
+
+def test_download_serves_byte_ranges(client, seeded, fake_model):
+    out = _generate(client, seeded, apply_payload(seeded["user_id"]), "files-range")
+    url = f"/v1/files/{out['resume_docx_file_id']}/download"
+    full = client.get(url)
+    etag = full.headers["ETag"]
+
+    part = client.get(url, headers={"Range": "bytes=0-3"})
+    assert part.status_code == 206
+    assert part.content == full.content[:4] == b"docx"
+    assert part.headers["Content-Range"] == f"bytes 0-3/{len(full.content)}"
+
+    # If-Range with the current ETag keeps the range; a stale one gets the whole file
+    resumed = client.get(url, headers={"Range": "bytes=4-", "If-Range": etag})
+    assert resumed.status_code == 206
+    assert resumed.content == full.content[4:]
+    stale = client.get(url, headers={"Range": "bytes=4-", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == full.content
@@ -0,0 +1,33 @@
+from .conftest import apply_payload
+
+
+def _post(client, seeded, body, key):
+    return client.post(
+        "/v1/ingest/apply-and-generate",
+        json=body,
+        headers={**seeded["user_headers"], "Idempotency-Key": key},
+    )
+
+
+def test_same_key_replays_the_first_response(client, seeded, fake_model):
+    body = apply_payload(seeded["user_id"])
+
+    first = _post(client, seeded, body, "submit-1")
+    second = _post(client, seeded, body, "submit-1")
+
+    assert first.status_code == second.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json()["application_id"] == first.json()["application_id"]
+    assert second.json()["resume_version_id"] == first.json()["resume_version_id"]
+    assert fake_model["calls"] == 1
+
+
+def test_same_key_with_a_different_request_is_rejected(client, seeded, fake_model):
+    body = apply_payload(seeded["user_id"])
+    assert _post(client, seeded, body, "submit-2").status_code == 200
+
+    changed = _post(client, seeded, {**body, "position": "Staff Engineer"}, "submit-2")
+
+    assert changed.status_code == 422
+    assert fake_model["calls"] == 1
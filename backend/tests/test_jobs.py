@@ -0,0 +1,158 @@
+import datetime as dt
+import time
+
+from app.db import SessionLocal
+from app.jobs import claim_next_job, run_job
+from app.models import GenerationJob, ResumeVersion, StoredFile
+
+from .conftest import apply_payload
+
+
+def _expire_lease(job_id: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(GenerationJob).filter(GenerationJob.id == job_id).update(
+            {GenerationJob.locked_until: dt.datetime.now() - dt.timedelta(seconds=1)},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_reclaimed_job_lands_its_rows_once(client, seeded, fake_model, monkeypatch):
+    import app.routers.resume_builder as resume_builder
+
+    queued = client.post(
+        "/v1/ingest/apply-and-generate/jobs",
+        json=apply_payload(seeded["user_id"]),
+        headers=seeded["user_headers"],
+    )
+    assert queued.status_code == 202
+    job_id, application_id = queued.json()["job_id"], queued.json()["application_id"]
+
+    generate = resume_builder.generate_resume_from_scratch
+    stalled = []
+
+    def slow_worker_generate(**kwargs):
+        # Worker A stalls in the model call: its lease runs out and worker B
+        # reclaims the job and finishes it before A gets going again.
+        if not stalled:
+            stalled.append(True)
+            _expire_lease(job_id)
+            db_b = SessionLocal()
+            try:
+                job_b = claim_next_job(db_b, "worker-b")
+                assert job_b is not None and job_b.id == job_id
+                run_job(db_b, job_b, "worker-b")
+            finally:
+                db_b.close()
+        return generate(**kwargs)
+
+    monkeypatch.setattr(resume_builder, "generate_resume_from_scratch", slow_worker_generate)
+
+    db_a = SessionLocal()
+    try:
+        job_a = claim_next_job(db_a, "worker-a")
+        assert job_a is not None and job_a.id == job_id
+        run_job(db_a, job_a, "worker-a")
+    finally:
+        db_a.close()
+
+    assert fake_model["calls"] == 2
+    db = SessionLocal()
+    try:
+        job = db.get(GenerationJob, job_id)
+        assert job.status == "succeeded"
+        assert job.attempts == 2
+        versions = (
+            db.query(ResumeVersion).filter(ResumeVersion.application_id == application_id).all()
+        )
+        assert len(versions) == 1
+        files = db.query(StoredFile).filter(StoredFile.application_id == application_id).all()
+        assert sorted(f.kind for f in files) == sorted({f.kind for f in files})
+        assert {f.resume_version_id for f in files} == {versions[0].id}
+    finally:
+        db.close()
+
+
+def test_same_posting_with_tracking_params_joins_the_queued_job(client, seeded):
+    body = apply_payload(seeded["user_id"])
+    first = client.post(
+        "/v1/ingest/apply-and-generate/jobs", json=body, headers=seeded["user_headers"]
+    ).json()
+    second = client.post(
+        "/v1/ingest/apply-and-generate/jobs",
+        json={**body, "url": body["url"] + "/?utm_source=linkedin"},
+        headers=seeded["user_headers"],
+    ).json()
+
+    assert second["deduplicated"] is True
+    assert second["job_id"] == first["job_id"]
+    assert second["application_id"] == first["application_id"]
+    db = SessionLocal()
+    try:
+        db.query(GenerationJob).filter(GenerationJob.id == first["job_id"]).update(
+            {GenerationJob.status: "failed"}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_heartbeat_keeps_a_slow_job_from_being_reclaimed(
+    client, seeded, fake_model, monkeypatch
+):
+    import app.jobs as jobs
+
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 1)
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.2)
+    queued = client.post(
+        "/v1/ingest/apply-and-generate/jobs",
+        json=apply_payload(seeded["user_id"]),
+        headers=seeded["user_headers"],
+    ).json()
+    job_id = queued["job_id"]
+    claimable_mid_run = []
+
+    def still_claimable():
+        db = SessionLocal()
+        try:
+            now = dt.datetime.now()
+            return (
+                db.query(GenerationJob)
+                .filter(GenerationJob.id == job_id, jobs._claimable(now))
+                .count()
+            )
+        finally:
+            db.close()
+
+    import app.routers.resume_builder as resume_builder
+
+    generate = resume_builder.generate_resume_from_scratch
+
+    def slow_generate(**kwargs):
+        # Twice the lease: without renewal another worker could claim the job
+        for _ in range(8):
+            time.sleep(0.25)
+            claimable_mid_run.append(still_claimable())
+        return generate(**kwargs)
+
+    monkeypatch.setattr(resume_builder, "generate_resume_from_scratch", slow_generate)
+
+    db = SessionLocal()
+    try:
+        job = jobs.claim_next_job(db, "worker-a")
+        assert job is not None and job.id == job_id
+        run_job(db, job, "worker-a")
+    finally:
+        db.close()
+
+    assert claimable_mid_run and not any(claimable_mid_run)
+    db = SessionLocal()
+    try:
+        job = db.get(GenerationJob, job_id)
+        assert job.status == "succeeded"
+        assert job.attempts == 1
+    finally:
+        db.close()
@@ -0,0 +1,74 @@
+import threading
+
+import app.routers.files as files
+
+from .conftest import apply_payload
+
+
+def _lazy_application(client, seeded):
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=apply_payload(seeded["user_id"], pdf_mode="lazy"),
+        headers=seeded["user_headers"],
+    )
+    assert res.status_code == 200, res.text
+    out = res.json()
+    assert out["resume_pdf_status"] == "pending"
+    return out
+
+
+def _count_renders(monkeypatch):
+    renders = []
+    lock = threading.Lock()
+
+    def render(db, sf):
+        with lock:
+            renders.append(sf.id)
+        return b"%PDF-1.4 rendered"
+
+    monkeypatch.setattr(files, "_render_pending_pdf", render)
+    return renders
+
+
+def test_anonymous_download_leaves_a_pending_pdf_alone(client, seeded, fake_model, monkeypatch):
+    renders = _count_renders(monkeypatch)
+    url = f"/v1/files/{_lazy_application(client, seeded)['resume_pdf_file_id']}/download"
+
+    res = client.get(url)
+
+    assert res.status_code == 202
+    assert res.json()["status"] == "pending"
+    assert renders == []
+
+
+def test_other_users_cannot_render_a_pending_pdf(client, seeded, fake_model, monkeypatch):
+    from app.auth import mint_token
+    from app.db import SessionLocal
+
+    renders = _count_renders(monkeypatch)
+    url = f"/v1/files/{_lazy_application(client, seeded)['resume_pdf_file_id']}/download"
+    db = SessionLocal()
+    try:
+        other = mint_token(db, "user", seeded["other_user_id"], "José")
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get(url, headers={"X-Auth-Token": other}).status_code == 403
+    assert client.get(url, headers={"X-Auth-Token": "bogus"}).status_code == 401
+    assert renders == []
+
+
+def test_first_signed_in_download_renders_once(client, seeded, fake_model, monkeypatch):
+    renders = _count_renders(monkeypatch)
+    out = _lazy_application(client, seeded)
+    url = f"/v1/files/{out['resume_pdf_file_id']}/download"
+
+    first = client.get(url, headers=seeded["user_headers"])
+    assert first.status_code == 200
+    assert first.content == b"%PDF-1.4 rendered"
+
+    again = client.get(url)  # stored now: plain downloads work without a token
+    assert again.status_code == 200
+    assert again.content == b"%PDF-1.4 rendered"
+    assert renders == [out["resume_pdf_file_id"]]
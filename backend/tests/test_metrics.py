@@ -0,0 +1,59 @@
+import datetime as dt
+import uuid
+
+import pytest
+
+from app.db import SessionLocal
+from app.models import StageTiming
+from app.timings import percentile, stage_percentiles
+
+METRICS = [
+    "/v1/metrics/file-cache",
+    "/v1/metrics/stage-timings",
+    "/v1/metrics/work-lanes",
+    "/v1/metrics/cancellations",
+]
+
+
+@pytest.mark.parametrize("path", METRICS)
+def test_metrics_are_admin_only(client, seeded, path):
+    assert client.get(path, headers=seeded["user_headers"]).status_code == 403
+    assert client.get(path, headers=seeded["admin_headers"]).status_code == 200
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 21)]
+    assert percentile(values, 50) == 10.0
+    assert percentile(values, 95) == 19.0
+    assert percentile([7.0], 95) == 7.0
+
+
+def test_stage_percentiles_reads_only_the_newest_rows():
+    pipeline = f"test_{uuid.uuid4().hex[:8]}"
+    now = dt.datetime.now()
+    db = SessionLocal()
+    try:
+        # ten old slow runs, then ten recent fast ones
+        for i in range(20):
+            db.add(
+                StageTiming(
+                    run_id=uuid.uuid4().hex,
+                    pipeline=pipeline,
+                    stage="total",
+                    ms=1000.0 if i < 10 else 10.0,
+                    status="ok",
+                    created_at=now - dt.timedelta(minutes=20 - i),
+                )
+            )
+        db.commit()
+
+        report = stage_percentiles(db, pipeline=pipeline, limit=10)
+        assert report[pipeline]["total"] == {
+            "count": 10,
+            "p50_ms": 10.0,
+            "p95_ms": 10.0,
+            "max_ms": 10.0,
+        }
+        assert stage_percentiles(db, pipeline=pipeline)[pipeline]["total"]["count"] == 20
+    finally:
+        db.close()
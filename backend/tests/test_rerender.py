@@ -0,0 +1,74 @@
+import os
+import threading
+
+import app.routers.resume_builder as resume_builder
+import app.services.pdf_service as pdf_service
+from app.db import SessionLocal
+from app.models import StoredFile
+from app.services.render_service import render_resume_files
+
+from .conftest import apply_payload
+
+
+def _generate(client, seeded, body, key):
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=body,
+        headers={**seeded["user_headers"], "Idempotency-Key": key},
+    )
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def test_rerender_only_touches_each_applications_current_version(
+    client, seeded, fake_model, monkeypatch
+):
+    body = apply_payload(seeded["user_id"])
+    old = _generate(client, seeded, body, "rerender-old")
+    new = _generate(client, seeded, {**body, "position": "Staff Engineer"}, "rerender-new")
+    other = _generate(client, seeded, apply_payload(seeded["user_id"]), "rerender-other")
+    assert old["application_id"] == new["application_id"]
+
+    # Pool workers need the real (picklable) renderer; DOCX only, so no soffice
+    monkeypatch.setattr(resume_builder, "render_resume_files", render_resume_files)
+    out = resume_builder._rerender_user_versions(seeded["user_id"], "docx")
+
+    assert out["rendered"] == 2 and out["failed"] == 0
+    db = SessionLocal()
+    try:
+        live = {
+            sf.application_id: sf.resume_version_id
+            for sf in db.query(StoredFile).filter(
+                StoredFile.user_id == seeded["user_id"], StoredFile.kind == "resume_docx"
+            )
+        }
+    finally:
+        db.close()
+    assert live[new["application_id"]] == new["resume_version_id"]
+    assert live[other["application_id"]] == other["resume_version_id"]
+    assert old["resume_version_id"] not in live.values()
+
+
+def test_each_soffice_conversion_gets_its_own_profile(monkeypatch):
+    commands = []
+    both_started = threading.Barrier(2, timeout=5)
+
+    def fake_soffice(cmd):
+        commands.append(cmd)
+        both_started.wait()
+        outdir = cmd[cmd.index("--outdir") + 1]
+        with open(os.path.join(outdir, "resume.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4")
+
+    monkeypatch.setattr(pdf_service, "_run_soffice", fake_soffice)
+    threads = [
+        threading.Thread(target=pdf_service.docx_bytes_to_pdf_bytes, args=(b"PK",))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    profiles = [next(a for a in cmd if a.startswith("-env:UserInstallation=file://")) for cmd in commands]
+    assert len(set(profiles)) == 2
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.scheduler import LaneGate, WorkScheduler, scheduled, tenant_scope, work_lane
+
+
+def _wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+
+def _queue(gate, name, tenant, order):
+    def run():
+        gate.acquire(5, tenant)
+        order.append(name)
+        gate.release(tenant)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_background_work_does_not_take_interactive_slots():
+    scheduler = WorkScheduler()
+    background = scheduler.gate("soffice", "background")
+    background.acquire(1, "system")
+    try:
+        # the background lane is full, the interactive one is not
+        with pytest.raises(HTTPException) as exc:
+            background.acquire(0.05, "system")
+        assert exc.value.status_code == 503
+
+        with scheduler.slot("soffice", "interactive"):
+            assert scheduler.gate("soffice", "interactive").running == 1
+    finally:
+        background.release("system")
+
+
+def test_scheduled_uses_the_callers_lane(monkeypatch):
+    import app.scheduler as scheduler_module
+
+    fresh = WorkScheduler()
+    monkeypatch.setattr(scheduler_module, "scheduler", fresh)
+    with tenant_scope("user:u1"), work_lane("background"), scheduled("llm"):
+        assert fresh.gate("llm", "background").running == 1
+        assert fresh.gate("llm", "interactive").running == 0
+
+
+def test_freed_slot_goes_to_the_tenant_served_least():
+    gate = LaneGate("llm", "interactive", limit=1, tenant_limit=1)
+    gate.acquire(5, "admin:a")
+    order = []
+    threads = [_queue(gate, f"a{i}", "admin:a", order) for i in (2, 3)]
+    _wait_for(lambda: gate.queued == 2)
+    threads.append(_queue(gate, "b1", "admin:b", order))
+    _wait_for(lambda: gate.queued == 3)
+
+    gate.release("admin:a")
+    for thread in threads:
+        thread.join(5)
+
+    # b queued last but has had no turn yet, so it goes before a's backlog
+    assert order == ["b1", "a2", "a3"]
+    report = gate.report()["tenants"]
+    assert report["admin:a"]["acquired"] == 3
+    assert report["admin:b"]["acquired"] == 1
+
+
+def test_one_tenant_cannot_hold_every_slot():
+    gate = LaneGate("llm", "interactive", limit=3, tenant_limit=2)
+    gate.acquire(1, "admin:a")
+    gate.acquire(1, "admin:a")
+    try:
+        # a third slot is free, but not for a tenant already at its cap
+        with pytest.raises(HTTPException):
+            gate.acquire(0.05, "admin:a")
+        assert gate.acquire(0.05, "admin:b") < 0.05
+        gate.release("admin:b")
+    finally:
+        gate.release("admin:a")
+        gate.release("admin:a")
@@ -0,0 +1,72 @@
+import json
+
+from app.db import SessionLocal
+from app.jobs import run_pending_jobs
+from app.models import GenerationJob
+
+from .conftest import GENERATED_RESUME, JD_TEXT, apply_payload
+
+
+def test_viewed_posting_is_pregenerated_and_used_by_apply(
+    client, seeded, fake_model, monkeypatch
+):
+    import app.speculation as speculation
+
+    monkeypatch.setattr(speculation, "SPECULATIVE_GENERATION", True)
+    speculative_calls = []
+
+    def generate(**kwargs):
+        speculative_calls.append(kwargs)
+        out = json.loads(json.dumps(GENERATED_RESUME))
+        out["job_title"] = "Speculative Engineer"
+        return out
+
+    monkeypatch.setattr(speculation, "generate_resume_from_scratch", generate)
+    body = apply_payload(seeded["user_id"])
+    viewed = {
+        "user_id": seeded["user_id"],
+        "url": body["url"],
+        "jd_text": JD_TEXT,
+        "company": body["company"],
+        "position": body["position"],
+        "speculate": True,
+    }
+
+    first = client.post("/v1/jd/keys", json=viewed, headers=seeded["user_headers"])
+    again = client.post("/v1/jd/keys", json=viewed, headers=seeded["user_headers"])
+    assert first.status_code == again.status_code == 200
+    job_id = first.json()["speculation_job_id"]
+    assert job_id and again.json()["speculation_job_id"] == job_id
+
+    run_pending_jobs("worker-speculation")  # other tests may have left jobs queued
+    db = SessionLocal()
+    try:
+        assert db.get(GenerationJob, job_id).status == "succeeded"
+    finally:
+        db.close()
+    assert speculative_calls
+
+    res = client.post("/v1/ingest/apply-and-generate", json=body, headers=seeded["user_headers"])
+
+    assert res.status_code == 200, res.text
+    assert res.json()["speculative"] is True
+    assert fake_model["calls"] == 0
+    docx = client.get(res.json()["resume_docx_download_url"])
+    assert docx.content == b"docx:Speculative Engineer"
+
+
+def test_speculation_needs_access_to_the_user(client, seeded, fake_model, monkeypatch):
+    import app.speculation as speculation
+
+    monkeypatch.setattr(speculation, "SPECULATIVE_GENERATION", True)
+    res = client.post(
+        "/v1/jd/keys",
+        json={
+            "user_id": seeded["other_user_id"],
+            "url": "https://jobs.example.com/not-yours",
+            "jd_text": JD_TEXT,
+            "speculate": True,
+        },
+        headers=seeded["user_headers"],
+    )
+    assert res.status_code == 403
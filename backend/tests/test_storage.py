@@ -0,0 +1,85 @@
+import uuid
+
+from app.db import SessionLocal
+from app.models import BlobRef
+from app.storage import LocalBlobBackend, Upload, backend_named, release_after_commit, save_many
+from app.timings import track_pipeline
+
+
+def _refcount(digest: str):
+    db = SessionLocal()
+    try:
+        row = db.get(BlobRef, digest)
+        return row.refcount if row else None
+    finally:
+        db.close()
+
+
+def test_identical_saves_share_a_blob_until_the_last_release():
+    backend: LocalBlobBackend = backend_named("local")
+    data = uuid.uuid4().bytes
+    first = backend.save("Jane", "app1", "resume.docx", data)
+    second = backend.save("Jane", "app2", "resume.docx", data)
+    digest = LocalBlobBackend.digest_of(first)
+
+    assert first == second
+    assert _refcount(digest) == 2
+
+    backend.release(first)
+    assert _refcount(digest) == 1
+    assert backend.read(second) == data
+
+    backend.release(second)
+    assert _refcount(digest) is None
+    assert not backend.blob_path(digest).exists()
+
+
+def test_release_after_commit_waits_for_the_commit():
+    backend: LocalBlobBackend = backend_named("local")
+    data = uuid.uuid4().bytes
+    path = backend.save("Jane", "app1", "resume.docx", data)
+    backend.save("Jane", "app2", "resume.docx", data)
+    digest = LocalBlobBackend.digest_of(path)
+
+    db = SessionLocal()
+    try:
+        db.query(BlobRef).first()
+        release_after_commit(db, [path])
+        assert _refcount(digest) == 2
+        db.rollback()
+
+        db.query(BlobRef).first()
+        release_after_commit(db, [path])
+        db.commit()
+    finally:
+        db.close()
+    assert _refcount(digest) == 1
+    assert backend.blob_path(digest).exists()
+
+
+def test_save_many_records_each_upload_as_a_stage(monkeypatch):
+    import app.storage as storage
+
+    failures = []
+
+    def flaky_save_bytes(user_info, application_id, filename, data):
+        if filename.endswith(".pdf") and not failures:
+            failures.append(filename)
+            raise ConnectionError("reset by peer")
+        return f"local://{filename}"
+
+    monkeypatch.setattr(storage, "save_bytes", flaky_save_bytes)
+    monkeypatch.setattr(storage, "UPLOAD_BACKOFF_SECONDS", 0.01)
+
+    with track_pipeline("upload_test") as timer:
+        timer.record = False
+        save_many(
+            [
+                Upload("Jane", "app1", "file1.docx", b"docx"),
+                Upload("Jane", "app1", "file1p.pdf", b"pdf"),
+            ]
+        )
+
+    timings = timer.as_dict()
+    assert {"upload_docx", "upload_pdf"} <= set(timings["stages"])
+    assert timings["counters"] == {"upload_docx_attempts": 1, "upload_pdf_attempts": 2}
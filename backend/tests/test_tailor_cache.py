@@ -0,0 +1,46 @@
+import datetime as dt
+import uuid
+
+from app.db import SessionLocal
+from app.models import Application, TailorCache
+from app.routers.resume_builder import (
+    TailorBulletsIn,
+    TailorBulletsOut,
+    _get_cached_tailoring,
+    _store_cached_tailoring,
+)
+
+
+def _out(summary: str) -> TailorBulletsOut:
+    return TailorBulletsOut(selected_experiences=[], keywords_covered=[], gaps=[], summary=summary)
+
+
+def test_storing_the_cache_leaves_the_callers_transaction_alone(seeded):
+    user_id = seeded["user_id"]
+    cache_key = uuid.uuid4().hex
+    app_id = f"app{uuid.uuid4().hex[:12]}"
+    payload = TailorBulletsIn(user_id=user_id, jd_key_id=1)
+
+    db = SessionLocal()
+    try:
+        db.add(
+            Application(
+                id=app_id,
+                user_id=user_id,
+                company="Acme",
+                role="Engineer",
+                url=f"https://jobs.example.com/{app_id}",
+                created_at=dt.datetime.now(),
+            )
+        )
+        _store_cached_tailoring(cache_key, payload, "hash", "model", _out("first"))
+        # racing stores of the same key replace the row instead of failing
+        _store_cached_tailoring(cache_key, payload, "hash", "model", _out("second"))
+        db.rollback()
+
+        assert db.get(Application, app_id) is None
+        cached = _get_cached_tailoring(db, cache_key)
+        assert cached is not None and cached.summary == "second"
+        assert db.query(TailorCache).filter(TailorCache.cache_key == cache_key).count() == 1
+    finally:
+        db.close()
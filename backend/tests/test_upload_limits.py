@@ -0,0 +1,110 @@
+import asyncio
+import io
+import zipfile
+
+import main
+import app.services.upload_service as upload_service
+
+
+def _docx_bytes(padding: int = 2000) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", "<document/>" + " " * padding)
+    return buf.getvalue()
+
+
+def _multipart(filename: str, data: bytes, chunk: int = 64 * 1024):
+    yield (
+        "--XyZ\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    for i in range(0, len(data), chunk):
+        yield data[i : i + chunk]
+    yield b"\r\n--XyZ--\r\n"
+
+
+def _send_chunked(seeded, parts):
+    """Drive the ASGI app with a chunked body (no Content-Length), as a server would.
+
+    Returns (status, bytes of body the app pulled from the client).
+    """
+    token = seeded["user_headers"]["X-Auth-Token"]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "PUT",
+        "scheme": "http",
+        "path": f"/v1/users/{seeded['user_id']}/resume-template-docx",
+        "raw_path": b"",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"multipart/form-data; boundary=XyZ"),
+            (b"transfer-encoding", b"chunked"),
+            (b"x-auth-token", token.encode()),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    parts = iter(parts)
+    pulled = 0
+    finished = False
+    status = []
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal pulled, finished
+        if finished:
+            await done.wait()
+            return {"type": "http.disconnect"}
+        part = next(parts, None)
+        if part is None:
+            finished = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        pulled += len(part)
+        return {"type": "http.request", "body": part, "more_body": True}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    async def run():
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=30)
+
+    asyncio.run(run())
+    return status[0], pulled
+
+
+def test_chunked_upload_is_cut_off_past_the_limit(seeded, monkeypatch):
+    monkeypatch.setattr(upload_service, "UPLOAD_MAX_BYTES", 256 * 1024)
+    body = _multipart("big.docx", b"PK\x03\x04" + b"\0" * (8 * 1024 * 1024))
+
+    status, pulled = _send_chunked(seeded, body)
+
+    assert status == 413
+    assert pulled < 1024 * 1024  # stopped long before the 8 MB body was read
+
+
+def test_chunked_upload_within_the_limit_is_stored(seeded):
+    status, _ = _send_chunked(seeded, _multipart("template.docx", _docx_bytes()))
+
+    assert status == 200
+
+
+def test_declared_length_over_the_limit_is_refused_up_front(client, seeded, monkeypatch):
+    monkeypatch.setattr(upload_service, "UPLOAD_MAX_BYTES", 1024)
+    data = b"".join(_multipart("big.docx", b"PK\x03\x04" + b"\0" * (200 * 1024)))
+
+    res = client.put(
+        f"/v1/users/{seeded['user_id']}/resume-template-docx",
+        content=data,
+        headers={**seeded["user_headers"], "Content-Type": "multipart/form-data; boundary=XyZ"},
+    )
+
+    assert res.status_code == 413
@@ -0,0 +1,140 @@
+import datetime as dt
+
+from app.db import SessionLocal
+from app.models import StoredFile, UploadSession
+from app.storage import StorageBackend, backend_named
+
+from .conftest import apply_payload
+
+
+def _generated_application(client, seeded):
+    res = client.post(
+        "/v1/ingest/apply-and-generate",
+        json=apply_payload(seeded["user_id"]),
+        headers=seeded["user_headers"],
+    )
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def _resume_files(application_id):
+    db = SessionLocal()
+    try:
+        return {
+            sf.id: sf.kind
+            for sf in db.query(StoredFile).filter(StoredFile.application_id == application_id)
+        }
+    finally:
+        db.close()
+
+
+def _direct_upload(client, seeded, application_id, filename, data):
+    signed = client.post(
+        "/v1/uploads/sign",
+        json={
+            "user_id": seeded["user_id"],
+            "purpose": "tailored_resume",
+            "filename": filename,
+            "application_id": application_id,
+            "size": len(data),
+        },
+        headers=seeded["user_headers"],
+    )
+    assert signed.status_code == 200, signed.text
+    signed = signed.json()
+    put = client.put(signed["url"], params=signed["fields"], content=data)
+    assert put.status_code == 200, put.text
+    done = client.post(signed["complete_url"], json={}, headers=seeded["user_headers"])
+    assert done.status_code == 202, done.text
+    # TestClient runs background tasks before returning
+    return client.get(f"/v1/uploads/{signed['upload_id']}", headers=seeded["user_headers"]).json()
+
+
+def test_tailored_upload_replaces_files_after_validation(client, seeded, fake_model):
+    out = _generated_application(client, seeded)
+    before = _resume_files(out["application_id"])
+
+    status = _direct_upload(client, seeded, out["application_id"], "mine.pdf", b"%PDF-1.7 mine")
+
+    assert status["status"] == "completed"
+    after = _resume_files(out["application_id"])
+    assert after == {status["stored_file_id"]: "resume_pdf"}
+    assert not set(before) & set(after)
+
+
+def test_invalid_tailored_upload_keeps_the_current_resume(client, seeded, fake_model):
+    out = _generated_application(client, seeded)
+    before = _resume_files(out["application_id"])
+    docx_id = out["resume_docx_file_id"]
+    assert docx_id in before
+
+    # Storage accepted bytes that only look like a DOCX (a direct upload to
+    # Cloudinary is not checked until processing)
+    bad = backend_named("local").save("Jane", out["application_id"], "bad.docx", b"PK\x03\x04junk")
+    now = dt.datetime.now()
+    db = SessionLocal()
+    try:
+        db.add(
+            UploadSession(
+                id=f"upl_bad_{out['application_id']}",
+                user_id=seeded["user_id"],
+                principal_type="user",
+                principal_id=seeded["user_id"],
+                purpose="tailored_resume",
+                application_id=out["application_id"],
+                filename="bad.docx",
+                backend="local",
+                path=bad,
+                status="pending",
+                expires_at=now + dt.timedelta(minutes=5),
+                created_at=now,
+                updated_at=now,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    upload_id = f"upl_bad_{out['application_id']}"
+    done = client.post(f"/v1/uploads/{upload_id}/complete", json={}, headers=seeded["user_headers"])
+    assert done.status_code == 202
+    status = client.get(f"/v1/uploads/{upload_id}", headers=seeded["user_headers"]).json()
+
+    assert status["status"] == "failed"
+    assert "DOCX" in status["error"]
+    assert _resume_files(out["application_id"]) == before
+    download = client.get(f"/v1/files/{docx_id}/download")
+    assert download.status_code == 200
+    assert download.content.startswith(b"docx:")
+
+
+class _ProxyOnlyBackend(StorageBackend):
+    name = "proxy-only"
+
+    def save(self, user_info, application_id, filename, data):
+        return f"proxy://{filename}"
+
+    def read(self, path):
+        return b""
+
+
+def test_sign_upload_is_501_without_direct_upload_support(client, seeded, monkeypatch):
+    import app.routers.uploads as uploads
+
+    monkeypatch.setattr(uploads, "get_backend", lambda: _ProxyOnlyBackend())
+    res = client.post(
+        "/v1/uploads/sign",
+        json={
+            "user_id": seeded["user_id"],
+            "purpose": "base_resume_docx",
+            "filename": "resume.docx",
+        },
+        headers=seeded["user_headers"],
+    )
+
+    assert res.status_code == 501
+    db = SessionLocal()
+    try:
+        assert db.query(UploadSession).filter(UploadSession.backend == "proxy-only").count() == 0
+    finally:
+        db.close()
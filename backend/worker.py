@@ -0,0 +1,20 @@
+"""Standalone generation worker.
+
+    python worker.py          # poll forever
+    python worker.py --once   # drain the queue and exit
+"""
+from __future__ import annotations
+
+import sys
+
+import main  # noqa: F401  (registers routers and their job handlers)
+from app.init_db import ensure_schema
+from app.jobs import default_worker_id, run_pending_jobs, run_worker
+
+
+if __name__ == "__main__":
+    ensure_schema()
+    if "--once" in sys.argv[1:]:
+        print("jobs run:", run_pending_jobs(default_worker_id()))
+    else:
+        run_worker()